@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import logging
+
+import torch
+from torch.profiler import ProfilerActivity, profile, schedule
+
+from .distributed import get_rank, is_distributed
+from .types import Any, Dict, Iterable, List, Optional, _Device, _StringDict
+from .utils import get_file_path, make_dirs
+
+
+class Callback:
+    """
+    Base class for callbacks hooking into the training
+    routine (see `train_utils.train_model()`).
+
+    Override any of the event methods below. Each of them
+    is passed the shared `TrainState` of the training run,
+    along with event-specific keyword arguments.
+    Only the events that are actually overridden are ever
+    dispatched to a callback (see `CallbackHandler`).
+
+    Events (and their keyword arguments):
+      - on_train_start: None
+      - on_train_end: `return_dict` of `train_model()`
+      - on_train_error: `error` raised during training (which is
+                        re-raised afterwards), instead of `on_train_end`
+      - on_epoch_start: None
+      - on_epoch_end: None
+      - on_batch_start: `batch_idx`, `batch`
+      - on_batch_end: `batch_idx`, `outputs`, and `loss` (not for
+                      testing) as a tensor on the device. Call
+                      `.item()` on it only if really required,
+                      since it forces a host-device sync.
+      - on_step_end: `batch_idx` (last batch of the optimizer step)
+      - on_eval_end: `losses`, `eval_metrics` on the validation set,
+                     and `step` if evaluated in the middle of an epoch
+      - on_checkpoint: `checkpoint_file` that was saved
+
+    A callback may set `state.stop_training = True` to stop
+    training. If set during a training epoch, the epoch is
+    stopped right after the current batch, otherwise
+    training is stopped at the end of the current epoch.
+    """
+
+    def on_train_start(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_train_end(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_train_error(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_epoch_start(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_epoch_end(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_batch_start(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_batch_end(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_step_end(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_eval_end(self, state: TrainState, **kwargs) -> None:
+        pass
+
+    def on_checkpoint(self, state: TrainState, **kwargs) -> None:
+        pass
+
+
+EVENTS = [
+    "on_train_start",
+    "on_train_end",
+    "on_train_error",
+    "on_epoch_start",
+    "on_epoch_end",
+    "on_batch_start",
+    "on_batch_end",
+    "on_step_end",
+    "on_eval_end",
+    "on_checkpoint",
+]
+
+
+class TrainState:
+    """
+    Mutable state of a training run shared
+    with all callbacks.
+      - `model`, `config`, `optimizer`, `scheduler`,
+        `train_logger` and `val_logger` are the objects
+        being used for training (if set by the caller)
+      - `epoch`: Current epoch
+      - `phase`: Current phase ("train" | "eval" | "test")
+      - `global_step`: Number of optimizer steps taken
+                       so far in the training run
+      - `batches_done`: Number of batches of the current
+                        epoch trained on, as of the last
+                        optimizer step
+      - `epoch_rng_state`: RNG states at the start
+                           of the current epoch
+      - `stop_training`: May be set by callbacks
+                         to stop training
+    """
+
+    def __init__(self, **kwargs):
+        self.model = None
+        self.config = None
+        self.optimizer = None
+        self.scheduler = None
+        self.train_logger = None
+        self.val_logger = None
+        self.epoch = 0
+        self.phase: Optional[str] = None
+        self.global_step = 0
+        self.batches_done = 0
+        self.epoch_rng_state: Optional[_StringDict] = None
+        self.stop_training = False
+        self.__dict__.update(kwargs)
+
+
+class CallbackHandler:
+    """
+    Dispatch events to a list of callbacks.
+
+    The listeners of each event are computed once at
+    initialization, so that dispatching is cheap and
+    callers in the hot loop can skip an event entirely
+    if it has no listeners (see `has_listeners()`).
+    """
+
+    def __init__(self, callbacks: Optional[Iterable[Callback]] = None, state: Optional[TrainState] = None):
+        self.callbacks: List[Callback] = list(callbacks) if callbacks is not None else []
+        self.state = state if state is not None else TrainState()
+        self._listeners: Dict[str, List[Any]] = {
+            event: [
+                getattr(callback, event)
+                for callback in self.callbacks
+                if getattr(type(callback), event) is not getattr(Callback, event)
+            ]
+            for event in EVENTS
+        }
+
+    def has_listeners(self, event: str) -> bool:
+        """
+        Check whether any callback listens to the given `event`.
+        """
+        return len(self._listeners[event]) > 0
+
+    def fire(self, event: str, **kwargs) -> None:
+        """
+        Dispatch the given `event` to all
+        callbacks listening to it.
+        """
+        for listener in self._listeners[event]:
+            listener(self.state, **kwargs)
+
+
+class ProfilerCallback(Callback):
+    """
+    Callback for profiling training steps with `torch.profiler`.
+
+    The profiler runs from the start to the end of training (or until
+    an error is raised), and is
+    stepped after every optimizer step, such that (per `repeat`) the
+    first `wait` steps are skipped, the next `warmup` ones are traced
+    without recording (excluded from the results), and the next
+    `active` ones are recorded. Everything run in between, e.g.
+    evaluation at the end of an epoch, is recorded as well.
+
+    At the end of each window of recorded steps, the Chrome trace
+    (viewable in `chrome://tracing` or Perfetto) and the table of the
+    key averages of all operators are exported into `log_dir` as
+    `{name}_step_{global_step}.json` and `.txt` respectively
+    (suffixed by the rank in distributed training).
+
+    Enabled in `train_utils.train_model()` with `config.profiler`.
+    """
+
+    DEFAULT_PARAMS = {
+        "wait": 1,
+        "warmup": 1,
+        "active": 3,
+        "repeat": 1,
+        "record_shapes": False,
+        "profile_memory": False,
+        "with_stack": False,
+    }
+
+    def __init__(
+        self,
+        log_dir: str,
+        name: Optional[str] = "profile",
+        device: Optional[_Device] = None,
+        row_limit: Optional[int] = 50,
+        **kwargs,
+    ):
+        """
+        :param log_dir: Directory to export the profiles into
+        :param name: Prefix of the names of the exported files
+        :param device: Device trained on, to profile CUDA kernels too if it's a GPU
+        :param row_limit: Max number of operators in the exported tables
+        :param kwargs: Any of `DEFAULT_PARAMS` to override:
+                       - `wait`, `warmup`, `active`, `repeat`:
+                         Schedule of the profiler in optimizer steps
+                         (see `torch.profiler.schedule()`). If `repeat=0`,
+                         windows are repeated until training ends.
+                       - `record_shapes`, `profile_memory`, `with_stack`:
+                         Passed on to `torch.profiler.profile()`
+        """
+        invalid_params = set(kwargs) - set(self.DEFAULT_PARAMS)
+        if len(invalid_params):
+            raise ValueError(f"Invalid profiler params {sorted(invalid_params)}.")
+        params = {**self.DEFAULT_PARAMS, **kwargs}
+        for param_name in ["wait", "warmup", "active", "repeat"]:
+            assert (
+                isinstance(params[param_name], int) and params[param_name] >= 0
+            ), f"Param '{param_name}' ('{params[param_name]}') must be a non-negative integer."
+        assert params["active"] >= 1, "Param 'active' must be a positive integer."
+
+        self.log_dir = log_dir
+        self.name = f"{name}_rank_{get_rank()}" if is_distributed() else name
+        self.row_limit = row_limit
+        self.record_shapes = params["record_shapes"]
+        self.use_cuda = device is not None and torch.device(device).type == "cuda" and torch.cuda.is_available()
+        self.schedule = schedule(
+            wait=params["wait"], warmup=params["warmup"], active=params["active"], repeat=params["repeat"]
+        )
+        self.activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if self.use_cuda else [])
+        self.profiler_kwargs = {key: params[key] for key in ["record_shapes", "profile_memory", "with_stack"]}
+        self.profiler: Optional[profile] = None
+        self.exported_files: List[str] = []
+        self._global_step = 0
+
+    def on_train_start(self, state: TrainState, **kwargs) -> None:
+        make_dirs(self.log_dir)
+        self._global_step = state.global_step
+        self.profiler = profile(
+            activities=self.activities,
+            schedule=self.schedule,
+            on_trace_ready=self._export,
+            **self.profiler_kwargs,
+        )
+        self.profiler.start()
+
+    def on_step_end(self, state: TrainState, **kwargs) -> None:
+        self._global_step = state.global_step
+        self.profiler.step()
+
+    def on_train_end(self, state: TrainState, **kwargs) -> None:
+        self.profiler.stop()  # Exports the window being recorded (if any)
+        self.profiler = None
+
+    def on_train_error(self, state: TrainState, **kwargs) -> None:
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler = None
+
+    def _export(self, profiler: profile) -> None:
+        """
+        Export the Chrome trace and the table of key averages of
+        all operators of the last window of recorded steps.
+        """
+        file_path = get_file_path(self.log_dir, f"{self.name}_step_{self._global_step}")
+        logging.info(f"Exporting profile of steps up to {self._global_step} to '{file_path}.*'...")
+        profiler.export_chrome_trace(f"{file_path}.json")
+        sort_by = "self_cuda_time_total" if self.use_cuda else "self_cpu_time_total"
+        table = profiler.key_averages(group_by_input_shape=self.record_shapes).table(
+            sort_by=sort_by, row_limit=self.row_limit
+        )
+        with open(f"{file_path}.txt", "w") as f:
+            f.write(table)
+        self.exported_files.extend([f"{file_path}.json", f"{file_path}.txt"])
+        logging.info("Done.")
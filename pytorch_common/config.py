@@ -8,6 +8,8 @@ from munch import Munch
 
 import pytorch_common
 
+from .callbacks import ProfilerCallback
+from .distributed import setup_distributed
 from .metrics import (
     CLASSIFICATION_EVAL_CRITERIA,
     CLASSIFICATION_LOSS_CRITERIA,
@@ -15,7 +17,7 @@ from .metrics import (
     REGRESSION_LOSS_CRITERIA,
 )
 from .types import Optional, _Config, _StringDict
-from .utils import configure_logging, get_file_path, load_object, make_dirs, set_seed
+from .utils import configure_logging, get_autocast_dtype, get_file_path, load_object, make_dirs, set_seed
 
 
 class Config(Munch):
@@ -116,6 +118,50 @@ def set_pytorch_config(config: _Config) -> None:
         config.model_type == "classification" and config.classification_type in ["binary", "multiclass", "multilabel"]
     ) or (config.model_type == "regression" and not hasattr(config, "classification_type"))
 
+    # Check how train eval metrics are to be computed
+    TRAIN_METRICS_MODES = ["exact", "online"]
+    assert config.train_metrics_mode in TRAIN_METRICS_MODES, (
+        f"Param 'train_metrics_mode' ('{config.train_metrics_mode}') " f"must be one of {TRAIN_METRICS_MODES}."
+    )
+
+    # Check dtype for mixed precision
+    get_autocast_dtype(config.autocast_dtype)
+
+    # Check gradient accumulation
+    assert (
+        isinstance(config.gradient_accumulation_steps, int) and config.gradient_accumulation_steps >= 1
+    ), f"Param 'gradient_accumulation_steps' ('{config.gradient_accumulation_steps}') must be a positive integer."
+
+    # Check step-based validation/checkpointing/memory sampling cadence
+    for key in ["eval_every_n_steps", "checkpoint_every_n_steps", "memory_sample_every_n_batches"]:
+        assert config[key] is None or (
+            isinstance(config[key], int) and config[key] >= 1
+        ), f"Param '{key}' ('{config[key]}') must be a positive integer or None."
+
+    # Check number of checkpoints held in memory for async checkpointing
+    assert (
+        isinstance(config.max_inflight_checkpoints, int) and config.max_inflight_checkpoints >= 1
+    ), f"Param 'max_inflight_checkpoints' ('{config.max_inflight_checkpoints}') must be a positive integer."
+
+    # Check number of batches prefetched and dataloader workers
+    for key in ["batch_prefetch_depth", "num_workers"]:
+        assert (
+            isinstance(config[key], int) and config[key] >= 0
+        ), f"Param '{key}' ('{config[key]}') must be a non-negative integer."
+
+    # Check profiler params
+    if config.profiler is not None:
+        invalid_params = set(config.profiler) - set(ProfilerCallback.DEFAULT_PARAMS)
+        assert not len(invalid_params), (
+            f"Params {sorted(invalid_params)} of 'profiler' must be "
+            f"one of {list(ProfilerCallback.DEFAULT_PARAMS)}."
+        )
+
+    # Check sharding of optimizer state
+    assert (
+        config.distributed or not config.shard_optimizer_state
+    ), "Param 'shard_optimizer_state' may only be set for distributed training."
+
     # TODO: Remove this after extending FocalLoss
     if config.model_type == "classification" and config.loss_criterion == "focal-loss":
         assert (
@@ -212,13 +258,25 @@ def _check_loss_and_eval_criteria(config: _Config) -> None:
 def check_and_set_devices(config: _Config) -> None:
     """
     Check the validity of provided device configuration:
+      - Set up distributed training if required,
+        and set fields like `rank` and `world_size`
+        (see `distributed.setup_distributed()`)
       - Properly set fields like `device`,
         `device_ids`, and `n_gpu`.
       - Set torch backend benchmarks
     """
+    # Set up distributed training (one process per device) if required
+    setup_distributed(config)
+
     # Check device provided
     if "cuda" in config.device:
         assert torch.cuda.is_available()  # Check for CUDA
+
+        # Each process of distributed training uses its own GPU
+        if config.distributed:
+            config.device = f"cuda:{config.local_rank}"
+            config.device_ids = []
+
         torch.cuda.set_device(config.device)  # Set default CUDA device
 
         # Get device IDs
@@ -269,6 +327,9 @@ def set_all_batch_sizes(config: _Config) -> None:
         and `test_batch_size_per_gpu`
     The per-GPU batch sizes for each mode will then be converted
     to the total batch size depending on number of devices.
+    For distributed training, the batch size of each process
+    is the per-GPU one (even on CPU), and the global batch
+    size is `world_size` times this.
     """
 
     def set_mode_batch_size(mode: str, batch_size_per_gpu: int) -> None:
@@ -280,7 +341,8 @@ def set_all_batch_sizes(config: _Config) -> None:
         setattr(config, f"{mode}_batch_size_per_gpu", batch_size_per_gpu)
 
         # Set correct batch size according to number of devices
-        batch_size = max(1, config.n_gpu) * batch_size_per_gpu
+        # (each process of distributed training only uses one)
+        batch_size = batch_size_per_gpu if config.distributed else max(1, config.n_gpu) * batch_size_per_gpu
         setattr(config, f"{mode}_batch_size", batch_size)
 
     batch_size = config.get("batch_size")
@@ -8,12 +8,15 @@ such as timing function execution or debugging dataframe sizes.
 """
 import inspect
 import logging
+import math
+import random
+import threading
 import time
 import traceback
 from functools import wraps
 
-from .types import Callable, Optional
-from .utils import human_time_interval
+from .types import Callable, Dict, Optional
+from .utils import human_time_interval, save_yaml
 
 try:
     __IPYTHON__
@@ -22,15 +25,132 @@ except NameError:
 else:
     PRINT_FUNC = print
 
-__all__ = ["timing", "timing_with_param", "retry_if_exception", "monkey_patch_class_method"]
+__all__ = [
+    "timing",
+    "timing_with_param",
+    "retry_if_exception",
+    "monkey_patch_class_method",
+    "TimingRegistry",
+    "TIMING_REGISTRY",
+]
 
 
-def timing_with_param(*parameter_names) -> Callable:
+class TimingRegistry:
+    """
+    Process-wide registry aggregating the durations of
+    all calls of the functions decorated with `timing` /
+    `timing_with_param` into a histogram per function.
+
+    Durations are counted into logarithmically spaced
+    buckets (`BUCKETS_PER_DOUBLING` per power of 2, i.e.
+    ~9% apart), so that the memory and the cost of recording
+    a duration are constant, while the percentiles are
+    still accurate to within a bucket.
+
+    E.g.:
+        >>> from pytorch_common import TIMING_REGISTRY, timing
+        >>> @timing(log=False, sample_rate=0.1)
+        >>> def somefunc():
+        >>>     pass
+        >>> TIMING_REGISTRY.snapshot()
+        {'__main__.somefunc': {'count': 10, 'mean': 1.2e-06, 'p50': ...}}
+    """
+
+    BUCKETS_PER_DOUBLING = 8
+    PERCENTILES = [50, 95, 99]
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, Dict[int, int]] = {}
+        self._stats: Dict[str, list] = {}  # Name -> [count, total, min, max] (in ns)
+        self._rng = random.Random()  # Separate from the global RNG for sampling
+
+    def record(self, name: str, duration_ns: int) -> None:
+        """
+        Record a duration (in nanoseconds) for the given name.
+        """
+        bucket = int(math.log2(duration_ns) * self.BUCKETS_PER_DOUBLING) if duration_ns > 0 else 0
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {}
+                self._stats[name] = [0, 0, duration_ns, duration_ns]
+            histogram[bucket] = histogram.get(bucket, 0) + 1
+            stats = self._stats[name]
+            stats[0] += 1
+            stats[1] += duration_ns
+            stats[2] = min(stats[2], duration_ns)
+            stats[3] = max(stats[3], duration_ns)
+
+    def should_sample(self, sample_rate: float) -> bool:
+        """
+        Randomly decide whether to time a call, such
+        that a `sample_rate` fraction of them is timed.
+        """
+        return sample_rate >= 1.0 or self._rng.random() < sample_rate
+
+    def snapshot(self, name: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        """
+        Get the "count", and the "mean", "min", "max",
+        "total" and percentiles (e.g. "p95") of the
+        durations (in seconds) recorded so far for
+        each name (or only the given `name`).
+        """
+        with self._lock:
+            names = list(self._histograms) if name is None else [name]
+            histograms = {name: dict(self._histograms[name]) for name in names}
+            all_stats = {name: list(self._stats[name]) for name in names}
+
+        snapshot = {}
+        for name, histogram in histograms.items():
+            count, total, min_ns, max_ns = all_stats[name]
+            summary = {"count": count, "mean": 1e-9 * total / count, "min": 1e-9 * min_ns, "max": 1e-9 * max_ns}
+            buckets = sorted(histogram)
+            for percentile in self.PERCENTILES:
+                # Find the bucket of the percentile, and take its geometric mid-point
+                rank, cumulative_count = percentile / 100 * count, 0
+                for bucket in buckets:
+                    cumulative_count += histogram[bucket]
+                    if cumulative_count >= rank:
+                        break
+                value_ns = 2 ** ((bucket + 0.5) / self.BUCKETS_PER_DOUBLING) if bucket > 0 else 0
+                summary[f"p{percentile}"] = 1e-9 * min(max(value_ns, min_ns), max_ns)
+            summary["total"] = 1e-9 * total
+            snapshot[name] = summary
+        return snapshot
+
+    def dump(self, file_path: str) -> Dict[str, Dict[str, float]]:
+        """
+        Write the snapshot of all timings into a
+        yaml file at `file_path`, and return it.
+        """
+        snapshot = self.snapshot()
+        save_yaml(snapshot, file_path)
+        return snapshot
+
+    def reset(self) -> None:
+        """
+        Discard all timings recorded so far.
+        """
+        with self._lock:
+            self._histograms, self._stats = {}, {}
+
+
+TIMING_REGISTRY = TimingRegistry()
+
+
+def timing_with_param(*parameter_names, log: Optional[bool] = True, sample_rate: Optional[float] = 1.0) -> Callable:
     """
     Decorator for any function that reports how
     long it takes to run. The decorator will extract
     and print the requested function parameters.
 
+    The duration of every call is also recorded into
+    the `TIMING_REGISTRY`, under the qualified name of
+    the function. For functions called in inner loops,
+    set `log=False` to only record them there, and
+    `sample_rate` to only time a fraction of the calls.
+
     E.g.:
         >>> from pytorch_common import timing
         >>> @timing_with_param("name")
@@ -38,22 +158,30 @@ def timing_with_param(*parameter_names) -> Callable:
         >>>     # Do something with `name`
         >>>     pass
     """
+    assert 0.0 < sample_rate <= 1.0, "Param 'sample_rate' must be in (0, 1]."
 
     def decorator(func: Callable) -> Callable:
+        name = f"{func.__module__}.{func.__qualname__}"
+
         @wraps(func)
         def wrapper(*args, **kwargs):
-            start = time.time()
-            result = func(*args, **kwargs)
-            end = time.time()
-            elapsed = end - start
-            elapsed_human = human_time_interval(elapsed)
+            if not TIMING_REGISTRY.should_sample(sample_rate):
+                return func(*args, **kwargs)
 
-            params = inspect.getcallargs(func, *args, **kwargs)
-            logged_param = {param_name: params[param_name] for param_name in parameter_names}
-            logged_param_str = f" {logged_param}" if logged_param else ""
+            start = time.perf_counter_ns()
+            result = func(*args, **kwargs)
+            elapsed_ns = time.perf_counter_ns() - start
+            TIMING_REGISTRY.record(name, elapsed_ns)
+            if not log:
+                return result
 
-            module_name, function_name = func.__module__, func.__qualname__
-            PRINT_FUNC(f"Function '{module_name}.{function_name}{logged_param_str}' took {elapsed_human}")
+            elapsed_human = human_time_interval(1e-9 * elapsed_ns)
+            logged_param_str = ""
+            if parameter_names:  # Only inspect the arguments if required
+                params = inspect.getcallargs(func, *args, **kwargs)
+                logged_param = {param_name: params[param_name] for param_name in parameter_names}
+                logged_param_str = f" {logged_param}"
+            PRINT_FUNC(f"Function '{name}{logged_param_str}' took {elapsed_human}")
             return result
 
         return wrapper
@@ -61,14 +189,19 @@ def timing_with_param(*parameter_names) -> Callable:
     return decorator
 
 
-def timing(func: Callable) -> Callable:
+def timing(func: Optional[Callable] = None, log: Optional[bool] = True, sample_rate: Optional[float] = 1.0) -> Callable:
     """
     Decorator for any function that
     reports how long it takes to run.
     A handy shortcut for `timing_with_param`
     when no parameter is reported.
+    May be used as `@timing`, or with arguments,
+    e.g. `@timing(log=False, sample_rate=0.01)`
+    for functions called in inner loops.
     """
-    return timing_with_param()(func)
+    if func is None:
+        return timing_with_param(log=log, sample_rate=sample_rate)
+    return timing_with_param(log=log, sample_rate=sample_rate)(func)
 
 
 def retry_if_exception(
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import contextlib
+import logging
+import os
+
+import torch
+import torch.distributed as dist
+import torch.nn as nn
+from torch.distributed.optim import ZeroRedundancyOptimizer
+from torch.optim.optimizer import Optimizer
+from torch.utils.data import DataLoader, Dataset, DistributedSampler, RandomSampler, Sampler
+
+from .types import Any, Iterator, List, Optional, _Config, _Device
+
+SUPPORTED_BACKENDS = ["gloo", "nccl"]
+
+
+def setup_distributed(config: _Config) -> None:
+    """
+    Set up the process group for distributed
+    training if `config.distributed` is set,
+    and set `config.rank`, `config.local_rank`
+    and `config.world_size` accordingly.
+
+    Training is distributed with one process per
+    device (see `DistributedDataParallel`), each of
+    which must load the config itself, e.g. when
+    launched with `torchrun`. Unless the process group
+    is already initialized by the caller, it's
+    initialized with `config.distributed_init_method`
+    (by default from the environment variables
+    `MASTER_ADDR`, `MASTER_PORT`, `RANK` and `WORLD_SIZE`).
+
+    Logging below the warning level is disabled
+    on all processes except the main one.
+    """
+    if not config.distributed:
+        config.rank, config.local_rank, config.world_size = 0, 0, 1
+        return
+
+    if config.distributed_backend not in SUPPORTED_BACKENDS:
+        raise ValueError(
+            f"Param 'distributed_backend' ('{config.distributed_backend}') must be one of {SUPPORTED_BACKENDS}."
+        )
+    if not dist.is_initialized():
+        logging.info(f"Initializing process group with backend '{config.distributed_backend}'...")
+        dist.init_process_group(backend=config.distributed_backend, init_method=config.distributed_init_method)
+        logging.info("Done.")
+
+    config.rank = dist.get_rank()
+    config.world_size = dist.get_world_size()
+    config.local_rank = int(os.environ.get("LOCAL_RANK", config.rank % max(1, torch.cuda.device_count())))
+
+    # Only log from the main process
+    if config.rank != 0:
+        logging.getLogger().setLevel(logging.WARNING)
+
+
+def cleanup_distributed() -> None:
+    """
+    Destroy the process group of distributed
+    training, if initialized.
+    """
+    if is_distributed():
+        dist.destroy_process_group()
+
+
+def is_distributed() -> bool:
+    """
+    Check if training is distributed
+    across multiple processes.
+    """
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank() -> int:
+    """
+    Get the rank of the current process
+    (0 if training isn't distributed).
+    """
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    """
+    Get the number of processes training
+    is distributed across (1 if it isn't).
+    """
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    """
+    Check if the current process is the main one,
+    i.e. the one responsible for checkpointing and
+    logging. Always True if training isn't distributed.
+    """
+    return get_rank() == 0
+
+
+def barrier() -> None:
+    """
+    Wait for all processes to reach this
+    point (no-op if training isn't distributed).
+    """
+    if is_distributed():
+        dist.barrier()
+
+
+def all_gather_objects(obj: Any) -> List[Any]:
+    """
+    Gather a (picklable) object from all processes,
+    ordered by rank. Returns a list with just the object
+    itself if training isn't distributed.
+    """
+    if not is_distributed():
+        return [obj]
+    objects = [None] * get_world_size()
+    dist.all_gather_object(objects, obj)
+    return objects
+
+
+class DistributedEvalSampler(Sampler):
+    """
+    Sampler for evaluation which splits a dataset
+    into disjoint shards, one for each process, with
+    the examples of rank `r` being `r, r + world_size, ...`.
+
+    Unlike `DistributedSampler`, the shards aren't padded
+    (by repeating examples) to be of the same size, so that
+    every example is evaluated exactly once across all
+    processes. The data is never shuffled.
+    """
+
+    def __init__(self, dataset: Dataset, num_replicas: Optional[int] = None, rank: Optional[int] = None):
+        self.dataset = dataset
+        self.num_replicas = num_replicas if num_replicas is not None else get_world_size()
+        self.rank = rank if rank is not None else get_rank()
+        assert 0 <= self.rank < self.num_replicas
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(self.rank, len(self.dataset), self.num_replicas))
+
+    def __len__(self) -> int:
+        return len(range(self.rank, len(self.dataset), self.num_replicas))
+
+
+def is_dataloader_distributed(dataloader: DataLoader) -> bool:
+    """
+    Check if a dataloader only loads the share of
+    its dataset of the current process, i.e. it
+    uses a `DistributedSampler` or `DistributedEvalSampler`.
+    """
+    return is_distributed() and isinstance(dataloader.sampler, (DistributedSampler, DistributedEvalSampler))
+
+
+def get_distributed_dataloader(
+    dataloader: DataLoader,
+    shuffle: Optional[bool] = None,
+    seed: Optional[int] = 0,
+    evaluation: Optional[bool] = False,
+) -> DataLoader:
+    """
+    Get a copy of the `dataloader` which only loads
+    the share of its dataset of the current process
+    (using a `DistributedSampler`), with all other
+    settings (e.g. batch size and workers) retained.
+    Returned as-is if training isn't distributed
+    or it already uses a distributed sampler.
+
+    Call `set_sampler_epoch()` at the start of every
+    epoch for the data to be shuffled differently
+    in each epoch.
+
+    :param shuffle: Whether to shuffle the data. Inferred
+                    from the sampler of `dataloader`
+                    if not provided.
+    :param seed: Seed for shuffling, which must
+                 be the same across all processes
+    :param evaluation: If True, a `DistributedEvalSampler` is used
+                       instead, which neither pads nor shuffles the
+                       shards, so that every example is evaluated
+                       exactly once across all processes
+    """
+    if not is_distributed() or isinstance(dataloader.sampler, (DistributedSampler, DistributedEvalSampler)):
+        return dataloader
+    if dataloader.batch_size is None:
+        raise ValueError("Dataloaders with a custom batch sampler can't be distributed automatically.")
+
+    if evaluation:
+        sampler = DistributedEvalSampler(dataloader.dataset)
+    else:
+        if shuffle is None:
+            shuffle = isinstance(dataloader.sampler, RandomSampler)
+        sampler = DistributedSampler(dataloader.dataset, shuffle=shuffle, seed=seed)
+
+    # Worker options are only allowed with workers
+    kwargs = {}
+    if dataloader.num_workers > 0:
+        kwargs = {"prefetch_factor": dataloader.prefetch_factor, "persistent_workers": dataloader.persistent_workers}
+    return DataLoader(
+        dataloader.dataset,
+        batch_size=dataloader.batch_size,
+        sampler=sampler,
+        num_workers=dataloader.num_workers,
+        collate_fn=dataloader.collate_fn,
+        pin_memory=dataloader.pin_memory,
+        drop_last=dataloader.drop_last,
+        timeout=dataloader.timeout,
+        worker_init_fn=dataloader.worker_init_fn,
+        multiprocessing_context=dataloader.multiprocessing_context,
+        generator=dataloader.generator,
+        **kwargs,
+    )
+
+
+def set_sampler_epoch(dataloader: DataLoader, epoch: int) -> None:
+    """
+    Set the epoch of the `DistributedSampler`
+    of a dataloader (if it uses one), so that its
+    data is shuffled differently in each epoch.
+    """
+    if isinstance(dataloader.sampler, DistributedSampler):
+        dataloader.sampler.set_epoch(epoch)
+
+
+def get_grad_sync_context(model: nn.Module, sync: bool) -> contextlib.AbstractContextManager:
+    """
+    Get the context manager for the forward pass which
+    skips synchronizing the gradients across processes in
+    the backward pass if `sync=False` (e.g. for all but the
+    last batch of a gradient accumulation window).
+    Only the forward pass needs to run inside the context.
+    A no-op context manager is returned if the model
+    isn't distributed or gradients are to be synced.
+    """
+    if sync or not isinstance(model, nn.parallel.DistributedDataParallel):
+        return contextlib.nullcontext()
+    return model.no_sync()
+
+
+def wrap_distributed_model(model: nn.Module, device: _Device) -> DistributedDataParallel:
+    """
+    Wrap a model (already on the given `device`)
+    for distributed training. Returned as-is if
+    it's already wrapped.
+    """
+    if isinstance(model, nn.parallel.DistributedDataParallel):
+        return model
+    device = torch.device(device)
+    logging.info(f"Wrapping model for distributed training across {get_world_size()} processes...")
+    model = DistributedDataParallel(model, device_ids=[device] if device.type == "cuda" else None)
+    logging.info("Done.")
+    return model
+
+
+def shard_optimizer_state(optimizer: Optimizer, scheduler: Optional[object] = None) -> Optimizer:
+    """
+    Get an optimizer of the same type, and with the same param
+    groups and state, as `optimizer`, whose state is sharded
+    across all processes (see `ZeroRedundancyOptimizer`), i.e.
+    each process only holds and updates the state of its share
+    of the parameters. The `scheduler` (if provided) is rebound
+    to the returned optimizer.
+    Returned as-is if it's already sharded.
+
+    The state dict of a sharded optimizer must be consolidated
+    before it can be saved (see `consolidate_optimizer_state()`).
+    Loading a (consolidated) state dict reshards it, such that
+    it may be loaded with any number of processes.
+    """
+    if is_optimizer_sharded(optimizer):
+        return optimizer
+    logging.info(f"Sharding optimizer state across {get_world_size()} processes...")
+    sharded_optimizer = ZeroRedundancyOptimizer(
+        [dict(param_group) for param_group in optimizer.param_groups],
+        optimizer_class=type(optimizer),
+        **optimizer.defaults,
+    )
+    if len(optimizer.state):  # E.g. loaded from a checkpoint for resuming training
+        sharded_optimizer.load_state_dict(optimizer.state_dict())
+    if scheduler is not None:
+        scheduler.optimizer = sharded_optimizer
+    logging.info("Done.")
+    return sharded_optimizer
+
+
+def is_optimizer_sharded(optimizer: Optimizer) -> bool:
+    """
+    Check if the state of an optimizer
+    is sharded across processes.
+    """
+    return isinstance(optimizer, ZeroRedundancyOptimizer)
+
+
+def consolidate_optimizer_state(optimizer: Optimizer) -> None:
+    """
+    Consolidate the state of a sharded optimizer on
+    the main process, after which its entire state dict
+    may be saved there. Must be called by all processes,
+    every time before saving it, since the consolidated
+    state isn't updated by optimizer steps.
+    No-op if the optimizer isn't sharded.
+    """
+    if is_optimizer_sharded(optimizer):
+        optimizer.consolidate_state_dict(to=0)
+
+
+class DistributedDataParallel(nn.parallel.DistributedDataParallel):
+    """
+    Custom DistributedDataParallel class inherited
+    from `nn.parallel.DistributedDataParallel`.
+
+    Similar to `utils.DataParallel`, allows direct access
+    to model attributes and methods (e.g. `predict()`)
+    when it's wrapped in the `module` attribute.
+    """
+
+    def __init__(self, model: nn.Module, **kwargs):
+        super().__init__(model, **kwargs)
+
+    def __getattr__(self, name):
+        """
+        Return model's own attribute if available, otherwise
+        fallback to attribute of parent class.
+        """
+        try:
+            return super().__getattr__(name)
+        except AttributeError:
+            return getattr(self.module, name)
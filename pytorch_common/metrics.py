@@ -1,12 +1,16 @@
+from __future__ import annotations
+
 from collections import OrderedDict
 from functools import partial
 
 import numpy as np
 import torch
+import torch.distributed as dist
 import torch.nn as nn
 from sklearn.metrics import accuracy_score, auc, f1_score, precision_score, recall_score, roc_curve
 
-from .types import Callable, Optional, Tuple, Union, _Config, _EvalCriterionOrCriteria, _Loss
+from .distributed import all_gather_objects
+from .types import Callable, Dict, List, Optional, Tuple, Union, _Config, _Device, _EvalCriterionOrCriteria, _Loss
 from .utils import convert_tensor_to_numpy
 
 REGRESSION_LOSS_CRITERIA = ["mse"]
@@ -17,6 +21,9 @@ REGRESSION_EVAL_CRITERIA = ["mse"]
 CLASSIFICATION_EVAL_CRITERIA = ["accuracy", "precision", "recall", "f1", "auc"]
 EVAL_CRITERIA = REGRESSION_EVAL_CRITERIA + CLASSIFICATION_EVAL_CRITERIA
 
+# Types of averaging supported by the streaming precision / recall / f1
+AVERAGE_TYPES = ["binary", "micro", "macro", "weighted", None]
+
 
 def get_loss_eval_criteria(
     config: _Config, reduction: Optional[str] = "mean", reduction_val: Optional[str] = None
@@ -137,12 +144,17 @@ def get_eval_criterion_function(
                    Mostly used in multiclass settings. E.g. -
                    - `average` for f1, precision, recall
                    - `pos_label` for auc
+                   - `num_bins` and `apply_sigmoid` for auc, only used
+                     by its streaming accumulator (see `AUCAccumulator`)
                    If it's a multilabel setting,
                    `multilabel_reduction` must be provided:
                     Type of multilabel_reduction to be
                     performed on the list of metric values
                     for each class.
                     Choices: "sum" | "mean"
+    :return: An `EvalCriterion`, which may be called directly
+             on all outputs and targets, and can also create
+             a streaming accumulator for the same metric.
     """
     # Check for multilabel classification
     if config.model_type == "classification" and config.classification_type == "multilabel":
@@ -156,6 +168,14 @@ def get_eval_criterion_function(
                 f"Param 'multilabel_reduction' ('{multilabel_reduction}') " f"must be one of ['mean', 'none']."
             )
 
+    # Kwargs only meant for the streaming accumulator
+    accumulator_kwargs = {}
+    if criterion == "auc":
+        accumulator_kwargs = {
+            "num_bins": kwargs.pop("num_bins", None),
+            "apply_sigmoid": kwargs.pop("apply_sigmoid", False),
+        }
+
     # Get per-label eval criterion
     if criterion in REGRESSION_EVAL_CRITERIA:
         eval_criterion = partial(get_regression_eval_metric, criterion=criterion, **kwargs)
@@ -163,21 +183,102 @@ def get_eval_criterion_function(
         eval_criterion = partial(get_class_eval_metric, criterion=criterion, **kwargs)
     else:
         raise ValueError(f"Param 'criterion' ('{criterion}') must be one of {EVAL_CRITERIA}.")
+    accumulator_fn = partial(get_metric_accumulator, criterion=criterion, **accumulator_kwargs, **kwargs)
 
     # Regression
     if config.model_type == "regression":
-        return eval_criterion
+        return EvalCriterion(eval_criterion, accumulator_fn)
 
     # Binary / Multiclass classification
     elif config.classification_type in ["binary", "multiclass"]:
-        return eval_criterion
+        return EvalCriterion(eval_criterion, accumulator_fn)
 
     # Multilabel classification
     else:
-        return lambda output_hist, y_hist: agg_func(
-            [eval_criterion(output_hist, y_hist[..., i]) for i in range(y_hist.shape[-1])]
+        return EvalCriterion(
+            lambda output_hist, y_hist: agg_func(
+                [eval_criterion(output_hist, y_hist[..., i]) for i in range(y_hist.shape[-1])]
+            ),
+            partial(MultilabelAccumulator.create, accumulator_fn, agg_func),
+        )
+
+
+def compute_eval_metrics(
+    output_hist: Optional[torch.Tensor],
+    y_hist: Optional[torch.Tensor],
+    eval_criteria: _EvalCriterionOrCriteria,
+    accumulators: Optional[Dict[str, Optional[MetricAccumulator]]] = None,
+) -> Dict[str, float]:
+    """
+    Compute all `eval_criteria` on the
+    given model outputs and true targets.
+    If `accumulators` are provided, the value of
+    each criterion having an accumulator is
+    computed from its accumulated state instead,
+    and `output_hist` / `y_hist` are only required
+    for the remaining criteria.
+    """
+    if accumulators is None:
+        accumulators = {}
+
+    eval_metrics = {}
+    for eval_criterion, eval_fn in eval_criteria.items():
+        accumulator = accumulators.get(eval_criterion)
+        if accumulator is not None:
+            eval_metrics[eval_criterion] = accumulator.compute()
+        else:
+            eval_metrics[eval_criterion] = eval_fn(output_hist, y_hist)
+    return eval_metrics
+
+
+def get_metric_accumulators(eval_criteria: _EvalCriterionOrCriteria) -> Dict[str, Optional[MetricAccumulator]]:
+    """
+    Create a fresh streaming accumulator for
+    each of the `eval_criteria`.
+    The value is None for criteria which do not support
+    streaming, e.g. custom eval functions or unsupported
+    kwargs, in which case the metric must be computed
+    on all outputs and targets at once.
+    """
+    return {
+        eval_criterion: eval_fn.get_accumulator() if isinstance(eval_fn, EvalCriterion) else None
+        for eval_criterion, eval_fn in eval_criteria.items()
+    }
+
+
+def get_metric_accumulator(criterion: str, **kwargs) -> Optional[MetricAccumulator]:
+    """
+    Get a streaming accumulator for a given
+    (single-label) eval `criterion`, or None
+    if it cannot be computed in a streaming
+    fashion with the given `kwargs`.
+    """
+    if criterion == "mse":
+        if set(kwargs) - {"reduction"} or kwargs.get("reduction", "mean") not in ["mean", "sum"]:
+            return None
+        return MSEAccumulator(**kwargs)
+
+    elif criterion == "auc":
+        if set(kwargs) - {"num_bins", "pos_label", "apply_sigmoid", "drop_intermediate"}:
+            return None
+        return AUCAccumulator(
+            num_bins=kwargs.get("num_bins"),
+            pos_label=kwargs.get("pos_label"),
+            apply_sigmoid=kwargs.get("apply_sigmoid", False),
         )
 
+    elif criterion == "accuracy":
+        if set(kwargs) - {"normalize"}:
+            return None
+        return ConfusionMatrixAccumulator(criterion, **kwargs)
+
+    elif criterion in ["precision", "recall", "f1"]:
+        if set(kwargs) - {"average", "pos_label"} or kwargs.get("average", "binary") not in AVERAGE_TYPES:
+            return None
+        return ConfusionMatrixAccumulator(criterion, **kwargs)
+
+    raise ValueError(f"Param 'criterion' ('{criterion}') must be one of {EVAL_CRITERIA}.")
+
 
 def get_regression_eval_metric(
     output_hist: torch.Tensor, y_true: torch.Tensor, criterion: Optional[str] = "mse", **kwargs
@@ -230,6 +331,447 @@ def get_class_eval_metric(
     return criterion_fn_dict[criterion](y_true, y_predicted.astype(int), **kwargs)
 
 
+class EvalCriterion:
+    """
+    Callable wrapper around an eval criterion function.
+
+    Calling it on all model outputs and true targets works
+    exactly like the wrapped function. Additionally, it can
+    create a streaming accumulator for the same metric, so
+    that the metric can be computed batch-wise without
+    storing the outputs of the whole dataset.
+    """
+
+    def __init__(
+        self,
+        eval_fn: Callable[[torch.Tensor, torch.Tensor], Union[float, np.ndarray]],
+        accumulator_fn: Optional[Callable[[], Optional[MetricAccumulator]]] = None,
+    ):
+        """
+        :param eval_fn: Function computing the metric
+                        on all outputs and targets
+        :param accumulator_fn: Function returning a fresh
+                               accumulator for the metric,
+                               or None if not supported
+        """
+        self.eval_fn = eval_fn
+        self.accumulator_fn = accumulator_fn
+
+    def __call__(self, output_hist: torch.Tensor, y_hist: torch.Tensor) -> Union[float, np.ndarray]:
+        return self.eval_fn(output_hist, y_hist)
+
+    def get_accumulator(self) -> Optional[MetricAccumulator]:
+        """
+        Return a fresh accumulator for this
+        criterion (None if not supported).
+        """
+        if self.accumulator_fn is None:
+            return None
+        return self.accumulator_fn()
+
+
+class MetricAccumulator:
+    """
+    Base class for mergeable streaming metric state.
+
+    The accumulator is updated with the outputs and targets of
+    one batch at a time, and the metric is computed at the end
+    from the accumulated state. Its memory is independent of the
+    size of the dataset (with the exception of the exact AUC).
+    Accumulators of the same type can be merged, e.g. ones
+    computed on different shards of a dataset, including across
+    the processes of distributed training (see `all_reduce()`).
+
+    The state is kept on the device of the first batch
+    it's updated with, so updating it doesn't require any
+    host synchronization or transfer of the outputs.
+    """
+
+    def update(self, output_hist: torch.Tensor, y_true: torch.Tensor) -> None:
+        """
+        Update the state with the outputs
+        and true targets of a batch.
+        """
+        raise NotImplementedError
+
+    def merge(self, other: MetricAccumulator) -> MetricAccumulator:
+        """
+        Merge the state of another accumulator
+        of the same type into this one (in-place).
+        """
+        raise NotImplementedError
+
+    def compute(self) -> Union[float, np.ndarray]:
+        """
+        Compute the metric from the accumulated state.
+        """
+        raise NotImplementedError
+
+    def reset(self) -> None:
+        """
+        Reset the accumulated state.
+        """
+        raise NotImplementedError
+
+    def all_reduce(self, device: _Device) -> None:
+        """
+        Merge the states of the accumulators of all processes
+        of distributed training into this one (in-place), so
+        that every process computes the metric on the union of
+        their shards. Must be called by all processes. The
+        state is communicated on the given `device`.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _all_reduce_state(
+        state: Optional[torch.Tensor], device: _Device, dtype: Optional[torch.dtype] = torch.long
+    ) -> Optional[torch.Tensor]:
+        """
+        Sum a state tensor (of the same shape in all processes)
+        across all processes, and return it flattened. Processes
+        without any state (e.g. without any examples) contribute
+        zeros. Returns None if none of them have any state.
+        """
+        numel = torch.tensor([0 if state is None else state.numel()], device=device)
+        dist.all_reduce(numel, op=dist.ReduceOp.MAX)
+        if numel.item() == 0:
+            return None
+        if state is None:
+            state = torch.zeros(numel.item(), dtype=dtype, device=device)
+        state = state.reshape(-1).to(device=device, dtype=dtype)
+        dist.all_reduce(state)
+        return state
+
+    @staticmethod
+    def _add_state(state: Optional[torch.Tensor], value: Optional[torch.Tensor]) -> Optional[torch.Tensor]:
+        """
+        Add `value` to `state`, either
+        of which may not be initialized.
+        """
+        if value is None:
+            return state
+        if state is None:
+            return value.clone()
+        return state + value.to(state.device)
+
+
+class MSEAccumulator(MetricAccumulator):
+    """
+    Streaming accumulator for the MSE.
+    Keeps track of the sum of squared
+    errors and the number of elements.
+    """
+
+    def __init__(self, reduction: Optional[str] = "mean"):
+        self.reduction = reduction
+        self.reset()
+
+    def reset(self) -> None:
+        self.sum_squared_error: Optional[torch.Tensor] = None
+        self.count = 0
+
+    def update(self, output_hist: torch.Tensor, y_true: torch.Tensor) -> None:
+        assert y_true.shape == output_hist.shape
+        squared_error = (output_hist.double() - y_true.double()).pow(2).sum()
+        self.sum_squared_error = self._add_state(self.sum_squared_error, squared_error)
+        self.count += y_true.numel()
+
+    def merge(self, other: MSEAccumulator) -> MSEAccumulator:
+        self.sum_squared_error = self._add_state(self.sum_squared_error, other.sum_squared_error)
+        self.count += other.count
+        return self
+
+    def all_reduce(self, device: _Device) -> None:
+        sum_squared_error = 0.0 if self.sum_squared_error is None else self.sum_squared_error
+        state = torch.stack(
+            [torch.as_tensor(value, dtype=torch.double, device=device) for value in [sum_squared_error, self.count]]
+        )
+        state = self._all_reduce_state(state, device, dtype=torch.double)
+        self.count = int(state[1].item())
+        self.sum_squared_error = state[0] if self.count > 0 else None
+
+    def compute(self) -> float:
+        if self.sum_squared_error is None:
+            return np.nan
+        sum_squared_error = self.sum_squared_error.item()
+        return sum_squared_error if self.reduction == "sum" else sum_squared_error / self.count
+
+
+class ConfusionMatrixAccumulator(MetricAccumulator):
+    """
+    Streaming accumulator for discrete classification
+    metrics (accuracy, precision, recall, f1), computed
+    from a confusion matrix of true (rows) vs
+    predicted (columns) classes.
+
+    The results match those of the respective
+    `sklearn.metrics` functions, where the labels
+    considered are the ones present in either the
+    targets or the predictions.
+    """
+
+    def __init__(
+        self,
+        criterion: Optional[str] = "accuracy",
+        average: Optional[str] = "binary",
+        pos_label: Optional[int] = 1,
+        normalize: Optional[bool] = True,
+    ):
+        """
+        :param average: Type of averaging for precision /
+                        recall / f1 (see `AVERAGE_TYPES`)
+        :param pos_label: Positive class if `average="binary"`
+        :param normalize: Whether to return the fraction (or
+                          the number) of correct predictions
+                          for accuracy
+        """
+        assert criterion in ["accuracy", "precision", "recall", "f1"]
+        assert average in AVERAGE_TYPES, f"Param 'average' ('{average}') must be one of {AVERAGE_TYPES}."
+        self.criterion = criterion
+        self.average = average
+        self.pos_label = pos_label
+        self.normalize = normalize
+        self.reset()
+
+    def reset(self) -> None:
+        self.confusion_matrix: Optional[torch.Tensor] = None
+
+    def update(self, output_hist: torch.Tensor, y_true: torch.Tensor) -> None:
+        y_predicted = output_hist.max(dim=-1)[1]
+        y_true = y_true.long()
+        assert y_true.shape == y_predicted.shape
+
+        num_classes = output_hist.shape[-1]
+        if ((y_true < 0) | (y_true >= num_classes)).any():
+            raise ValueError(f"Targets must be class labels in [0, {num_classes}) as per the model outputs.")
+        confusion_matrix = torch.bincount(
+            y_true.reshape(-1) * num_classes + y_predicted.reshape(-1), minlength=num_classes ** 2
+        ).view(num_classes, num_classes)
+        self.confusion_matrix = self._add_state(self.confusion_matrix, confusion_matrix)
+
+    def merge(self, other: ConfusionMatrixAccumulator) -> ConfusionMatrixAccumulator:
+        self.confusion_matrix = self._add_state(self.confusion_matrix, other.confusion_matrix)
+        return self
+
+    def all_reduce(self, device: _Device) -> None:
+        confusion_matrix = self._all_reduce_state(self.confusion_matrix, device)
+        if confusion_matrix is not None:
+            num_classes = int(round(confusion_matrix.numel() ** 0.5))
+            self.confusion_matrix = confusion_matrix.view(num_classes, num_classes)
+
+    def compute(self) -> Union[float, np.ndarray]:
+        if self.confusion_matrix is None:
+            return np.nan
+        confusion_matrix = self.confusion_matrix.cpu().numpy().astype(np.float64)
+        true_positives = np.diag(confusion_matrix)
+
+        if self.criterion == "accuracy":
+            num_correct = true_positives.sum()
+            return num_correct / confusion_matrix.sum() if self.normalize else num_correct
+
+        support, num_predicted = confusion_matrix.sum(axis=1), confusion_matrix.sum(axis=0)
+        if self.average == "micro":
+            true_positives, support, num_predicted = (
+                true_positives.sum(keepdims=True),
+                support.sum(keepdims=True),
+                num_predicted.sum(keepdims=True),
+            )
+
+        # Per-class precision / recall / f1 (zero where undefined, same as sklearn)
+        precision = _safe_divide(true_positives, num_predicted)
+        recall = _safe_divide(true_positives, support)
+        f1 = _safe_divide(2 * precision * recall, precision + recall)
+        values = {"precision": precision, "recall": recall, "f1": f1}[self.criterion]
+
+        if self.average == "micro":
+            return values[0]
+
+        # Only consider labels present in either targets or predictions
+        labels = (support + num_predicted) > 0
+        if self.average == "binary":
+            if labels.sum() > 2:  # Same as sklearn
+                raise ValueError(
+                    f"Target is multiclass but average='binary'. "
+                    f"Please choose another average setting, one of {[a for a in AVERAGE_TYPES if a != 'binary']}."
+                )
+            return values[self.pos_label] if self.pos_label < len(values) else 0.0
+        values, support = values[labels], support[labels]
+        if self.average is None:
+            return values
+        if self.average == "weighted":
+            return float(_safe_divide(np.sum(values * support), np.sum(support)))
+        return values.mean()  # Macro average
+
+
+class AUCAccumulator(MetricAccumulator):
+    """
+    Streaming accumulator for the ROC AUC computed
+    from the scores of class 1, same as in
+    `get_class_eval_metric()`. It can be:
+      - exact: only the (1-D) scores and targets are
+        stored, instead of all raw model outputs
+      - binned: histograms of the scores for the positive
+        and negative class are stored, which requires
+        constant memory. The scores must be probabilities,
+        which are binned into `num_bins` equal bins of [0, 1],
+        unless `apply_sigmoid` is set for scores that are
+        logits, which are then mapped to [0, 1] with a
+        sigmoid first. Note that the bins of very confident
+        logits (of magnitude above ~10) coincide then.
+    """
+
+    def __init__(
+        self,
+        num_bins: Optional[int] = None,
+        pos_label: Optional[int] = None,
+        apply_sigmoid: Optional[bool] = False,
+    ):
+        """
+        :param num_bins: Number of bins for the binned AUC.
+                         If None, the exact AUC is computed.
+        :param pos_label: Label of the positive class
+        :param apply_sigmoid: Whether the scores are logits to be
+                              mapped to probabilities before binning
+        """
+        self.num_bins = num_bins
+        self.pos_label = 1 if pos_label is None else pos_label
+        self.apply_sigmoid = apply_sigmoid
+        self.reset()
+
+    def reset(self) -> None:
+        self.scores: List[torch.Tensor] = []
+        self.targets: List[torch.Tensor] = []
+        self.pos_hist: Optional[torch.Tensor] = None
+        self.neg_hist: Optional[torch.Tensor] = None
+
+    def update(self, output_hist: torch.Tensor, y_true: torch.Tensor) -> None:
+        scores, is_positive = output_hist[:, 1].double(), y_true.long() == self.pos_label
+        assert scores.shape == is_positive.shape
+
+        if self.num_bins is None:  # Exact
+            self.scores.append(scores.cpu())
+            self.targets.append(is_positive.cpu())
+        else:  # Binned
+            probs = torch.sigmoid(scores) if self.apply_sigmoid else scores
+            bins = (probs * self.num_bins).long().clamp_(0, self.num_bins - 1)
+            self.pos_hist = self._add_state(self.pos_hist, torch.bincount(bins[is_positive], minlength=self.num_bins))
+            self.neg_hist = self._add_state(self.neg_hist, torch.bincount(bins[~is_positive], minlength=self.num_bins))
+
+    def merge(self, other: AUCAccumulator) -> AUCAccumulator:
+        assert (
+            self.num_bins == other.num_bins and self.apply_sigmoid == other.apply_sigmoid
+        ), "Only AUC accumulators with the same bins can be merged."
+        self.scores.extend(other.scores)
+        self.targets.extend(other.targets)
+        self.pos_hist = self._add_state(self.pos_hist, other.pos_hist)
+        self.neg_hist = self._add_state(self.neg_hist, other.neg_hist)
+        return self
+
+    def all_reduce(self, device: _Device) -> None:
+        if self.num_bins is None:  # Exact AUC requires gathering all (1-D) scores
+            all_scores_and_targets = all_gather_objects((self.scores, self.targets))
+            self.scores = [scores for all_scores, _ in all_scores_and_targets for scores in all_scores]
+            self.targets = [targets for _, all_targets in all_scores_and_targets for targets in all_targets]
+        else:  # Only the histograms need to be summed
+            self.pos_hist = self._all_reduce_state(self.pos_hist, device)
+            self.neg_hist = self._all_reduce_state(self.neg_hist, device)
+
+    def compute(self) -> float:
+        if self.num_bins is None:  # Exact
+            if not len(self.scores):
+                return np.nan
+            y_true = torch.cat(self.targets).numpy().astype(int)
+            fpr, tpr, _ = roc_curve(y_true, torch.cat(self.scores).numpy())
+            return auc(fpr, tpr)
+
+        if self.pos_hist is None:
+            return np.nan
+        pos_hist = self.pos_hist.cpu().numpy().astype(np.float64)
+        neg_hist = self.neg_hist.cpu().numpy().astype(np.float64)
+        num_pos, num_neg = pos_hist.sum(), neg_hist.sum()
+        if num_pos == 0 or num_neg == 0:  # AUC undefined, same as sklearn
+            return np.nan
+
+        # Probability that a positive example is ranked above a
+        # negative one, counting ties (same bin) as one half
+        num_neg_below = np.cumsum(neg_hist) - neg_hist
+        return np.sum(pos_hist * (num_neg_below + 0.5 * neg_hist)) / (num_pos * num_neg)
+
+
+class MultilabelAccumulator(MetricAccumulator):
+    """
+    Streaming accumulator for multilabel classification,
+    which keeps one accumulator for each label and
+    aggregates their values at the end.
+    """
+
+    def __init__(
+        self,
+        accumulator_fn: Callable[[], MetricAccumulator],
+        agg_func: Callable[[List[float]], Union[float, np.ndarray]],
+    ):
+        """
+        :param accumulator_fn: Function returning a fresh
+                               accumulator for one label
+        :param agg_func: Function to aggregate the
+                         values across all labels
+        """
+        self.accumulator_fn = accumulator_fn
+        self.agg_func = agg_func
+        self.reset()
+
+    @classmethod
+    def create(
+        cls,
+        accumulator_fn: Callable[[], Optional[MetricAccumulator]],
+        agg_func: Callable[[List[float]], Union[float, np.ndarray]],
+    ) -> Optional[MultilabelAccumulator]:
+        """
+        Return a multilabel accumulator if the per-label
+        metric can be accumulated, otherwise None.
+        """
+        if accumulator_fn() is None:
+            return None
+        return cls(accumulator_fn, agg_func)
+
+    def reset(self) -> None:
+        self.accumulators: List[MetricAccumulator] = []
+
+    def update(self, output_hist: torch.Tensor, y_hist: torch.Tensor) -> None:
+        if not len(self.accumulators):
+            self.accumulators = [self.accumulator_fn() for _ in range(y_hist.shape[-1])]
+        for i, accumulator in enumerate(self.accumulators):
+            accumulator.update(output_hist, y_hist[..., i])
+
+    def merge(self, other: MultilabelAccumulator) -> MultilabelAccumulator:
+        if not len(self.accumulators):
+            self.accumulators = [self.accumulator_fn() for _ in range(len(other.accumulators))]
+        for accumulator, other_accumulator in zip(self.accumulators, other.accumulators):
+            accumulator.merge(other_accumulator)
+        return self
+
+    def all_reduce(self, device: _Device) -> None:
+        num_labels = torch.tensor([len(self.accumulators)], device=device)
+        dist.all_reduce(num_labels, op=dist.ReduceOp.MAX)
+        if not len(self.accumulators):
+            self.accumulators = [self.accumulator_fn() for _ in range(num_labels.item())]
+        for accumulator in self.accumulators:
+            accumulator.all_reduce(device)
+
+    def compute(self) -> Union[float, np.ndarray]:
+        return self.agg_func([accumulator.compute() for accumulator in self.accumulators])
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """
+    Element-wise division, which is
+    zero wherever the denominator is zero.
+    """
+    numerator, denominator = np.asarray(numerator, dtype=np.float64), np.asarray(denominator, dtype=np.float64)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+
+
 class FocalLoss(nn.Module):
     """
     Implement the focal loss for binary classification (ignores regression).
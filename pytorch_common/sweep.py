@@ -0,0 +1,579 @@
+from __future__ import annotations
+
+import glob
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import re
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+import numpy as np
+import pandas as pd
+import torch
+
+from .config import load_pytorch_common_config
+from .train_utils import EarlyStopping, load_checkpoint_info
+from .types import Any, Dict, List, Optional, Set, Tuple, Union, _Config, _StringDict, _TrialFn
+from .utils import ModelTracker, get_checkpoint_name, get_file_path, get_unique_config_name, make_dirs
+
+SEARCH_MODES = ["grid", "random"]
+
+
+def get_search_space_trials(
+    search_space: Dict[str, Any],
+    mode: Optional[str] = "grid",
+    num_trials: Optional[int] = None,
+    seed: Optional[int] = 0,
+) -> List[_StringDict]:
+    """
+    Get the hyperparameters of all trials of a sweep over
+    the `search_space`, which maps each hyperparameter
+    (i.e. config key) to its candidate values.
+
+    :param mode: How the search space is explored
+                 Choices = "grid" | "random"
+                 Default = "grid"
+                   - "grid": All combinations of the
+                     values (which must be lists)
+                   - "random": `num_trials` random combinations,
+                     with each value either sampled uniformly
+                     from a list, or obtained by calling a
+                     function with a `np.random.RandomState`,
+                     e.g. `lambda rng: 10 ** rng.uniform(-4, -2)`
+    :param num_trials: Number of trials for random search
+    :param seed: Seed for random search
+    """
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Param 'mode' ('{mode}') must be one of {SEARCH_MODES}.")
+
+    if mode == "grid":
+        for name, values in search_space.items():
+            if callable(values):
+                raise ValueError(f"Values of hyperparameter '{name}' must be a list for grid search.")
+        return [dict(zip(search_space.keys(), values)) for values in itertools.product(*search_space.values())]
+
+    if num_trials is None:
+        raise ValueError("Param 'num_trials' must be provided for random search.")
+    rng = np.random.RandomState(seed)
+
+    def sample(values: Any) -> Any:
+        value = values(rng) if callable(values) else values[rng.randint(len(values))]
+        return value.item() if isinstance(value, np.generic) else value  # Use Python scalars for configs
+
+    return [{name: sample(values) for name, values in search_space.items()} for _ in range(num_trials)]
+
+
+def run_sweep(
+    trial_fn: _TrialFn,
+    search_space: Union[Dict[str, Any], List[_StringDict]],
+    config_dict: Optional[_StringDict] = None,
+    mode: Optional[str] = "grid",
+    num_trials: Optional[int] = None,
+    seed: Optional[int] = 0,
+    max_workers: Optional[int] = 1,
+    num_threads_per_trial: Optional[int] = None,
+    results_file: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Run a hyperparameter sweep, with the trials
+    trained in parallel in a pool of processes.
+
+    The config of each trial is the default pytorch_common
+    config overridden with `config_dict`, and then with the
+    hyperparameters of the trial, which are also used as its
+    `config_info_dict`, i.e. its runs (e.g. checkpoints) are
+    keyed by `get_unique_config_name(model_name, hyperparams)`.
+
+    `trial_fn(config, config_info_dict)` must create the
+    model, dataloaders etc. for a trial from its config, train
+    it with `train_model()` (passing `config_info_dict` to it),
+    and return the `return_dict` of the latter. It must be
+    picklable (i.e. defined at the module level) if trials are
+    run in parallel.
+
+    Trials which are already finished are skipped, i.e. those
+    whose result is already in `results_file`, or (unless
+    checkpointing is disabled) whose best model checkpoint
+    saved at the end of `train_model()` already exists and
+    records that training was finished, in which case their
+    result is obtained from the small info file saved
+    alongside the checkpoint (without loading the model).
+    Trials which fail are logged and left out of the results,
+    such that they're run again if the sweep is rerun.
+    If a trial is interrupted with a keyboard interrupt, the
+    whole sweep is stopped (without recording its result).
+
+    The results table has one row per trial, with its config
+    name, hyperparameters, the best epoch (and step, if found
+    in the middle of an epoch), the validation loss and eval
+    metrics at it (from its `val_logger`), and the time taken
+    to run the trial. It's written to `results_file` after
+    every trial (so that an interrupted sweep may be resumed),
+    and returned at the end.
+
+    :param search_space: Either the search space to be explored
+                         as per `mode` (see `get_search_space_trials()`),
+                         or the list of hyperparameters of all trials
+    :param max_workers: Number of trials run in parallel. If 1,
+                        trials are run one by one in this process.
+    :param num_threads_per_trial: Number of CPU threads used by torch in
+                                  each trial. Defaults to an even share of
+                                  all CPUs if trials are run in parallel.
+    :param results_file: Path to the results (CSV) file. Defaults to
+                         "sweep_results.csv" in `config.output_dir`
+                         (or `config.artifact_dir` if it isn't set).
+    """
+    assert isinstance(max_workers, int) and max_workers >= 1, "Param 'max_workers' must be a positive integer."
+    config_dict = config_dict if config_dict is not None else {}
+    config = load_pytorch_common_config(config_dict)
+    results_file = _get_results_file(config, results_file)
+    if num_threads_per_trial is None and max_workers > 1:
+        num_threads_per_trial = max(1, (os.cpu_count() or 1) // max_workers)
+
+    if isinstance(search_space, dict):
+        search_space = get_search_space_trials(search_space, mode, num_trials, seed)
+
+    results = pd.read_csv(results_file).to_dict("records") if os.path.isfile(results_file) else []
+    finished_trials = set(result["config_name"] for result in results)
+
+    def add_result(config_name: str, hyperparams: _StringDict, result: _StringDict) -> None:
+        """
+        Add the result of a trial, and (atomically)
+        rewrite the results file with it.
+        """
+        results.append({"config_name": config_name, **hyperparams, **result})
+        finished_trials.add(config_name)
+        _write_results(results, results_file)
+
+    # Get the trials yet to be run, skipping finished (and duplicate) ones
+    pending_trials: Dict[str, _StringDict] = {}
+    for hyperparams in search_space:
+        trial_config = config.copy()
+        trial_config.update(hyperparams)
+        config_name = get_unique_config_name(trial_config.model_name, hyperparams)
+        if config_name in finished_trials or config_name in pending_trials:
+            continue
+        result = None if config.disable_checkpointing else get_checkpointed_trial_result(trial_config, hyperparams)
+        if result is not None:
+            logging.info(f"Trial '{config_name}' is already finished. Skipping it.")
+            add_result(config_name, hyperparams, result)
+        else:
+            pending_trials[config_name] = hyperparams
+    logging.info(f"Running {len(pending_trials)} trials with {max_workers} worker(s)...")
+
+    def run_trials() -> None:
+        """
+        Run all pending trials and add their results as they finish.
+        """
+        if max_workers == 1:
+            for config_name, hyperparams in pending_trials.items():
+                try:
+                    result = _run_trial(trial_fn, config_dict, hyperparams, num_threads_per_trial)
+                except Exception as e:
+                    logging.error(f"Trial '{config_name}' failed: {e!r}")
+                    continue
+                add_result(config_name, hyperparams, result)
+            return
+
+        # Spawn (instead of fork) workers for them to be able to use CUDA
+        with ProcessPoolExecutor(max_workers, mp_context=mp.get_context("spawn")) as executor:
+            futures = {
+                executor.submit(_run_trial, trial_fn, config_dict, hyperparams, num_threads_per_trial): config_name
+                for config_name, hyperparams in pending_trials.items()
+            }
+            for future in as_completed(futures):
+                config_name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logging.error(f"Trial '{config_name}' failed: {e!r}")
+                    continue
+                add_result(config_name, pending_trials[config_name], result)
+
+    num_threads = torch.get_num_threads()
+    try:
+        run_trials()
+    finally:
+        torch.set_num_threads(num_threads)  # Trials run in this process may have changed it
+    logging.info(f"Done. Results written to '{results_file}'.")
+    return pd.DataFrame(results)
+
+
+def _run_trial(
+    trial_fn: _TrialFn,
+    config_dict: _StringDict,
+    hyperparams: _StringDict,
+    num_threads: Optional[int] = None,
+    start_epoch: Optional[int] = 0,
+    epochs: Optional[int] = None,
+    mode: Optional[str] = "maximize",
+) -> _StringDict:
+    """
+    Run a single trial of a sweep and get its result.
+    Helper function for `run_sweep()` and `run_successive_halving()`.
+
+    If `epochs` is provided, the trial is only trained from
+    `start_epoch` up to that epoch (i.e. for one rung of
+    successive halving), resuming from the checkpoint saved at
+    `start_epoch` (if non-zero), and the best early stopping metric
+    of all evaluations so far (as per `mode`) is added to the result
+    as "rung_metric" (see `get_best_early_stopping_metric()`).
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    start_time = time.time()
+    if epochs is None:
+        config = load_pytorch_common_config({**config_dict, **hyperparams})
+        return_dict = trial_fn(config, dict(hyperparams))
+    else:
+        config = load_pytorch_common_config({**config_dict, **hyperparams, "epochs": epochs - start_epoch})
+        checkpoint_file = None
+        if start_epoch:  # Resume from the state checkpoint saved at the end of the previous rung
+            checkpoint_file = get_checkpoint_name("state", config.model_name, start_epoch, hyperparams)
+        return_dict = trial_fn(config, dict(hyperparams), start_epoch=start_epoch, checkpoint_file=checkpoint_file)
+    if return_dict["interrupted"]:  # Caught by `train_model()`, so stop the sweep here
+        raise KeyboardInterrupt
+
+    val_logger, best_epoch, best_step = return_dict["val_logger"], return_dict["best_epoch"], return_dict["best_step"]
+    if best_epoch not in val_logger.epochs:  # Not improved upon after resuming
+        best_epoch, best_step = val_logger.best_epoch, None
+    result = get_trial_result(val_logger, best_epoch, best_step)
+    result["stop_epoch"] = return_dict["stop_epoch"]
+    if epochs is not None:
+        result["rung_metric"] = get_best_early_stopping_metric(val_logger, mode)
+    result["time"] = time.time() - start_time
+    return result
+
+
+def _get_results_file(config: _Config, results_file: Optional[str] = None) -> str:
+    """
+    Get the path to the results file of a sweep (see
+    `run_sweep()`), and create its directory.
+    """
+    if results_file is None:
+        results_dir = os.path.expanduser(config.get("output_dir") or config.artifact_dir)
+        results_file = get_file_path(results_dir, "sweep_results.csv")
+    make_dirs(os.path.dirname(os.path.abspath(results_file)))
+    return results_file
+
+
+def _write_results(results: List[_StringDict], results_file: str) -> None:
+    """
+    Atomically (re)write the results table of a sweep.
+    """
+    temp_results_file = f"{results_file}.tmp"
+    pd.DataFrame(results).to_csv(temp_results_file, index=False)
+    os.replace(temp_results_file, results_file)
+
+
+def get_trial_result(val_logger: ModelTracker, best_epoch: int, best_step: Optional[int] = None) -> _StringDict:
+    """
+    Get the result of a trial, i.e. the best epoch (and
+    step), along with the validation loss and eval
+    metrics at it from the `val_logger`.
+    """
+    if best_step is not None:
+        losses, eval_metrics = val_logger.get_step_losses(best_step), val_logger.get_step_eval_metrics(step=best_step)
+    else:
+        losses, eval_metrics = val_logger.get_losses(epoch=best_epoch), val_logger.get_eval_metrics(epoch=best_epoch)
+    result = {"best_epoch": best_epoch, "best_step": best_step, "val_loss": float(np.mean(losses))}
+    result.update({f"val_{eval_criterion}": value for eval_criterion, value in eval_metrics.items()})
+    return result
+
+
+def get_best_early_stopping_metric(val_logger: ModelTracker, mode: Optional[str] = "maximize") -> float:
+    """
+    Get the best early stopping metric of all evaluations
+    (at the end of epochs, and in the middle of them if any)
+    in the `val_logger`, as per `mode` ("maximize" | "minimize"),
+    ignoring NaNs (NaN if there are no other values).
+    """
+    criterion = val_logger.early_stopping_criterion
+    metrics = [*val_logger.get_eval_metrics(criterion).values(), *val_logger.get_step_eval_metrics(criterion).values()]
+    metrics = [metric for metric in metrics if not np.isnan(metric)]
+    if not len(metrics):
+        return np.nan
+    return float(max(metrics) if mode == "maximize" else min(metrics))
+
+
+def get_checkpointed_trial_result(config: _Config, config_info_dict: _StringDict) -> Optional[_StringDict]:
+    """
+    Get the result of a finished trial from the info file of the
+    best model checkpoint saved at the end of `train_model()`
+    (see `load_checkpoint_info()`), or None if there's no such
+    checkpoint, or if training wasn't finished, e.g. if it was
+    interrupted (see `save_model()`). The model itself is never
+    loaded, so this is cheap and doesn't depend on the device.
+
+    Model checkpoints are only saved at the end of training, at
+    the last epoch, and at the best epoch (and step, if found in
+    the middle of an epoch). The latter is the one with a step,
+    if any, otherwise the one at the earliest epoch.
+    """
+    unique_name = get_unique_config_name(config.model_name, config_info_dict)
+    pattern = re.compile(rf"checkpoint-model-{re.escape(unique_name)}-epoch_(\d+)(?:-step_(\d+))?\.pt$")
+    checkpoints = []
+    for checkpoint_path in glob.glob(get_file_path(config.checkpoint_dir, f"checkpoint-model-{unique_name}-*.pt")):
+        match = pattern.match(os.path.basename(checkpoint_path))
+        if match is not None:
+            epoch, step = int(match.group(1)), int(match.group(2)) if match.group(2) is not None else None
+            checkpoints.append((step is None, epoch, os.path.basename(checkpoint_path)))
+    if not len(checkpoints):
+        return None
+
+    _, _, checkpoint_file = min(checkpoints)
+    info = load_checkpoint_info(config, checkpoint_file)
+    if info is None or not info["training_finished"]:
+        return None
+    return get_trial_result(info["val_logger"], info["epoch"], info["step"])
+
+
+class SuccessiveHalvingScheduler:
+    """
+    Asynchronous successive halving (ASHA) scheduler, which
+    decides which trial of a sweep is to be trained next,
+    and for how many epochs.
+
+    Trials are trained in rungs of geometrically increasing
+    numbers of epochs (`min_epochs * reduction_factor ** k`, up
+    to `max_epochs`). Whenever a worker is free, the next job
+    is to promote a trial to the next rung if it's among the top
+    `1 / reduction_factor` of all trials that have finished
+    the current rung so far (starting from the highest rung),
+    or otherwise to start a new trial in the lowest rung.
+    Trials which are never promoted are effectively stopped,
+    and hence most of the compute is spent on the best ones.
+
+    Unlike (synchronous) successive halving, promotions never
+    wait for a rung to be complete, so that workers are never
+    idle, at the cost of a few trials being promoted that might
+    not have been otherwise.
+
+    Reference: https://arxiv.org/abs/1810.05934
+    """
+
+    def __init__(
+        self,
+        num_trials: int,
+        max_epochs: int,
+        min_epochs: Optional[int] = 1,
+        reduction_factor: Optional[int] = 3,
+        mode: Optional[str] = "maximize",
+    ):
+        """
+        :param num_trials: Number of trials in the sweep
+        :param max_epochs: Number of epochs in the highest rung
+        :param min_epochs: Number of epochs in the lowest rung
+        :param reduction_factor: Only the top `1 / reduction_factor`
+                                 trials of each rung are promoted,
+                                 to a rung with these many times
+                                 as many epochs
+        :param mode: Whether to "maximize" or "minimize"
+                     the metric the trials are compared on
+        """
+        assert isinstance(min_epochs, int) and 1 <= min_epochs <= max_epochs
+        assert isinstance(reduction_factor, int) and reduction_factor >= 2
+        if mode not in EarlyStopping.SUPPORTED_MODES:
+            raise ValueError(f"Param 'mode' ('{mode}') must be one of {list(EarlyStopping.SUPPORTED_MODES)}.")
+        self.reduction_factor = reduction_factor
+        self.mode = mode
+
+        # Number of epochs (in total) at the end of each rung
+        self.rung_epochs = [min_epochs]
+        while self.rung_epochs[-1] < max_epochs:
+            self.rung_epochs.append(min(self.rung_epochs[-1] * reduction_factor, max_epochs))
+
+        self.pending_trials = deque(range(num_trials))
+        self.rung_metrics: List[OrderedDict[int, float]] = [OrderedDict() for _ in self.rung_epochs]
+        self.promoted_trials: List[Set[int]] = [set() for _ in self.rung_epochs]
+        self.stopped_trials: Set[int] = set()
+
+    def get_job(self) -> Optional[Tuple[int, int]]:
+        """
+        Get the next job as `(trial, rung)`, i.e. the
+        index of the trial to be trained up to the number
+        of epochs of the given rung, or None if there are
+        no more jobs (for now).
+        """
+        for rung in reversed(range(len(self.rung_epochs) - 1)):
+            for trial in self.get_top_trials(rung):
+                if trial not in self.promoted_trials[rung] and trial not in self.stopped_trials:
+                    self.promoted_trials[rung].add(trial)
+                    return trial, rung + 1
+        if len(self.pending_trials):
+            return self.pending_trials.popleft(), 0
+        return None
+
+    def report(self, trial: int, rung: int, metric: float, stopped: Optional[bool] = False) -> None:
+        """
+        Report the metric of a trial at the end of a rung.
+        :param stopped: Whether the trial stopped before
+                        the end of the rung (e.g. due to
+                        early stopping), in which case
+                        it's never promoted.
+        """
+        self.rung_metrics[rung][trial] = metric
+        if stopped:
+            self.stopped_trials.add(trial)
+
+    def get_top_trials(self, rung: int) -> List[int]:
+        """
+        Get the top `1 / reduction_factor` of the trials
+        that have finished a rung so far, best first.
+        """
+        metrics = self.rung_metrics[rung]
+        sign = 1.0 if self.mode == "maximize" else -1.0
+        sort_key = lambda trial: sign * metrics[trial] if not np.isnan(metrics[trial]) else -np.inf
+        return sorted(metrics, key=sort_key, reverse=True)[: len(metrics) // self.reduction_factor]
+
+
+def run_successive_halving(
+    trial_fn: _TrialFn,
+    search_space: Union[Dict[str, Any], List[_StringDict]],
+    config_dict: Optional[_StringDict] = None,
+    mode: Optional[str] = "random",
+    num_trials: Optional[int] = None,
+    seed: Optional[int] = 0,
+    min_epochs: Optional[int] = 1,
+    max_epochs: Optional[int] = None,
+    reduction_factor: Optional[int] = 3,
+    early_stopping: Optional[EarlyStopping] = None,
+    max_workers: Optional[int] = 1,
+    num_threads_per_trial: Optional[int] = None,
+    results_file: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Run a hyperparameter sweep (see `run_sweep()`) in which
+    the trials are trained in rungs of increasing numbers of
+    epochs, and only the most promising ones are promoted to
+    the next rung (see `SuccessiveHalvingScheduler`), while
+    the rest are stopped.
+
+    Trials are compared at the end of each rung on the best value
+    of `val_logger.get_early_stopping_metric()` up to it (see
+    `get_best_early_stopping_metric()`), such that a trial isn't
+    penalized for a noisy last epoch, and whether it's to be
+    maximized or minimized is obtained from `early_stopping`
+    (by default created for `config.early_stopping_criterion`).
+
+    A trial is promoted by resuming it from the state checkpoint
+    saved at the end of its previous rung, and hence checkpointing
+    must not be disabled. `trial_fn` is called as
+    `trial_fn(config, config_info_dict, start_epoch, checkpoint_file)`
+    with `config.epochs` set to the number of epochs to train for.
+    If `checkpoint_file` isn't None, it must load it into its model,
+    optimizer, scheduler and early stopping object (if used) with
+    `load_model()`, so that the patience of early stopping carries over
+    across rungs, and resume training with `train_model()` from
+    `start_epoch` with the train and val loggers of the checkpoint
+    (the config of the checkpoint must be ignored).
+
+    The results table (see `run_sweep()`) has one row per trial,
+    updated whenever it finishes a rung, with the highest rung
+    it reached, and its last epoch ("stop_epoch"). It's only
+    written for inspection, and isn't used to skip trials when
+    rerunning the sweep.
+
+    :param search_space: Either the search space to be explored
+                         as per `mode` (see `get_search_space_trials()`),
+                         or the list of hyperparameters of all trials
+    :param min_epochs: Number of epochs in the lowest rung
+    :param max_epochs: Number of epochs in the highest rung.
+                       Defaults to `config.epochs`.
+    :param reduction_factor: Only the top `1 / reduction_factor`
+                             trials of each rung are promoted
+    """
+    assert isinstance(max_workers, int) and max_workers >= 1, "Param 'max_workers' must be a positive integer."
+    config_dict = config_dict if config_dict is not None else {}
+    config = load_pytorch_common_config(config_dict)
+    if config.disable_checkpointing:
+        raise ValueError("Checkpointing must be enabled for resuming promoted trials.")
+    results_file = _get_results_file(config, results_file)
+    if num_threads_per_trial is None and max_workers > 1:
+        num_threads_per_trial = max(1, (os.cpu_count() or 1) // max_workers)
+    if early_stopping is None:
+        early_stopping = EarlyStopping(config.early_stopping_criterion)
+
+    if isinstance(search_space, dict):
+        search_space = get_search_space_trials(search_space, mode, num_trials, seed)
+    trials = OrderedDict()  # Deduplicated by config name
+    for hyperparams in search_space:
+        trials.setdefault(get_unique_config_name(config.model_name, hyperparams), hyperparams)
+    trials = list(trials.items())
+    scheduler = SuccessiveHalvingScheduler(
+        len(trials), max_epochs or config.epochs, min_epochs, reduction_factor, early_stopping.mode
+    )
+    logging.info(f"Running {len(trials)} trials in rungs of {scheduler.rung_epochs} epochs...")
+
+    results: OrderedDict[str, _StringDict] = OrderedDict()
+
+    def get_job_args(trial: int, rung: int) -> Tuple:
+        """
+        Get the args of `_run_trial()` for training
+        a trial up to the end of the given rung.
+        """
+        start_epoch = scheduler.rung_epochs[rung - 1] if rung else 0
+        epochs = scheduler.rung_epochs[rung]
+        return trial_fn, config_dict, trials[trial][1], num_threads_per_trial, start_epoch, epochs, early_stopping.mode
+
+    def add_result(trial: int, rung: int, result: _StringDict) -> None:
+        """
+        Report the result of a trial at the end of a rung
+        to the scheduler, and update the results table.
+        """
+        config_name, hyperparams = trials[trial]
+        scheduler.report(trial, rung, result["rung_metric"], result["stop_epoch"] < scheduler.rung_epochs[rung])
+        time_taken = results[config_name]["time"] if config_name in results else 0.0
+        results[config_name] = {"config_name": config_name, **hyperparams, "rung": rung, **result}
+        results[config_name]["time"] += time_taken  # Total time across all rungs
+        _write_results(list(results.values()), results_file)
+
+    def run_jobs() -> None:
+        """
+        Run jobs as per the scheduler until there are none left,
+        keeping all workers busy. Trials which fail are logged and
+        never promoted.
+        """
+        if max_workers == 1:
+            job = scheduler.get_job()
+            while job is not None:
+                try:
+                    add_result(*job, _run_trial(*get_job_args(*job)))
+                except Exception as e:
+                    logging.error(f"Trial '{trials[job[0]][0]}' failed in rung {job[1]}: {e!r}")
+                job = scheduler.get_job()
+            return
+
+        # Spawn (instead of fork) workers for them to be able to use CUDA
+        with ProcessPoolExecutor(max_workers, mp_context=mp.get_context("spawn")) as executor:
+            futures = {}
+            while True:
+                while len(futures) < max_workers:  # Keep all workers busy
+                    job = scheduler.get_job()
+                    if job is None:
+                        break
+                    futures[executor.submit(_run_trial, *get_job_args(*job))] = job
+                if not len(futures):  # No jobs running, and hence none left
+                    break
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = futures.pop(future)
+                    try:
+                        add_result(*job, future.result())
+                    except Exception as e:
+                        logging.error(f"Trial '{trials[job[0]][0]}' failed in rung {job[1]}: {e!r}")
+
+    num_threads = torch.get_num_threads()
+    try:
+        run_jobs()
+    finally:
+        torch.set_num_threads(num_threads)  # Trials run in this process may have changed it
+    num_epochs = sum(result["stop_epoch"] for result in results.values())
+    logging.info(
+        f"Done. Trained for {num_epochs} epochs in total (instead of "
+        f"{len(trials) * scheduler.rung_epochs[-1]}). Results written to '{results_file}'."
+    )
+    return pd.DataFrame(list(results.values()))
@@ -15,16 +15,47 @@ from torch.utils.data import DataLoader
 
 from pytorch_common import timing
 
+from .callbacks import Callback, CallbackHandler, ProfilerCallback, TrainState
+from .distributed import (
+    all_gather_objects,
+    consolidate_optimizer_state,
+    get_distributed_dataloader,
+    get_grad_sync_context,
+    is_dataloader_distributed,
+    is_main_process,
+    is_optimizer_sharded,
+    set_sampler_epoch,
+    shard_optimizer_state,
+    wrap_distributed_model,
+)
+from .metrics import compute_eval_metrics, get_metric_accumulators
 from .types import *
 from .utils import (
+    AsyncCheckpointWriter,
+    BatchPrefetcher,
+    MemoryTracker,
     ModelTracker,
+    PredictionBuffer,
+    ShardedPredictionWriter,
+    StepTimer,
+    ThroughputMeter,
+    copy_model_with_state_dict,
+    get_autocast_context,
+    get_autocast_dtype,
     get_checkpoint_name,
     get_file_path,
     get_model_outputs_only,
+    get_object_size,
+    get_rng_state,
+    is_model_on_gpu,
+    make_dirs,
+    pin_batch_memory,
     remove_object,
     send_batch_to_device,
     send_model_to_device,
     send_optimizer_to_device,
+    set_rng_state,
+    snapshot_to_cpu,
 )
 
 
@@ -47,6 +78,8 @@ def train_model(
     start_epoch: Optional[int] = 0,
     decouple_fn_train: Optional[_DecoupleFnTrain] = None,
     decouple_fn_eval: Optional[_DecoupleFnTrain] = None,
+    callbacks: Optional[List[Callback]] = None,
+    resume_state: Optional[_StringDict] = None,
 ) -> _StringDict:
     """
     Perform the entire model training routine.
@@ -65,6 +98,10 @@ def train_model(
           and before the next one begins, e.g. during saving a
           checkpoint, as it may cause issues while loading the model.
           Instead pause it during training/evaluation within an epoch.
+          If interrupted during training within an epoch, a resumable
+          checkpoint is saved at the last optimizer step (see below).
+          The "model" checkpoints saved at the end of training record
+          whether it was finished, i.e. not interrupted (see `save_model()`).
 
     :param loss_criterion_train: Training loss criterion
     :param loss_criterion_eval: Evaluation loss criterion
@@ -87,128 +124,601 @@ def train_model(
                               during training
     :param decouple_fn_eval: Decoupling function to extract
                              inputs from a batch during evaluation
+    :param callbacks: List of callbacks (see `callbacks.Callback`)
+                      to hook into the training routine, e.g. for
+                      instrumentation, without modifying it
+    :param resume_state: The "training_state" returned by `load_model()`
+                         for a checkpoint saved in the middle of an epoch.
+                         If provided, training is resumed at the exact batch
+                         of that epoch (and `start_epoch` is ignored): the
+                         RNG states at the start of the epoch are restored
+                         so that the dataloader yields batches in the same
+                         order, the batches already trained on are skipped
+                         (they are still loaded, but not trained on), and
+                         the RNG states at the time of saving are restored.
+                         The optimizer and (per-step) scheduler states (and
+                         the state of early stopping, if passed to it) are
+                         restored by `load_model()` itself.
+                         Note: The train losses (and online train metrics) of
+                         the resumed epoch only cover the remaining batches.
+
+    If `config.eval_every_n_steps` is set, the model is additionally
+    evaluated on the validation set every so many optimizer steps (in
+    the middle of epochs), with the results stored in `val_logger` keyed
+    by global step. The best model checkpoint is also replaced at these
+    steps if the model is better, and if early stopping is used, training
+    may be stopped at them as well. Note that the patience of early stopping
+    is then counted in evaluations, i.e. both these steps and epochs.
+    If `config.checkpoint_every_n_steps` is set, a checkpoint is saved
+    every so many optimizer steps, of which only the latest one is kept.
+    All mid-epoch checkpoints store the state required for resuming
+    training from them (see `get_training_state()`).
+
+    If `config.async_checkpointing` is set, checkpoints are only
+    snapshotted to CPU memory in the training loop and written to
+    disk (and removed) by a background thread (see
+    `utils.AsyncCheckpointWriter`), with at most
+    `config.max_inflight_checkpoints` snapshots held in memory.
+    All of them are written by the time this function returns
+    (or raises an error).
+
+    If `config.keep_best_model_in_memory` is set, the best weights are
+    kept as a snapshot in CPU memory (updated in place whenever a better
+    model is found), from which the best model is obtained at the end,
+    instead of reloading its checkpoint from disk. This also works with
+    checkpointing disabled. Note that the optimizer and scheduler states
+    of the best model aren't kept, and hence the optimizer and scheduler
+    returned are always the current ones in this case.
+
+    If `config.distributed` is set, the model is wrapped for distributed
+    data-parallel training (see `distributed.DistributedDataParallel`),
+    for which it must already be on `config.device`, and `train_loader`
+    is replaced by one which only loads the share of the training set
+    of the current process (see `distributed.get_distributed_dataloader()`).
+    Each process also only evaluates its own share of the validation
+    (and training) set, and the losses and eval metrics are reduced
+    across all processes, so that all of them (incl. loggers and early
+    stopping) see the same results on the entire dataset.
+    Only the main process (rank 0) saves checkpoints.
+    If `config.shard_optimizer_state` is also set, the optimizer state
+    is sharded across processes (see `distributed.shard_optimizer_state()`),
+    and consolidated on the main process whenever a checkpoint is saved.
+    The scheduler is rebound to the sharded optimizer. A checkpoint for
+    resuming training isn't saved on a keyboard interrupt in this case,
+    and the best model checkpoint is saved without the optimizer and
+    scheduler states at the end.
+
+    If `config.time_train_steps` is set, the phases of each training step
+    (waiting for data, transfer to the device, forward pass, loss, backward
+    pass, gradient clipping and optimizer step) are timed (see `utils.StepTimer`),
+    and their percentiles in each epoch are stored in `train_logger`
+    (see `ModelTracker.get_step_times()`) and logged along with the loss.
+
+    The throughput (samples/sec and steps/sec) and the ETA of the epoch
+    and the whole run are reported in the progress logs of training
+    (see `utils.ThroughputMeter`), and the throughput of each epoch is
+    stored in `train_logger` (see `ModelTracker.get_throughput()`).
+
+    If `config.track_memory` is set, the memory usage (peak RSS, growth of
+    the Python heap, bytes held in the results of the epoch and the loggers,
+    and the device memory if on GPU) of training and evaluation in each
+    epoch is tracked (see `utils.MemoryTracker`), stored in the loggers
+    (see `ModelTracker.get_memory_usage()`) and logged along with the loss.
+    If `config.memory_sample_every_n_batches` is also set, the memory usage
+    is additionally sampled every so many batches, e.g. for finding leaks.
+
+    If `config.profiler` is set, a window of training steps is profiled
+    with `torch.profiler` as per its params, and the traces and key
+    averages of the operators are exported into `config.log_dir`
+    (see `callbacks.ProfilerCallback`).
+
+    The eval metrics on the training set are computed as per
+    `config.train_metrics_mode`:
+      - "exact": with a separate evaluation pass over the
+        entire training set after each epoch
+      - "online": from the outputs of the training pass itself,
+        which avoids the extra pass over the training set.
+        Note that these metrics are only an approximation of the
+        former since the model changes during the epoch (and
+        layers like dropout are in training mode).
     """
     # Provision to override epochs
     # Otherwise derive from config
     if epochs is None:
         epochs = config.epochs
 
+    # Whether to compute train eval metrics during the training pass itself
+    online_train_metrics = config.train_metrics_mode == "online"
+
+    # Get dtype for mixed precision (None if disabled)
+    autocast_dtype = get_autocast_dtype(config.autocast_dtype)
+
+    # Distribute training across processes if required (only checkpointing from the main one),
+    # and shard the datasets for evaluation such that each example is evaluated exactly once
+    save_checkpoints = not config.disable_checkpointing
+    train_eval_loader = train_loader
+    if config.distributed:
+        model = wrap_distributed_model(model, config.device)
+        train_eval_loader = get_distributed_dataloader(train_loader, evaluation=True)
+        train_loader = get_distributed_dataloader(train_loader, seed=config.seed)
+        val_loader = get_distributed_dataloader(val_loader, evaluation=True)
+        save_checkpoints = save_checkpoints and is_main_process()
+        if config.shard_optimizer_state:
+            optimizer = shard_optimizer_state(optimizer, scheduler)
+
+    # Time the phases of each training step / track the memory usage of each phase if required
+    step_timer = StepTimer(config.device) if config.time_train_steps else None
+    memory_tracker: Optional[MemoryTracker] = None
+    if config.track_memory:
+        memory_tracker = MemoryTracker(config.device, config.memory_sample_every_n_batches)
+
+    # Meter the throughput of each epoch, and the ETA of the run
+    throughput_meter = ThroughputMeter()
+
+    # Write checkpoints in the background if required
+    checkpoint_writer: Optional[AsyncCheckpointWriter] = None
+    if config.async_checkpointing and save_checkpoints:
+        checkpoint_writer = AsyncCheckpointWriter(write_checkpoint, config.max_inflight_checkpoints)
+
+    # Resume training in the middle of an epoch if required
+    if resume_state is not None:
+        start_epoch = resume_state["epoch"] - 1
+        logging.info(f"Resuming training at batch {resume_state['batches_done'] + 1} of epoch {start_epoch + 1}...")
+
     best_epoch, stop_epoch = 0, start_epoch
-    best_checkpoint_file = ""
+    interrupted = False
+    best_step: Optional[int] = None  # Global step of best checkpoint if saved mid-epoch
+    best_checkpoint_file, last_step_checkpoint_file, resume_checkpoint_file = "", "", ""
     best_model: Optional[nn.Module] = None
-    for epoch in range(1 + start_epoch, 1 + start_epoch + epochs):
-        try:
-            # Train epoch
-            train_losses = train_epoch(
-                model=model,
-                dataloader=train_loader,
-                device=config.device,
-                loss_criterion=loss_criterion_train,
-                epoch=epoch,
-                optimizer=optimizer,
-                scheduler=scheduler if config.use_scheduler_after_step else None,
-                decouple_fn=decouple_fn_train,
-            )
+    best_state_dict: Optional[OrderedDict[str, torch.Tensor]] = None  # Best weights if kept in memory
+
+    # Best early stopping metric of all evaluations so far (incl. the ones in the
+    # loaded history if resuming), only required if early stopping isn't used
+    criterion = val_logger.early_stopping_criterion
+    best_metrics = [
+        *val_logger.get_eval_metrics(criterion).values(),
+        *val_logger.get_step_eval_metrics(criterion).values(),
+    ]
+    best_metric: Optional[float] = max(best_metrics) if len(best_metrics) else None
+
+    def get_epoch_memory_usage(logger: ModelTracker) -> Optional[_StringDict]:
+        """
+        Get the summaries of the memory usage of the phases
+        tracked since the last call (if tracked), along with
+        the bytes held in the given logger.
+        """
+        if memory_tracker is None:
+            return None
+        memory_usage = memory_tracker.summarize()
+        memory_usage["logger"] = {"held_bytes": get_object_size(logger)}
+        return memory_usage
 
-            # Evaluate on training set
-            _, eval_metrics_train, _, _ = evaluate_epoch(
-                model=model,
-                dataloader=train_loader,
-                device=config.device,
-                loss_criterion=loss_criterion_eval,
-                eval_criteria=eval_criteria,
-                decouple_fn=decouple_fn_eval,
-            )
-            # Add train losses+eval metrics, and log them
-            train_logger.add_and_log_metrics(train_losses, eval_metrics_train)
-
-            # Evaluate on val set
-            val_losses, eval_metrics_val, _, _ = evaluate_epoch(
-                model=model,
-                dataloader=val_loader,
-                device=config.device,
-                loss_criterion=loss_criterion_eval,
-                eval_criteria=eval_criteria,
-                decouple_fn=decouple_fn_eval,
-            )
-            # Add val losses+eval metrics, and log them
-            val_logger.add_and_log_metrics(val_losses, eval_metrics_val)
-
-            # Take scheduler step
-            if config.use_scheduler_after_epoch:
-                take_scheduler_step(scheduler, np.mean(val_losses))
-
-            # Get early stopping metric
-            early_stopping_metric = val_logger.get_early_stopping_metric()
-
-            # Set best epoch
-            # Check if current epoch better than previous best based
-            # on early stopping (if used) or all epoch history
-            if (config.use_early_stopping and early_stopping.is_better(early_stopping_metric)) or (
-                not config.use_early_stopping and epoch == val_logger.get_overall_best_epoch()
-            ):
-                logging.info("Computing best epoch and adding to validation logger...")
-                val_logger.set_best_epoch(epoch)
-                logging.info("Done.")
+    def update_best_state_dict() -> None:
+        """
+        Update the snapshot of the best weights kept in CPU memory
+        in place (it's only allocated the first time).
+        """
+        nonlocal best_state_dict
 
-                # Replace model checkpoint if required
-                if not config.disable_checkpointing:
-                    logging.info("Replacing current best model checkpoint...")
-                    best_checkpoint_file = save_model(
-                        model, config, epoch, train_logger, val_logger, optimizer, scheduler, config_info_dict,
-                    )
-                    remove_model(config, best_epoch, config_info_dict)
-                    best_epoch = epoch
-                    logging.info("Done.")
+        state_dict = model.module.state_dict() if hasattr(model, "module") else model.state_dict()
+        if best_state_dict is None:
+            best_state_dict = snapshot_to_cpu(state_dict)
+        else:
+            for name, tensor in state_dict.items():
+                best_state_dict[name].copy_(tensor)
 
-            # Quit training if stopping criterion met
-            if config.use_early_stopping and early_stopping.stop(early_stopping_metric):
-                stop_epoch = epoch
-                logging.info(f"Stopping early after {stop_epoch} epochs.")
-                break
+    def is_new_best(metric: float) -> bool:
+        """
+        Check if the early stopping `metric` of an evaluation (at the
+        end of an epoch or in the middle of one) is better than that of
+        all previous ones, as per early stopping if used, otherwise if
+        it's the maximum value (see `ModelTracker.get_overall_best_epoch()`).
+        """
+        nonlocal best_metric
+
+        if config.use_early_stopping:
+            return early_stopping.is_better(metric)
+        if best_metric is None or metric > best_metric:
+            best_metric = metric
+            return True
+        return False
+
+    def consolidate_optimizer() -> None:
+        """
+        Consolidate the state of a sharded optimizer on the main
+        process before saving a checkpoint, which all processes
+        must take part in (no-op if it isn't sharded).
+        """
+        if not config.disable_checkpointing:
+            consolidate_optimizer_state(optimizer)
 
-            stop_epoch = epoch  # Update last epoch trained
-        except KeyboardInterrupt:  # Option to quit training with keyboard interrupt
-            logging.warning("Keyboard Interrupted!")
-            stop_epoch = epoch - 1  # Current epoch training incomplete
-            break
-
-    # Save the model checkpoints
-    if not config.disable_checkpointing:
-        logging.info("Dumping model and results...")
-        save_model(
-            model, config, stop_epoch, train_logger, val_logger, optimizer, scheduler, config_info_dict,
+    def evaluate_at_step(state: TrainState) -> None:
+        """
+        Evaluate on val set in the middle of an epoch, and replace
+        the best model checkpoint if the model is better.
+        If early stopping is used, also stop training
+        if the stopping criterion is met.
+        """
+        nonlocal best_epoch, best_step, best_checkpoint_file
+
+        step = state.global_step
+        val_losses, eval_metrics_val, _, _ = evaluate_epoch(
+            model=model,
+            dataloader=val_loader,
+            device=config.device,
+            loss_criterion=loss_criterion_eval,
+            eval_criteria=eval_criteria,
+            decouple_fn=decouple_fn_eval,
+            autocast_dtype=autocast_dtype,
+            prefetch_depth=config.batch_prefetch_depth,
         )
+        model.train()  # Resume training mode
+        val_logger.add_and_log_step_metrics(step, val_losses, eval_metrics_val)
+        callback_handler.fire("on_eval_end", losses=val_losses, eval_metrics=eval_metrics_val, step=step)
+
+        early_stopping_metric = val_logger.get_early_stopping_metric(step=step)
+        if is_new_best(early_stopping_metric):
+            val_logger.set_best_step(step)
+            if config.keep_best_model_in_memory:
+                update_best_state_dict()
+            consolidate_optimizer()
+            if save_checkpoints:
+                logging.info("Replacing current best model checkpoint...")
+                checkpoint_file = save_model(
+                    model,
+                    config,
+                    state.epoch,
+                    train_logger,
+                    val_logger,
+                    optimizer,
+                    scheduler,
+                    config_info_dict,
+                    step=step,
+                    training_state=get_training_state(state),
+                    checkpoint_writer=checkpoint_writer,
+                    early_stopping=early_stopping,
+                )
+                if best_checkpoint_file not in [checkpoint_file, last_step_checkpoint_file]:
+                    remove_model(
+                        config, best_epoch, config_info_dict, step=best_step, checkpoint_writer=checkpoint_writer
+                    )
+                best_checkpoint_file = checkpoint_file
+                logging.info("Done.")
+                callback_handler.fire("on_checkpoint", checkpoint_file=best_checkpoint_file)
+            best_epoch, best_step = state.epoch, step
+
+        if config.use_early_stopping and early_stopping.stop(early_stopping_metric):
+            logging.info(f"Stopping early after {step} steps.")
+            state.stop_training = True
+
+    def checkpoint_at_step(state: TrainState) -> None:
+        """
+        Save a checkpoint in the middle of an epoch, only
+        keeping the latest such checkpoint (besides the best one).
+        """
+        nonlocal last_step_checkpoint_file
 
-        # Save current and best models
-        save_model(
-            model.copy(),
+        consolidate_optimizer()
+        if not save_checkpoints:
+            return
+        checkpoint_file = save_model(
+            model,
             config,
-            stop_epoch,
+            state.epoch,
             train_logger,
             val_logger,
             optimizer,
             scheduler,
             config_info_dict,
-            checkpoint_type="model",
+            step=state.global_step,
+            training_state=get_training_state(state),
+            checkpoint_writer=checkpoint_writer,
+            early_stopping=early_stopping,
+        )
+        if last_step_checkpoint_file not in ["", checkpoint_file, best_checkpoint_file]:
+            remove_checkpoint_file(config, last_step_checkpoint_file, checkpoint_writer)
+        last_step_checkpoint_file = checkpoint_file
+        callback_handler.fire("on_checkpoint", checkpoint_file=checkpoint_file)
+
+    # Evaluate / checkpoint every few optimizer steps in addition to every epoch
+    callbacks = list(callbacks) if callbacks is not None else []
+    if config.eval_every_n_steps is not None:
+        callbacks.append(_EveryNStepsCallback(config.eval_every_n_steps, evaluate_at_step))
+    if config.checkpoint_every_n_steps is not None and not config.disable_checkpointing:
+        callbacks.append(_EveryNStepsCallback(config.checkpoint_every_n_steps, checkpoint_at_step))
+
+    # Profile training steps if required
+    if config.profiler is not None:
+        callbacks.append(
+            ProfilerCallback(config.log_dir, f"{config.model_name}_profile", device=config.device, **config.profiler)
         )
-        if best_checkpoint_file != "":
-            checkpoint = load_model(model.copy(), config, best_checkpoint_file, optimizer, scheduler)
-            best_model = checkpoint["model"]
-            optimizer, scheduler = checkpoint["optimizer"], checkpoint["scheduler"]
-            checkpoint = None  # Free up memory
+
+    # Set up callbacks with the state shared between them
+    state = TrainState(
+        model=model,
+        config=config,
+        optimizer=optimizer,
+        scheduler=scheduler,
+        train_logger=train_logger,
+        val_logger=val_logger,
+        epoch=start_epoch,
+        global_step=resume_state["global_step"] if resume_state is not None else 0,
+    )
+    callback_handler = CallbackHandler(callbacks, state)
+    callback_handler.fire("on_train_start")
+
+    try:
+        for epoch in range(1 + start_epoch, 1 + start_epoch + epochs):
+            try:
+                state.epoch = epoch
+                state.batches_done = 0
+                set_sampler_epoch(train_loader, epoch)  # Shuffle differently in every epoch if distributed
+
+                # Restore RNG states at the start of the resumed epoch (for the same
+                # order of batches), otherwise store them for resuming this epoch later
+                resume_epoch = resume_state is not None and epoch == start_epoch + 1
+                if resume_epoch:
+                    set_rng_state(resume_state["epoch_rng_state"])
+                    state.batches_done = resume_state["batches_done"]
+                state.epoch_rng_state = get_rng_state()
+
+                callback_handler.fire("on_epoch_start")
+
+                # Train epoch
+                throughput_meter.remaining_epochs = start_epoch + epochs - epoch
+                train_result = train_epoch(
+                    model=model,
+                    dataloader=train_loader,
+                    device=config.device,
+                    loss_criterion=loss_criterion_train,
+                    epoch=epoch,
+                    optimizer=optimizer,
+                    scheduler=scheduler if config.use_scheduler_after_step else None,
+                    decouple_fn=decouple_fn_train,
+                    eval_criteria=eval_criteria if online_train_metrics else None,
+                    gradient_accumulation_steps=config.gradient_accumulation_steps,
+                    autocast_dtype=autocast_dtype,
+                    prefetch_depth=config.batch_prefetch_depth,
+                    callback_handler=callback_handler,
+                    start_batch=state.batches_done,
+                    rng_state=resume_state["rng_state"] if resume_epoch else None,
+                    step_timer=step_timer,
+                    memory_tracker=memory_tracker,
+                    throughput_meter=throughput_meter,
+                )
+                throughput = throughput_meter.summarize()
+
+                if online_train_metrics:  # Eval metrics already computed during training
+                    train_losses, eval_metrics_train = train_result
+                else:  # Evaluate on training set
+                    train_losses = train_result
+                    _, eval_metrics_train, _, _ = evaluate_epoch(
+                        model=model,
+                        dataloader=train_eval_loader,
+                        device=config.device,
+                        loss_criterion=loss_criterion_eval,
+                        eval_criteria=eval_criteria,
+                        decouple_fn=decouple_fn_eval,
+                        autocast_dtype=autocast_dtype,
+                        prefetch_depth=config.batch_prefetch_depth,
+                        memory_tracker=memory_tracker,
+                    )
+                # Add train losses+eval metrics (+throughput, and summaries of step times
+                # and memory usage), and log them
+                step_times = step_timer.summarize() if step_timer is not None else None
+                train_logger.add_and_log_metrics(
+                    train_losses,
+                    eval_metrics_train,
+                    step_times=step_times,
+                    memory_usage=get_epoch_memory_usage(train_logger),
+                    throughput=throughput,
+                )
+
+                # Evaluate on val set
+                val_losses, eval_metrics_val, _, _ = evaluate_epoch(
+                    model=model,
+                    dataloader=val_loader,
+                    device=config.device,
+                    loss_criterion=loss_criterion_eval,
+                    eval_criteria=eval_criteria,
+                    decouple_fn=decouple_fn_eval,
+                    autocast_dtype=autocast_dtype,
+                    callback_handler=callback_handler,
+                    prefetch_depth=config.batch_prefetch_depth,
+                    memory_tracker=memory_tracker,
+                )
+                # Add val losses+eval metrics (+summary of memory usage), and log them
+                val_logger.add_and_log_metrics(
+                    val_losses, eval_metrics_val, memory_usage=get_epoch_memory_usage(val_logger)
+                )
+                callback_handler.fire("on_eval_end", losses=val_losses, eval_metrics=eval_metrics_val)
+
+                # Take scheduler step
+                if config.use_scheduler_after_epoch:
+                    take_scheduler_step(scheduler, np.mean(val_losses))
+
+                # Get early stopping metric
+                early_stopping_metric = val_logger.get_early_stopping_metric()
+
+                # Set best epoch
+                # Check if current epoch better than previous best based
+                # on early stopping (if used) or all evaluation history
+                if is_new_best(early_stopping_metric):
+                    logging.info("Computing best epoch and adding to validation logger...")
+                    val_logger.set_best_epoch(epoch)
+                    if config.keep_best_model_in_memory:
+                        update_best_state_dict()
+                    logging.info("Done.")
+
+                    # Replace model checkpoint if required
+                    consolidate_optimizer()
+                    if save_checkpoints:
+                        logging.info("Replacing current best model checkpoint...")
+                        checkpoint_file = save_model(
+                            model,
+                            config,
+                            epoch,
+                            train_logger,
+                            val_logger,
+                            optimizer,
+                            scheduler,
+                            config_info_dict,
+                            checkpoint_writer=checkpoint_writer,
+                            early_stopping=early_stopping,
+                        )
+                        # Keep the latest mid-epoch checkpoint even if it was the previous best one
+                        if best_checkpoint_file != last_step_checkpoint_file:
+                            remove_model(
+                                config,
+                                best_epoch,
+                                config_info_dict,
+                                step=best_step,
+                                checkpoint_writer=checkpoint_writer,
+                            )
+                        best_checkpoint_file = checkpoint_file
+                        logging.info("Done.")
+                        callback_handler.fire("on_checkpoint", checkpoint_file=best_checkpoint_file)
+                    best_epoch, best_step = epoch, None
+
+                callback_handler.fire("on_epoch_end")
+
+                # Quit training if stopping criterion met
+                if config.use_early_stopping and early_stopping.stop(early_stopping_metric):
+                    stop_epoch = epoch
+                    logging.info(f"Stopping early after {stop_epoch} epochs.")
+                    break
+
+                # Quit training if requested by a callback
+                if state.stop_training:
+                    stop_epoch = epoch
+                    logging.info(f"Stopping training after {stop_epoch} epochs as requested by a callback.")
+                    break
+
+                stop_epoch = epoch  # Update last epoch trained
+            except KeyboardInterrupt:  # Option to quit training with keyboard interrupt
+                logging.warning("Keyboard Interrupted!")
+                stop_epoch = epoch - 1  # Current epoch training incomplete
+                interrupted = True
+
+                # Save a checkpoint to resume training from the last optimizer step if interrupted mid-epoch
+                interrupted_mid_epoch = state.phase == "train" and 0 < state.batches_done < len(train_loader)
+                if save_checkpoints and interrupted_mid_epoch and is_optimizer_sharded(optimizer):
+                    # Other processes may not have been interrupted to consolidate the optimizer state
+                    logging.warning("Can't save a checkpoint for resuming training with a sharded optimizer state.")
+                elif save_checkpoints and interrupted_mid_epoch:
+                    logging.info("Saving checkpoint for resuming training...")
+                    resume_checkpoint_file = save_model(
+                        model,
+                        config,
+                        epoch,
+                        train_logger,
+                        val_logger,
+                        optimizer,
+                        scheduler,
+                        config_info_dict,
+                        step=state.global_step,
+                        training_state=get_training_state(state),
+                        checkpoint_writer=checkpoint_writer,
+                        early_stopping=early_stopping,
+                    )
+                    logging.info("Done.")
+                break
+
+        # Get best model from the weights kept in memory (without copying the current ones)
+        if best_state_dict is not None:
+            module = model.module if hasattr(model, "module") else model
+            best_model = copy_model_with_state_dict(module, best_state_dict)
+            best_model = send_model_to_device(best_model, config.device)
+
+        # Save the model checkpoints
+        consolidate_optimizer()
+        if save_checkpoints:
+            logging.info("Dumping model and results...")
+            save_model(
+                model,
+                config,
+                stop_epoch,
+                train_logger,
+                val_logger,
+                optimizer,
+                scheduler,
+                config_info_dict,
+                checkpoint_writer=checkpoint_writer,
+                early_stopping=early_stopping,
+            )
+
+            # Save current and best models
+            # (`save_model()` moves the model to CPU, so only a model on GPU
+            # needs to be copied, unless the writer copies it itself anyway)
             save_model(
-                best_model,
+                model.copy() if checkpoint_writer is None and is_model_on_gpu(model) else model,
                 config,
-                best_epoch,
+                stop_epoch,
                 train_logger,
                 val_logger,
                 optimizer,
                 scheduler,
                 config_info_dict,
                 checkpoint_type="model",
+                checkpoint_writer=checkpoint_writer,
+                training_finished=not interrupted,
+                early_stopping=early_stopping,
             )
-        logging.info("Done.")
+            if best_state_dict is not None:  # Best model already obtained from memory
+                # Optimizer and scheduler states of the best model aren't kept in memory
+                save_model(
+                    best_model,
+                    config,
+                    best_epoch,
+                    train_logger,
+                    val_logger,
+                    config_info_dict=config_info_dict,
+                    checkpoint_type="model",
+                    step=best_step,
+                    training_finished=not interrupted,
+                )
+            elif best_checkpoint_file != "":
+                if checkpoint_writer is not None:  # Ensure that best checkpoint is written
+                    checkpoint_writer.flush()
+                # A sharded optimizer state can only be loaded (and consolidated again) by all processes
+                # together, so the best model is saved without the optimizer and scheduler states then
+                sharded = is_optimizer_sharded(optimizer)
+                checkpoint = load_model(
+                    model.copy(), config, best_checkpoint_file, *((None, None) if sharded else (optimizer, scheduler))
+                )
+                best_model = checkpoint["model"]
+                best_optimizer, best_scheduler = checkpoint["optimizer"], checkpoint["scheduler"]
+                if not sharded:
+                    optimizer, scheduler = best_optimizer, best_scheduler
+                checkpoint = None  # Free up memory
+                save_model(
+                    best_model,
+                    config,
+                    best_epoch,
+                    train_logger,
+                    val_logger,
+                    best_optimizer,
+                    best_scheduler,
+                    config_info_dict,
+                    checkpoint_type="model",
+                    step=best_step,
+                    training_finished=not interrupted,
+                )
+            logging.info("Done.")
+    except BaseException as e:
+        callback_handler.fire("on_train_error", error=e)
+        raise
+    finally:
+        # Stop tracing Python allocations
+        if memory_tracker is not None:
+            memory_tracker.close()
+
+        # Wait for all checkpoints to be written, even if training
+        # failed, so that none of them are left half-written
+        if checkpoint_writer is not None:
+            logging.info("Waiting for checkpoints to be written...")
+            checkpoint_writer.close()
+            logging.info("Done.")
 
     return_dict = {
         "model": model,
@@ -219,8 +729,12 @@ def train_model(
         "scheduler": scheduler,
         "stop_epoch": stop_epoch,
         "best_epoch": best_epoch,
+        "best_step": best_step,
         "best_checkpoint_file": best_checkpoint_file,
+        "resume_checkpoint_file": resume_checkpoint_file,
+        "interrupted": interrupted,
     }
+    callback_handler.fire("on_train_end", return_dict=return_dict)
     return return_dict
 
 
@@ -233,10 +747,29 @@ def train_epoch(
     optimizer: Optimizer,
     scheduler: Optional[object] = None,
     decouple_fn: Optional[_DecoupleFnTrain] = None,
-) -> _TrainResult:
+    eval_criteria: Optional[_EvalCriterionOrCriteria] = None,
+    gradient_accumulation_steps: Optional[int] = 1,
+    autocast_dtype: Optional[torch.dtype] = None,
+    callback_handler: Optional[CallbackHandler] = None,
+    start_batch: Optional[int] = 0,
+    rng_state: Optional[_StringDict] = None,
+    prefetch_depth: Optional[int] = 0,
+    step_timer: Optional[StepTimer] = None,
+    memory_tracker: Optional[MemoryTracker] = None,
+    throughput_meter: Optional[ThroughputMeter] = None,
+) -> Union[_TrainResult, _TrainResultWithMetrics]:
     """
     Perform one training epoch and return the loss per example
     for each iteration.
+    If `eval_criteria` is provided, the eval metrics computed
+    on the outputs of the training pass are returned as well.
+    `start_batch` and `rng_state` may be provided for resuming
+    an epoch in the middle.
+    If `step_timer` is provided, the phases of each step are
+    timed with it, and if `memory_tracker` is provided, the
+    memory usage of the epoch is tracked with it.
+    `throughput_meter` may be provided to get the throughput
+    of the epoch, and to report the ETA of the whole run.
     See `perform_one_epoch()` for more details.
     """
     return perform_one_epoch(
@@ -248,7 +781,17 @@ def train_epoch(
         epoch=epoch,
         optimizer=optimizer,
         scheduler=scheduler,
+        eval_criteria=eval_criteria,
         decouple_fn=decouple_fn,
+        gradient_accumulation_steps=gradient_accumulation_steps,
+        autocast_dtype=autocast_dtype,
+        callback_handler=callback_handler,
+        start_batch=start_batch,
+        rng_state=rng_state,
+        prefetch_depth=prefetch_depth,
+        step_timer=step_timer,
+        memory_tracker=memory_tracker,
+        throughput_meter=throughput_meter,
     )
 
 
@@ -260,11 +803,18 @@ def evaluate_epoch(
     loss_criterion: _Loss,
     eval_criteria: _EvalCriterionOrCriteria,
     decouple_fn: Optional[_DecoupleFnTrain] = None,
+    return_outputs: Optional[bool] = False,
+    autocast_dtype: Optional[torch.dtype] = None,
+    callback_handler: Optional[CallbackHandler] = None,
+    prefetch_depth: Optional[int] = 0,
+    memory_tracker: Optional[MemoryTracker] = None,
 ) -> _EvalResult:
     """
     Perform one evaluation epoch and return the loss per example
-    for each epoch, all eval criteria, raw model outputs, and
-    the true targets.
+    for each epoch, all eval criteria, and (if `return_outputs=True`)
+    the raw model outputs and the true targets.
+    If `memory_tracker` is provided, the memory usage
+    of the epoch is tracked with it.
     See `perform_one_epoch()` for more details.
     """
     return perform_one_epoch(
@@ -275,6 +825,11 @@ def evaluate_epoch(
         loss_criterion=loss_criterion,
         eval_criteria=eval_criteria,
         decouple_fn=decouple_fn,
+        return_outputs=return_outputs,
+        autocast_dtype=autocast_dtype,
+        callback_handler=callback_handler,
+        prefetch_depth=prefetch_depth,
+        memory_tracker=memory_tracker,
     )
 
 
@@ -285,12 +840,24 @@ def get_all_predictions(
     device: _Device,
     threshold_prob: Optional[float] = None,
     decouple_fn: Optional[_DecoupleFnTest] = None,
+    mmap_dir: Optional[str] = None,
+    autocast_dtype: Optional[torch.dtype] = None,
+    prefetch_depth: Optional[int] = 0,
+    memory_tracker: Optional[MemoryTracker] = None,
 ) -> _TestResult:
     """
     Make predictions on entire dataset and return raw outputs
     and optionally class predictions and probabilities if it's
     a classification model.
     See `perform_one_epoch()` for more details.
+
+    :param mmap_dir: If provided, the predictions are written into
+                     memory-mapped `outputs.npy`, `preds.npy`, and
+                     `probs.npy` files in this directory instead of
+                     being held in memory. The returned tensors share
+                     memory with these files.
+    :param memory_tracker: If provided, the memory usage of
+                           predicting is tracked with it.
     """
     return perform_one_epoch(
         phase="test",
@@ -299,9 +866,98 @@ def get_all_predictions(
         device=device,
         threshold_prob=threshold_prob,
         decouple_fn=decouple_fn,
+        mmap_dir=mmap_dir,
+        autocast_dtype=autocast_dtype,
+        prefetch_depth=prefetch_depth,
+        memory_tracker=memory_tracker,
     )
 
 
+@torch.no_grad()
+def iterate_predictions(
+    model: nn.Module,
+    dataloader: DataLoader,
+    device: _Device,
+    threshold_prob: Optional[float] = None,
+    decouple_fn: Optional[_DecoupleFnTest] = None,
+    autocast_dtype: Optional[torch.dtype] = None,
+    prefetch_depth: Optional[int] = 0,
+) -> Iterator[_PredictionChunk]:
+    """
+    Streaming variant of `get_all_predictions()`, which lazily
+    yields the predictions for one batch at a time, so that the
+    memory used is independent of the size of the dataset.
+
+    Yields tuples of `(batch_indices, outputs, preds, probs)` on CPU,
+    where `batch_indices` are the positions of the examples in the
+    order in which the dataloader returns them (i.e. the dataset
+    indices if it isn't shuffled), and `preds` and `probs` are None
+    if it isn't a classification model.
+    """
+    # Set decoupling function to extract inputs from batch
+    if decouple_fn is None:
+        decouple_fn = decouple_batch_test
+
+    # Set model in eval mode
+    model.train(mode=False)
+
+    # Decouple batches and send them to the device (on a background thread if prefetching)
+    prepare_batch = get_batch_preparer(decouple_fn, device, pin_memory=prefetch_depth > 0)
+
+    num_examples_complete = 0
+    with BatchPrefetcher(dataloader, prepare_batch, prefetch_depth, device) as batches:
+        for _, inputs in batches:
+            # Get model outputs, and class predictions and probabilities
+            outputs, preds, probs = predict_batch(model, inputs, device, threshold_prob, autocast_dtype)
+            outputs = send_batch_to_device(outputs, "cpu")
+            if model.model_type == "classification":
+                preds, probs = send_batch_to_device((preds, probs), "cpu")
+
+            batch_indices = torch.arange(num_examples_complete, num_examples_complete + len(outputs))
+            num_examples_complete += len(outputs)
+            yield batch_indices, outputs, preds, probs
+
+
+@timing
+def write_all_predictions(
+    model: nn.Module,
+    dataloader: DataLoader,
+    device: _Device,
+    output_dir: str,
+    threshold_prob: Optional[float] = None,
+    decouple_fn: Optional[_DecoupleFnTest] = None,
+    file_format: Optional[str] = "npy",
+    rows_per_shard: Optional[int] = 1000000,
+    max_queue_size: Optional[int] = 8,
+    autocast_dtype: Optional[torch.dtype] = None,
+    prefetch_depth: Optional[int] = 0,
+) -> List[str]:
+    """
+    Make predictions on entire dataset and write them out to
+    rotating shards in `output_dir` as they are produced,
+    without ever holding all of them in memory.
+    The shards are written from a background thread, which
+    overlaps with computing the predictions for the next batches.
+    See `iterate_predictions()` and `utils.ShardedPredictionWriter`
+    for more details.
+
+    :returns list of paths of all shard files written
+    """
+    with ShardedPredictionWriter(
+        output_dir, file_format=file_format, rows_per_shard=rows_per_shard, max_queue_size=max_queue_size
+    ) as writer:
+        for num_batches_complete, chunk in enumerate(
+            iterate_predictions(
+                model, dataloader, device, threshold_prob, decouple_fn, autocast_dtype, prefetch_depth
+            ),
+            1,
+        ):
+            writer.write(*chunk)
+            if num_batches_complete % 1000 == 0:
+                logging.info(f"{num_batches_complete}/{len(dataloader)} batches complete.")
+    return writer.shard_files
+
+
 @timing
 def perform_one_epoch(
     phase: str,
@@ -315,22 +971,100 @@ def perform_one_epoch(
     eval_criteria: Optional[_EvalCriterionOrCriteria] = None,
     threshold_prob: Optional[float] = None,
     decouple_fn: Optional[_DecoupleFn] = None,
-) -> Union[_TrainResult, _EvalResult, _TestResult]:
+    return_outputs: Optional[bool] = False,
+    mmap_dir: Optional[str] = None,
+    gradient_accumulation_steps: Optional[int] = 1,
+    autocast_dtype: Optional[torch.dtype] = None,
+    callback_handler: Optional[CallbackHandler] = None,
+    start_batch: Optional[int] = 0,
+    rng_state: Optional[_StringDict] = None,
+    prefetch_depth: Optional[int] = 0,
+    step_timer: Optional[StepTimer] = None,
+    memory_tracker: Optional[MemoryTracker] = None,
+    throughput_meter: Optional[ThroughputMeter] = None,
+) -> Union[_TrainResult, _TrainResultWithMetrics, _EvalResult, _TestResult]:
     """
     Common loop for one training / evaluation / testing epoch on the entire dataset.
-      - For training, returns the loss per example for each iteration.
+      - For training, returns the loss per example for each iteration,
+        and optionally all eval criteria computed on the outputs of the
+        training pass itself (if `eval_criteria` is provided).
       - For evaluation, returns the loss per example for each epoch, all eval
-        criteria, raw model outputs, and the true targets.
+        criteria, and the raw model outputs and the true targets (or None for
+        both unless `return_outputs=True`).
       - For testing, returns raw model outputs, and optionally class predictions
         and probabilities if it's a classification model.
 
     :param phase: Type of pass to perform over data
                   Choices = "train" | "eval" | "test"
     :param scheduler: Pass this only if it's a scheduler that requires taking a step
-                      after each batch step/iteration (e.g. CyclicLR), otherwise None
+                      after each optimizer step (e.g. CyclicLR), otherwise None
+    :param gradient_accumulation_steps: Number of batches (micro-batches) over which
+                                        gradients are accumulated before gradient
+                                        clipping and taking an optimizer step.
+                                        The loss of each batch is scaled down by
+                                        the number of batches in its accumulation
+                                        window, so the effective batch size is
+                                        `gradient_accumulation_steps` times the
+                                        batch size of the dataloader.
+    :param autocast_dtype: If provided, the forward pass and the loss are computed
+                           in mixed precision by autocasting to this dtype (e.g.
+                           `torch.bfloat16` on CPU). The model parameters, and hence
+                           the optimizer state and checkpoints, remain in full
+                           precision, and the outputs are cast back to full precision
+                           before computing eval metrics or predictions.
+    :param callback_handler: Handler to dispatch batch-level events (`on_batch_start`,
+                             `on_batch_end`, `on_step_end`) to callbacks.
+                             Events without listeners are skipped entirely.
+                             For training, `callback_handler.state.global_step` and
+                             `callback_handler.state.batches_done` are updated after
+                             every optimizer step.
+    :param start_batch: Number of batches of the epoch to skip (for training only),
+                        e.g. when resuming training in the middle of an epoch.
+                        The skipped batches are still loaded, but not trained on.
+                        Must be at the boundary of a gradient accumulation window.
+    :param rng_state: If provided, the RNG states (see `utils.get_rng_state()`)
+                      are restored after skipping `start_batch` batches.
+    :param prefetch_depth: Number of batches to decouple and send to the device ahead
+                           of time on a background thread (see `utils.BatchPrefetcher`),
+                           overlapping data loading and transfer with computation.
+                           If 0, each batch is loaded and transferred synchronously.
+    :param step_timer: If provided, the phases of every batch (waiting for data,
+                       transferring it, forward pass, loss, backward pass, gradient
+                       clipping and optimizer step) are timed with it (see
+                       `utils.StepTimer`), to be summarized by the caller.
+    :param memory_tracker: If provided, the memory usage of the epoch, incl. the
+                           bytes held in the stored losses, outputs and targets
+                           (or predictions), is tracked with it as a phase (see
+                           `utils.MemoryTracker`), to be summarized by the caller.
+    :param throughput_meter: Meter of the throughput (samples/sec and steps/sec) and
+                             the ETA reported in the progress logs (see
+                             `utils.ThroughputMeter`), which may be summarized
+                             by the caller. If not provided, a new one is used.
 
     If `phase=="train"`, params `optimizer` and `epoch` must be provided.
     If `phase=="eval"`, param `eval_criteria` must be provided.
+    If `phase=="train"` and `eval_criteria` is provided, the eval metrics are
+    also computed during training, so that no separate evaluation pass over
+    the training set is required.
+
+    The eval metrics are computed with streaming accumulators (see
+    `metrics.MetricAccumulator`) which are updated batch-wise, so the raw
+    outputs of the whole dataset aren't stored. They are only stored if
+    `return_outputs=True`, or if any of the `eval_criteria` doesn't support
+    streaming (e.g. a custom eval function).
+
+    If the dataloader only loads the share of the dataset of the current
+    process of distributed training (see `distributed.get_distributed_dataloader()`),
+    the losses of all batches of all processes are returned (ordered by rank),
+    and the states of the accumulators are all-reduced across the processes,
+    so that all of them get the eval metrics on the entire dataset, while
+    each only evaluates its own share. The raw outputs and targets (if stored)
+    are gathered from all processes (ordered by rank) as well.
+    All processes must hence call this function together (for training / eval).
+
+    For testing, the predictions are written into buffers preallocated with
+    `len(dataloader.dataset)` rows (see `utils.PredictionBuffer`), which are
+    backed by memory-mapped `.npy` files in `mmap_dir` if it's provided.
 
     If `phase=="test"`, the dataloader may not have the true labels (by
     definition), and hence, the decoupling function must only return the
@@ -350,10 +1084,31 @@ def perform_one_epoch(
             assert param is not None, f"Param '{param_name}' must not be None for evaluation."
     elif phase != "test":
         raise ValueError(f"Param 'phase' ('{phase}') must be one of {ALLOWED_PHASES}.")
+    assert gradient_accumulation_steps >= 1, "Param 'gradient_accumulation_steps' must be at least 1."
+    assert start_batch == 0 or phase == "train", "Param 'start_batch' may only be provided for training."
+    assert (
+        start_batch % gradient_accumulation_steps == 0
+    ), f"Param 'start_batch' ('{start_batch}') must be a multiple of 'gradient_accumulation_steps'."
 
     # Mode for retaining gradients / graph
     MODE = phase == "train"
 
+    # Track memory usage of the epoch if required (sampling it every few batches if required)
+    sample_memory_every = None
+    if memory_tracker is not None:
+        memory_tracker.start(phase)
+        sample_memory_every = memory_tracker.sample_every_n_batches
+
+    # Whether to compute eval metrics
+    track_eval_metrics = phase == "eval" or (phase == "train" and eval_criteria is not None)
+
+    # Get streaming accumulators for eval metrics, and check if
+    # all outputs and targets need to be stored nevertheless
+    if track_eval_metrics:
+        accumulators = get_metric_accumulators(eval_criteria)
+        active_accumulators = [accumulator for accumulator in accumulators.values() if accumulator is not None]
+        store_outputs = (phase == "eval" and return_outputs) or len(active_accumulators) < len(accumulators)
+
     # Set decoupling function to extract inputs (and optionally targets) from batch
     if decouple_fn is None:
         decouple_fn = decouple_batch_test if phase == "test" else decouple_batch_train
@@ -361,6 +1116,15 @@ def perform_one_epoch(
     # Set model in training/eval mode as required
     model.train(mode=MODE)
 
+    # Check which batch-level events have listeners once,
+    # so as to not incur any overhead in the loop otherwise
+    if callback_handler is not None:
+        callback_handler.state.phase = phase
+    fire_batch_start, fire_batch_end, fire_step_end = [
+        callback_handler is not None and callback_handler.has_listeners(event)
+        for event in ["on_batch_start", "on_batch_end", "on_step_end"]
+    ]
+
     # Get required dataloader params
     num_batches, num_examples = len(dataloader), len(dataloader.dataset)
     batch_size = dataloader.batch_size
@@ -368,102 +1132,253 @@ def perform_one_epoch(
     # Print 50 times in an epoch (or every time, if num_batches < 50)
     batches_to_print = np.unique(np.linspace(0, num_batches, num=50, endpoint=True, dtype=int))
 
+    # Count the examples of each batch (since the last one may be partial), and meter the
+    # throughput for logging progress. All batches but the last one are full if the batch size
+    # is fixed, so only the size of the last one (or of each, if not fixed) is taken from the
+    # model outputs, without inspecting the batch. The skipped batches (if resuming) are assumed
+    # to be full.
+    num_examples_complete = start_batch * batch_size if batch_size is not None else 0
+    if throughput_meter is None:
+        throughput_meter = ThroughputMeter()
+
+    # Number of optimizer steps (one per gradient accumulation window)
+    num_steps = int(np.ceil(num_batches / gradient_accumulation_steps))
+    num_steps_complete = start_batch // gradient_accumulation_steps
+
+    # Store per-batch losses on the device, only syncing with the host when
+    # logging progress and at the end of the epoch (instead of every batch)
+    loss_buffer = torch.empty(num_batches, device=device) if phase != "test" else None
+    num_batches_complete = start_batch
+
     # Store all required items to be returned
-    loss_hist: List[float] = []
     targets_hist: List[torch.Tensor] = []
     outputs_hist: List[torch.Tensor] = []
     preds_hist: List[torch.Tensor] = []
     probs_hist: List[torch.Tensor] = []
 
+    # Preallocate buffers for test predictions
+    if phase == "test":
+        if mmap_dir is not None:
+            make_dirs(mmap_dir)
+
+        def get_buffer_path(name: str) -> Optional[str]:
+            return None if mmap_dir is None else get_file_path(mmap_dir, f"{name}.npy")
+
+        outputs_buffer = PredictionBuffer(num_examples, get_buffer_path("outputs"))
+        if model.model_type == "classification":
+            preds_buffer = PredictionBuffer(num_examples, get_buffer_path("preds"))
+            probs_buffer = PredictionBuffer(num_examples, get_buffer_path("probs"))
+
+    # Skip batches already trained on (if resuming)
+    dataloader_iter = iter(dataloader)
+    if start_batch > 0:
+        logging.info(f"Skipping {start_batch} batches already trained on...")
+        for _ in islice(dataloader_iter, start_batch):
+            pass
+    if rng_state is not None:
+        set_rng_state(rng_state)
+
+    # Decouple batches and send them to the device (on a background thread if prefetching)
+    prepare_batch = get_batch_preparer(decouple_fn, device, pin_memory=prefetch_depth > 0)
+
+    # Time the phases of each batch if required, incl. waiting for the dataloader
+    # and the transfer to the device separately if batches are prepared synchronously
+    lap = step_timer.lap if step_timer is not None else lambda phase: None
+    time_transfer = step_timer is not None and prefetch_depth == 0
+    if time_transfer:
+        prepare_batch_untimed = prepare_batch
+
+        def prepare_batch(batch: _Batch) -> _Batch:
+            lap("data")
+            device_batch = prepare_batch_untimed(batch)
+            lap("transfer")
+            return device_batch
+
+    batches = BatchPrefetcher(islice(dataloader_iter, num_batches - start_batch), prepare_batch, prefetch_depth, device)
+
     # Enable gradient computation if training to be performed else disable it.
     # Technically not required if this function is called from other supported
     # functions, e.g. `evaluate_epoch()` (because of decorator), but just being sure.
-    with torch.set_grad_enabled(MODE):
-        for batch_idx, batch in enumerate(islice(dataloader, num_batches)):
+    with torch.set_grad_enabled(MODE), batches:
+        if step_timer is not None:
+            step_timer.start()
+        throughput_meter.start(num_batches - start_batch)
+        for batch_idx, (batch, device_batch) in enumerate(batches, start_batch):
+            if not time_transfer:
+                lap("data")
+            if fire_batch_start:
+                callback_handler.fire("on_batch_start", batch_idx=batch_idx, batch=batch)
+
             # Get inputs for testing
             if phase == "test":
-                inputs = send_batch_to_device(decouple_fn(batch), device)
+                inputs = device_batch
             else:  # Get inputs and targets for training/evaluation
-                inputs, targets = send_batch_to_device(decouple_fn(batch), device)
+                inputs, targets = device_batch
 
-            # Reset gradients to zero
+            # Reset gradients to zero at the start of each accumulation window
             if phase == "train":
-                optimizer.zero_grad()
-                model.zero_grad()
-
-            # Get model outputs
-            outputs = get_model_outputs_only(model(inputs))
-
-            # Store variables for logging
-            num_examples_complete = (batch_idx + 1) * batch_size
+                window_start = batch_idx - batch_idx % gradient_accumulation_steps
+                window_size = min(gradient_accumulation_steps, num_batches - window_start)
+                if batch_idx == window_start:
+                    optimizer.zero_grad()
+                    model.zero_grad()
+
+            # Get model outputs (and class predictions and probabilities) for testing
+            sync_grads = phase != "train" or batch_idx + 1 == window_start + window_size
+            if phase == "test":
+                outputs, preds, probs = predict_batch(model, inputs, device, threshold_prob, autocast_dtype)
+                lap("forward")
+
+            else:  # Get model outputs and loss, only syncing gradients across processes at the end of each window
+                with get_autocast_context(device, autocast_dtype), get_grad_sync_context(model, sync_grads):
+                    outputs = get_model_outputs_only(model(inputs))
+                    lap("forward")
+                    loss = loss_criterion(outputs, targets)
+                    lap("loss")
+
+                # Keep outputs in full precision for eval metrics
+                if autocast_dtype is not None:
+                    outputs = outputs.float()
+
+            # Store variables for logging (an optimizer step is taken if gradients are synced)
+            num_batches_complete = batch_idx + 1
+            current_batch_size = batch_size if batch_size is not None and batch_idx + 1 < num_batches else len(outputs)
+            num_examples_complete += current_batch_size
             percent_batches_complete = 100.0 * (batch_idx + 1) / num_batches
+            throughput_meter.update(current_batch_size, num_steps=int(sync_grads))
 
             # Store items for testing + print progress
             if phase == "test":
-                outputs = send_batch_to_device(outputs, "cpu")
-                outputs_hist.extend(outputs)
-
-                # Get class predictions and probabilities
+                outputs_buffer.add(outputs)
                 if model.model_type == "classification":
-                    preds, probs = model.predict_proba(outputs, threshold_prob)
-                    preds_hist.extend(preds)
-                    probs_hist.extend(probs)
+                    preds_buffer.add(preds)
+                    probs_buffer.add(probs)
 
                 # Print progess
                 if batch_idx in batches_to_print:
                     logging.info(
-                        f"{num_examples_complete}/{num_examples} " f"({percent_batches_complete:.0f}%) complete."
+                        f"{num_examples_complete}/{num_examples} ({percent_batches_complete:.0f}%) complete."
+                        f"\t{throughput_meter.get_progress_str()}"
                     )
 
             else:  # Perform training / evaluation
-                # Compute and store loss
-                loss = loss_criterion(outputs, targets)
-                loss_value = loss.item()
-                loss_hist.append(loss_value)
+                # Store loss (without syncing with the host)
+                loss_buffer[batch_idx] = loss.detach()
 
                 # Perform training
                 if phase == "train":
-                    # Backprop + clip gradients + take scheduler step
-                    loss.backward()
-                    nn.utils.clip_grad_norm_(model.parameters(), 1.0)
-                    optimizer.step()
-                    if scheduler is not None:
-                        take_scheduler_step(scheduler, loss_value)
+                    # Backprop (scaled by number of batches in accumulation window)
+                    (loss / window_size if window_size > 1 else loss).backward()
+                    lap("backward")
+
+                    # Clip gradients + take optimizer and scheduler step at end of window
+                    if batch_idx + 1 == window_start + window_size:
+                        nn.utils.clip_grad_norm_(model.parameters(), 1.0)
+                        lap("clip")
+                        optimizer.step()
+                        if scheduler is not None:
+                            take_scheduler_step(scheduler, loss_buffer[window_start : batch_idx + 1].mean())
+                        lap("optimizer")
+                        num_steps_complete += 1
+                        if callback_handler is not None:
+                            callback_handler.state.global_step += 1
+                            callback_handler.state.batches_done = batch_idx + 1
+                        if fire_step_end:  # Timed separately from the step, e.g. evaluation every few steps
+                            throughput_meter.pause()
+                            callback_handler.fire("on_step_end", batch_idx=batch_idx)
+                            lap("callbacks")
+                            throughput_meter.resume()
 
                     # Print progess
                     if batch_idx in batches_to_print:
+                        steps_str = (
+                            f" Step: {num_steps_complete}/{num_steps}" if gradient_accumulation_steps > 1 else ""
+                        )
                         logging.info(
                             f"Train Epoch: {epoch} [{num_examples_complete}/{num_examples} "
-                            f"({percent_batches_complete:.0f}%)]\tLoss: {loss_value:.6f}"
+                            f"({percent_batches_complete:.0f}%)]{steps_str}\tLoss: {loss_buffer[batch_idx].item():.6f}"
+                            f"\t{throughput_meter.get_progress_str()}"
                         )
 
-                else:  # Store items for evaluation
-                    outputs, targets = send_batch_to_device((outputs, targets), "cpu")
-                    outputs_hist.append(outputs)
-                    targets_hist.append(targets)
+                # Update eval metrics and store items for evaluation if required
+                if track_eval_metrics:
+                    outputs = outputs.detach()
+                    for accumulator in active_accumulators:
+                        accumulator.update(outputs, targets)
+                    if store_outputs:
+                        outputs, targets = send_batch_to_device((outputs, targets), "cpu")
+                        outputs_hist.append(outputs)
+                        targets_hist.append(targets)
+
+            if fire_batch_end:
+                batch_end_kwargs = {"loss": loss.detach()} if phase != "test" else {}
+                callback_handler.fire("on_batch_end", batch_idx=batch_idx, outputs=outputs, **batch_end_kwargs)
+            if sample_memory_every is not None and (batch_idx + 1) % sample_memory_every == 0:
+                memory_tracker.sample(batch_idx + 1)
+            lap("other")
+
+            # Stop training in the middle of the epoch if requested by a callback
+            if phase == "train" and callback_handler is not None and callback_handler.state.stop_training:
+                logging.info(f"Stopping training after {num_steps_complete} steps in epoch {epoch}.")
+                break
+
+    # Combine the results of all processes if the dataset is sharded across them
+    reduce_across_processes = phase != "test" and is_dataloader_distributed(dataloader)
+
+    # Get all losses of the epoch on the host
+    if phase != "test":
+        loss_hist = loss_buffer[start_batch:num_batches_complete].tolist()
+        if reduce_across_processes:
+            loss_hist = [loss for process_loss_hist in all_gather_objects(loss_hist) for loss in process_loss_hist]
+
+    # Perform evaluation on whole dataset
+    if track_eval_metrics:
+        if reduce_across_processes:
+            for accumulator in active_accumulators:
+                accumulator.all_reduce(device)
+
+        if store_outputs:
+            outputs_hist = torch.cat(outputs_hist, dim=0)
+            targets_hist = torch.cat(targets_hist, dim=0)
+            if reduce_across_processes:
+                all_outputs_and_targets = all_gather_objects((outputs_hist, targets_hist))
+                outputs_hist = torch.cat([outputs for outputs, _ in all_outputs_and_targets], dim=0)
+                targets_hist = torch.cat([targets for _, targets in all_outputs_and_targets], dim=0)
+        else:
+            outputs_hist, targets_hist = None, None
+
+        # Compute all evaluation criteria
+        eval_metrics = compute_eval_metrics(outputs_hist, targets_hist, eval_criteria, accumulators)
+        if memory_tracker is not None:
+            held_bytes = get_object_size((loss_hist, outputs_hist, targets_hist))
+
+        # Only return outputs if asked for
+        if not return_outputs:
+            outputs_hist, targets_hist = None, None
 
     # Reset gradients back to zero
     if phase == "train":
         optimizer.zero_grad()
         model.zero_grad()
 
-    elif phase == "eval":  # Perform evaluation on whole dataset
-        outputs_hist = torch.cat(outputs_hist, dim=0)
-        targets_hist = torch.cat(targets_hist, dim=0)
-
-        # Compute all evaluation criteria
-        eval_metrics = {
-            eval_criterion: eval_fn(outputs_hist, targets_hist) for eval_criterion, eval_fn in eval_criteria.items()
-        }
-
-    else:  # Get outputs, predictions, probabilities
-        outputs_hist = torch.stack(outputs_hist, dim=0)
+    elif phase == "test":  # Get outputs, predictions, probabilities
+        outputs_hist = outputs_buffer.get()
         if model.model_type == "classification":
-            preds_hist = torch.stack(preds_hist, dim=0)
-            probs_hist = torch.stack(probs_hist, dim=0)
+            preds_hist = preds_buffer.get()
+            probs_hist = probs_buffer.get()
+
+    # Stop tracking memory usage, incl. the bytes held in the results
+    if memory_tracker is not None:
+        if phase == "test":
+            held_bytes = get_object_size((outputs_hist, preds_hist, probs_hist))
+        elif not track_eval_metrics:
+            held_bytes = get_object_size(loss_hist)
+        memory_tracker.stop(held_bytes)
 
     # Return necessary items
     if phase == "train":
+        if track_eval_metrics:
+            return loss_hist, eval_metrics
         return loss_hist
     elif phase == "eval":
         return loss_hist, eval_metrics, outputs_hist, targets_hist
@@ -503,12 +1418,88 @@ def decouple_batch_test(batch: _Batch) -> _Batch:
     return batch
 
 
-def take_scheduler_step(scheduler: object, val_metric: Optional[float] = None) -> None:
+def get_batch_preparer(
+    decouple_fn: _DecoupleFn, device: _Device, pin_memory: Optional[bool] = False
+) -> Callable[[_Batch], _Batch]:
+    """
+    Get a function that decouples a batch with `decouple_fn`
+    and sends the result to the given `device`.
+
+    :param pin_memory: Whether to pin the decoupled batch in page-locked
+                       memory before sending it to a GPU, so that the
+                       transfer is asynchronous. Useful when the batches
+                       are prepared in the background, e.g. by
+                       `utils.BatchPrefetcher`. Ignored for other devices.
+    """
+    pin_memory = pin_memory and torch.device(device).type == "cuda"
+
+    def prepare_batch(batch: _Batch) -> _Batch:
+        batch = decouple_fn(batch)
+        if pin_memory:
+            batch = pin_batch_memory(batch)
+        return send_batch_to_device(batch, device)
+
+    return prepare_batch
+
+
+def predict_batch(
+    model: nn.Module,
+    inputs: _Batch,
+    device: _Device,
+    threshold_prob: Optional[float] = None,
+    autocast_dtype: Optional[torch.dtype] = None,
+) -> Tuple[torch.Tensor, Optional[torch.Tensor], Optional[torch.Tensor]]:
+    """
+    Perform inference on one batch of `inputs`
+    (already on the `device`), and return the raw
+    model outputs (in full precision), and the class
+    predictions and probabilities (or None if it
+    isn't a classification model), all on the device.
+    Shared by all functions making test-time predictions.
+    """
+    with get_autocast_context(device, autocast_dtype):
+        outputs = get_model_outputs_only(model(inputs))
+
+    # Keep outputs in full precision for predictions
+    if autocast_dtype is not None:
+        outputs = outputs.float()
+
+    # Get class predictions and probabilities
+    preds, probs = None, None
+    if model.model_type == "classification":
+        preds, probs = model.predict_proba(outputs, threshold_prob)
+    return outputs, preds, probs
+
+
+def get_training_state(state: TrainState) -> _StringDict:
+    """
+    Get the state required for resuming training
+    in the middle of the current epoch from the
+    last optimizer step, which comprises:
+      - Current epoch
+      - Number of batches trained on in the epoch
+      - Global optimizer step
+      - RNG states at the start of the epoch (for
+        obtaining the same order of batches)
+      - Current RNG states
+    """
+    return {
+        "epoch": state.epoch,
+        "batches_done": state.batches_done,
+        "global_step": state.global_step,
+        "epoch_rng_state": state.epoch_rng_state,
+        "rng_state": get_rng_state(),
+    }
+
+
+def take_scheduler_step(scheduler: object, val_metric: Optional[Union[float, torch.Tensor]] = None) -> None:
     """
     Take a scheduler step.
     Some schedulers, e.g. `ReduceLROnPlateau`, require
     the validation metric to take a step, while (most)
     others don't.
+    `val_metric` may also be a scalar tensor, in which
+    case it is only synced with the host if required.
     """
     REQUIRE_VAL_METRIC = ["ReduceLROnPlateau"]
 
@@ -530,6 +1521,11 @@ def save_model(
     scheduler: Optional[object] = None,
     config_info_dict: Optional[_StringDict] = None,
     checkpoint_type: Optional[str] = "state",
+    step: Optional[int] = None,
+    training_state: Optional[_StringDict] = None,
+    checkpoint_writer: Optional[AsyncCheckpointWriter] = None,
+    training_finished: Optional[bool] = None,
+    early_stopping: Optional[EarlyStopping] = None,
 ) -> str:
     """
     Save the checkpoint at a given epoch.
@@ -544,28 +1540,120 @@ def save_model(
         - History of train and validation losses
           and eval metrics so far (if provided)
         - Optimizer and scheduler state dicts (if provided)
+        - State of early stopping (if provided)
+    If a model checkpoint is saved at the end of training
+    (i.e. with `training_finished`), its epoch, step, validation
+    logger and `training_finished` are also saved to a small info
+    file alongside it (see `load_checkpoint_info()`).
 
     :param checkpoint_type: Type of checkpoint to load
                             Choices = "state" | "model"
                             Default = "state"
+    :param step: Global optimizer step, if the checkpoint is
+                 saved in the middle of epoch `epoch`
+    :param training_state: State required for resuming training
+                           in the middle of epoch `epoch`
+                           (see `get_training_state()`)
+    :param checkpoint_writer: If provided, the checkpoint is only snapshotted
+                              to CPU memory and written to disk in the
+                              background, and this function returns
+                              immediately. Call `checkpoint_writer.flush()`
+                              before loading the checkpoint.
+    :param training_finished: Whether training was finished (i.e. not
+                              interrupted), if saved at the end of it
+    :param early_stopping: Early stopping object, whose state (i.e. best
+                           metric and patience counter) is saved for
+                           resuming training (see `load_model()`)
     :returns name of checkpoint file
     """
     # Validate checkpoint_type
     validate_checkpoint_type(checkpoint_type)
 
-    checkpoint_file = get_checkpoint_name(checkpoint_type, config.model_name, epoch, config_info_dict)
+    checkpoint_file = get_checkpoint_name(checkpoint_type, config.model_name, epoch, config_info_dict, step)
     checkpoint_path = get_file_path(config.checkpoint_dir, checkpoint_file)
     logging.info(f"Saving {checkpoint_type} checkpoint '{checkpoint_path}'...")
 
-    # Generate appropriate checkpoint dictionary
-    checkpoint = generate_checkpoint_dict(config, epoch, train_logger, val_logger, optimizer, scheduler)
+    def get_checkpoint() -> _StringDict:
+        # Generate appropriate checkpoint dictionary
+        checkpoint = generate_checkpoint_dict(
+            config,
+            epoch,
+            train_logger,
+            val_logger,
+            optimizer,
+            scheduler,
+            step,
+            training_state,
+            training_finished,
+            early_stopping,
+        )
 
-    # Save model in appropriate way
-    if checkpoint_type == "state":
-        checkpoint["model"] = model.module.state_dict() if hasattr(model, "module") else model.state_dict()
+        # Save model in appropriate way (a whole model is unwrapped from `DistributedDataParallel`,
+        # since it can't be unpickled outside of its process group)
+        module = model.module if isinstance(model, nn.parallel.DistributedDataParallel) else model
+        if checkpoint_type == "state":
+            checkpoint["model"] = model.module.state_dict() if hasattr(model, "module") else model.state_dict()
+        elif checkpoint_writer is not None:
+            checkpoint["model"] = module  # Copied to CPU when taking the snapshot
+        else:
+            checkpoint["model"] = send_model_to_device(module, "cpu")  # Save model on CPU
+        return checkpoint
+
+    # Save what's needed to tell whether (and how well) training finished in a small
+    # separate file, so that it can be read without loading the whole model. It's
+    # written after the checkpoint, so it only exists once the latter is complete.
+    save_info = checkpoint_type == "model" and training_finished is not None
+    info_path = get_file_path(config.checkpoint_dir, get_checkpoint_info_file(checkpoint_file))
+
+    def get_info() -> _StringDict:
+        return {"epoch": epoch, "step": step, "training_finished": training_finished, "val_logger": val_logger}
+
+    if checkpoint_writer is not None:  # Snapshot checkpoint and write it in the background
+        checkpoint_writer.save(checkpoint_path, get_checkpoint)
+        if save_info:
+            checkpoint_writer.save(info_path, get_info)
+        logging.info("Queued for writing in the background.")
     else:
-        checkpoint["model"] = send_model_to_device(model, "cpu")  # Save model on CPU
+        write_checkpoint(get_checkpoint(), checkpoint_path)
+        if save_info:
+            write_checkpoint(get_info(), info_path)
+        logging.info("Done.")
+    return checkpoint_file
 
+
+def get_checkpoint_info_file(checkpoint_file: str) -> str:
+    """
+    Get the name of the info file saved alongside
+    a model checkpoint at the end of training.
+    See `save_model()` for details.
+    """
+    return f"{os.path.splitext(checkpoint_file)[0]}-info.pt"
+
+
+def load_checkpoint_info(config: _Config, checkpoint_file: str) -> Optional[_StringDict]:
+    """
+    Load the info file saved alongside a model checkpoint
+    at the end of training (see `save_model()`), i.e. its
+    epoch, step, validation logger and whether training
+    was finished, without loading the whole model.
+    It's always loaded on CPU, and None is returned
+    if it doesn't exist (e.g. if the checkpoint was
+    saved by an older version, or is still being written).
+    """
+    info_path = get_file_path(config.checkpoint_dir, get_checkpoint_info_file(checkpoint_file))
+    if not os.path.isfile(info_path):
+        return None
+    try:
+        return torch.load(info_path, map_location="cpu")
+    except AttributeError:  # See `write_checkpoint()`
+        return torch.load(info_path, map_location="cpu", pickle_module=dill)
+
+
+def write_checkpoint(checkpoint: _StringDict, checkpoint_path: str) -> None:
+    """
+    Write a checkpoint dict to disk.
+    Helper function for `save_model()`.
+    """
     # `dill` is used when a model has serialization issues, e.g. that
     # caused by having a lambda function as an attribute of the model.
     # Regular pickling won't work, but it will with dill.
@@ -578,9 +1666,6 @@ def save_model(
     except AttributeError:
         torch.save(checkpoint, checkpoint_path, pickle_module=dill)
 
-    logging.info("Done.")
-    return checkpoint_file
-
 
 def generate_checkpoint_dict(
     config: _Config,
@@ -589,25 +1674,37 @@ def generate_checkpoint_dict(
     val_logger: Optional[ModelTracker] = None,
     optimizer: Optional[Optimizer] = None,
     scheduler: Optional[object] = None,
+    step: Optional[int] = None,
+    training_state: Optional[_StringDict] = None,
+    training_finished: Optional[bool] = None,
+    early_stopping: Optional[EarlyStopping] = None,
 ) -> Dict[str, Union[_Config, int, ModelTracker, OrderedDict[str, _TensorOrTensors]]]:
     """
     Generate a dictionary for storing a checkpoint.
     Helper function for `save_model()`.
     It saves the following variables:
         - Current training config
-        - Epoch number
+        - Epoch number (and global step if saved mid-epoch)
         - History of train and validation losses
           and eval metrics so far (if provided)
         - Optimizer and scheduler state dicts (if provided)
+        - State for resuming training mid-epoch (if provided)
+        - Whether training was finished (if provided)
+        - State of early stopping (if provided)
     """
-    checkpoint = {"config": config, "epoch": epoch}  # Good practice to store config too
+    checkpoint = {"config": config, "epoch": epoch, "step": step}  # Good practice to store config too
 
     # Save items if provided
     for name, obj in zip(
-        ("train_logger", "val_logger", "optimizer", "scheduler"), (train_logger, val_logger, optimizer, scheduler),
+        ("train_logger", "val_logger", "optimizer", "scheduler", "early_stopping"),
+        (train_logger, val_logger, optimizer, scheduler, early_stopping),
     ):
         if obj is not None:
             checkpoint[name] = obj if name in ["train_logger", "val_logger"] else obj.state_dict()
+    if training_state is not None:
+        checkpoint["training_state"] = training_state
+    if training_finished is not None:
+        checkpoint["training_finished"] = training_finished
 
     return checkpoint
 
@@ -619,6 +1716,7 @@ def load_model(
     optimizer: Optional[Optimizer] = None,
     scheduler: Optional[object] = None,
     checkpoint_type: Optional[str] = "state",
+    early_stopping: Optional[EarlyStopping] = None,
 ) -> _StringDict:
     """
     Load the checkpoint at a given epoch.
@@ -645,6 +1743,10 @@ def load_model(
     :param checkpoint_type: Type of checkpoint to load
                             Choices = "state" | "model"
                             Default = "state"
+    :param early_stopping: If provided, its state is restored from the
+                           checkpoint (if saved in it), so that the best
+                           metric and patience counter carry over when
+                           resuming training
     """
     # Validate checkpoint_type
     validate_checkpoint_type(checkpoint_type, checkpoint_file)
@@ -674,7 +1776,8 @@ def load_model(
         config = checkpoint["config"]
 
         # Extract last trained epoch from checkpoint file
-        epoch_trained = int(os.path.splitext(checkpoint_file)[0].split("-epoch_")[-1])
+        # (ignoring the global step for mid-epoch checkpoints)
+        epoch_trained = int(os.path.splitext(checkpoint_file)[0].split("-epoch_")[-1].split("-step_")[0])
 
         # Verify consistency of last epoch trained
         assert epoch_trained == checkpoint["epoch"], (
@@ -702,6 +1805,10 @@ def load_model(
         # Load optimizer and scheduler state dicts if provided
         optimizer, scheduler = load_optimizer_and_scheduler(checkpoint, config.device, optimizer, scheduler)
 
+        # Restore state of early stopping if provided
+        if early_stopping is not None and "early_stopping" in checkpoint:
+            early_stopping.load_state_dict(checkpoint["early_stopping"])
+
         logging.info("Done.")
 
     else:
@@ -712,10 +1819,14 @@ def load_model(
         "model": model,
         "config": config,
         "epoch": epoch_trained,
+        "step": checkpoint.get("step"),
+        "training_state": checkpoint.get("training_state"),
+        "training_finished": checkpoint.get("training_finished"),
         "train_logger": train_logger,
         "val_logger": val_logger,
         "optimizer": optimizer,
         "scheduler": scheduler,
+        "early_stopping": early_stopping,
     }
     return return_dict
 
@@ -729,6 +1840,9 @@ def load_optimizer_and_scheduler(
     """
     Load the state dict of a given optimizer
     and scheduler (if they're provided).
+    The (consolidated) optimizer state is resharded if
+    the optimizer state is sharded across processes,
+    irrespective of how it was saved.
     Helper function for `load_model()`.
     """
 
@@ -762,9 +1876,12 @@ def remove_model(
     epoch: Optional[int],
     config_info_dict: Optional[_StringDict] = None,
     checkpoint_type: Optional[str] = "state",
+    step: Optional[int] = None,
+    checkpoint_writer: Optional[AsyncCheckpointWriter] = None,
 ) -> None:
     """
-    Remove a checkpoint/model at a given epoch.
+    Remove a checkpoint/model at a given epoch
+    (and global step, if saved mid-epoch).
     Used in early stopping if better performance
     is observed at a subsequent epoch.
 
@@ -775,16 +1892,34 @@ def remove_model(
     :param checkpoint_type: Type of checkpoint to load
                             Choices = "state" | "model"
                             Default = "state"
+    :param checkpoint_writer: If provided, the checkpoint is removed
+                              in the background (after any pending
+                              writes of the writer)
     """
     # Validate checkpoint_type
     validate_checkpoint_type(checkpoint_type)
 
-    checkpoint_file = get_checkpoint_name(checkpoint_type, config.model_name, epoch, config_info_dict)
-    checkpoint_path = get_file_path(config.checkpoint_dir, checkpoint_file)
-    if os.path.isfile(checkpoint_path):
-        logging.info(f"Removing {checkpoint_type} checkpoint '{checkpoint_path}'...")
-        remove_object(checkpoint_path)
-        logging.info("Done.")
+    checkpoint_file = get_checkpoint_name(checkpoint_type, config.model_name, epoch, config_info_dict, step)
+    remove_checkpoint_file(config, checkpoint_file, checkpoint_writer)
+
+
+def remove_checkpoint_file(
+    config: _Config, checkpoint_file: str, checkpoint_writer: Optional[AsyncCheckpointWriter] = None
+) -> None:
+    """
+    Remove the checkpoint file `checkpoint_file`
+    in `config.checkpoint_dir` if it exists.
+    See `remove_model()` for details.
+    """
+    # Also remove the info file saved alongside model checkpoints, if any
+    for file_name in [checkpoint_file, get_checkpoint_info_file(checkpoint_file)]:
+        checkpoint_path = get_file_path(config.checkpoint_dir, file_name)
+        if checkpoint_writer is not None:
+            checkpoint_writer.remove(checkpoint_path)
+        elif os.path.isfile(checkpoint_path):
+            logging.info(f"Removing checkpoint '{checkpoint_path}'...")
+            remove_object(checkpoint_path)
+            logging.info("Done.")
 
 
 def validate_checkpoint_type(checkpoint_type: str, checkpoint_file: Optional[str] = None) -> None:
@@ -809,6 +1944,21 @@ def validate_checkpoint_type(checkpoint_type: str, checkpoint_file: Optional[str
         )
 
 
+class _EveryNStepsCallback(Callback):
+    """
+    Callback to call `fn(state)` after every
+    `n` global (optimizer) steps of training.
+    """
+
+    def __init__(self, n: int, fn: Callable[[TrainState], None]):
+        self.n = n
+        self.fn = fn
+
+    def on_step_end(self, state: TrainState, **kwargs) -> None:
+        if state.global_step % self.n == 0:
+            self.fn(state)
+
+
 class EarlyStopping:
     """
     Implements early stopping in PyTorch.
@@ -846,7 +1996,9 @@ class EarlyStopping:
                           not provide any of the other params and use the default ones.
         :param mode: Whether to "maximize" or "minimize" the `criterion`
         :param min_delta: Minimum difference in metric required to prevent early stopping
-        :param patience: No. of epochs (or steps) over which to monitor early stopping
+        :param patience: No. of evaluations over which to monitor early stopping, i.e.
+                         epochs (incl. the steps evaluated at in the middle of
+                         epochs if `config.eval_every_n_steps` is set)
         :param best_val: Best possible value of metric (if any)
         :param best_val_tol: Tolerance when comparing metric to best_val
                              This must be provided if `best_val` is provided
@@ -939,3 +2091,18 @@ class EarlyStopping:
             return True
 
         return False
+
+    def state_dict(self) -> _StringDict:
+        """
+        Get the state of early stopping, i.e. the best
+        metric so far and the patience counter, to be saved
+        in checkpoints for resuming training (see `save_model()`).
+        """
+        return {"best": self.best, "num_bad_epochs": self.num_bad_epochs}
+
+    def load_state_dict(self, state_dict: _StringDict) -> None:
+        """
+        Restore the state of early stopping from a checkpoint.
+        """
+        self.best = state_dict["best"]
+        self.num_bad_epochs = state_dict["num_bad_epochs"]
@@ -0,0 +1,381 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from itertools import islice
+
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, Dataset
+
+from .config import set_all_batch_sizes
+from .train_utils import decouple_batch_test, decouple_batch_train, get_batch_preparer
+from .types import Callable, Dict, List, Optional, Tuple, _Batch, _Config, _DecoupleFn, _Device, _Loss, _StringDict
+from .utils import (
+    BatchPrefetcher,
+    get_autocast_context,
+    get_autocast_dtype,
+    get_available_memory,
+    get_batch_size,
+    get_model_outputs_only,
+    get_peak_rss,
+    reset_peak_rss,
+)
+
+SUPPORTED_MODES = ["train", "eval", "test"]
+
+
+def tune_config(
+    model: nn.Module,
+    dataset: Dataset,
+    config: _Config,
+    loss_criterion: Optional[_Loss] = None,
+    modes: Optional[List[str]] = None,
+    decouple_fn_train: Optional[_DecoupleFn] = None,
+    decouple_fn_test: Optional[_DecoupleFn] = None,
+    collate_fn: Optional[Callable] = None,
+    memory_fraction: Optional[float] = 0.9,
+    max_batch_size: Optional[int] = None,
+    worker_candidates: Optional[List[int]] = None,
+    num_batches: Optional[int] = 10,
+) -> Dict[str, _StringDict]:
+    """
+    For each of the given `modes`, find the largest per-GPU
+    batch size that fits in the memory budget (see
+    `find_max_batch_size()`), and then the number of dataloader
+    workers and the batch prefetch depth that maximize the
+    throughput with it (see `tune_dataloader()`).
+
+    The results are stored in the config:
+      - `{mode}_batch_size_per_gpu` for each tuned mode (with
+        `batch_size_per_gpu` unset), from which the total batch
+        sizes are recomputed with `set_all_batch_sizes()`
+      - `num_workers` and `batch_prefetch_depth` as tuned for
+        training (or the first tuned mode if not training),
+        since there's only one of each in the config
+    The batch sizes and prefetch depth are used by
+    `train_utils.train_model()`, but the dataloaders are
+    created by the caller, so `config.num_workers` must
+    be passed on to them, e.g.
+    `DataLoader(dataset, config.train_batch_size, num_workers=config.num_workers)`.
+
+    The `model` must already be on `config.device`. It isn't
+    updated, but its gradients are reset. Note that the memory
+    of the optimizer state isn't accounted for when training,
+    so `memory_fraction` should leave room for it.
+
+    :param loss_criterion: Training loss criterion (required
+                           for tuning the "train" mode)
+    :param modes: Modes to tune, out of "train", "eval" and "test"
+                  Default = all of them
+    :param decouple_fn_train: Decoupling function to extract inputs
+                              and targets from a batch for training
+                              and evaluation (see `decouple_batch_train()`)
+    :param decouple_fn_test: Decoupling function to extract inputs
+                             from a batch for testing
+                             (see `decouple_batch_test()`)
+    See `find_max_batch_size()` and `tune_dataloader()`
+    for the other params.
+    :returns the tuned "batch_size_per_gpu", "num_workers",
+             "prefetch_depth", and "throughput" (samples/sec)
+             for each mode
+    """
+    modes = modes if modes is not None else SUPPORTED_MODES
+    for mode in modes:
+        if mode not in SUPPORTED_MODES:
+            raise ValueError(f"Param 'mode' ('{mode}') must be one of {SUPPORTED_MODES}.")
+
+    # The total batch size of a model parallelized across GPUs is this times the per-GPU one
+    num_devices = 1 if config.distributed else max(1, config.n_gpu)
+
+    results = {}
+    for mode in modes:
+        logging.info(f"Tuning batch size and dataloader for mode '{mode}'...")
+        kwargs = {
+            "loss_criterion": loss_criterion,
+            "decouple_fn": decouple_fn_test if mode == "test" else decouple_fn_train,
+            "collate_fn": collate_fn,
+        }
+        batch_size_per_gpu = find_max_batch_size(
+            model, dataset, config, mode, memory_fraction=memory_fraction, max_batch_size=max_batch_size, **kwargs
+        )
+        num_workers, prefetch_depth, throughput = tune_dataloader(
+            model,
+            dataset,
+            config,
+            num_devices * batch_size_per_gpu,
+            mode,
+            worker_candidates=worker_candidates,
+            num_batches=num_batches,
+            **kwargs,
+        )
+        results[mode] = {
+            "batch_size_per_gpu": batch_size_per_gpu,
+            "num_workers": num_workers,
+            "prefetch_depth": prefetch_depth,
+            "throughput": throughput,
+        }
+        logging.info(f"Done. {results[mode]}")
+
+    # Write the results back into the config
+    for mode, result in results.items():
+        config[f"{mode}_batch_size_per_gpu"] = result["batch_size_per_gpu"]
+    config.batch_size_per_gpu = None  # Batch sizes are specific to each mode
+    set_all_batch_sizes(config)
+    if len(results):
+        result = results["train"] if "train" in results else results[modes[0]]
+        config.num_workers, config.batch_prefetch_depth = result["num_workers"], result["prefetch_depth"]
+    return results
+
+
+def find_max_batch_size(
+    model: nn.Module,
+    dataset: Dataset,
+    config: _Config,
+    mode: Optional[str] = "train",
+    loss_criterion: Optional[_Loss] = None,
+    decouple_fn: Optional[_DecoupleFn] = None,
+    collate_fn: Optional[Callable] = None,
+    memory_fraction: Optional[float] = 0.9,
+    max_batch_size: Optional[int] = None,
+) -> int:
+    """
+    Find the largest per-GPU batch size for which a step
+    of the given `mode` (see `_run_probe_step()`) fits in
+    `memory_fraction` of the memory of `config.device`,
+    by doubling it until it doesn't fit (or runs out of
+    memory), and then binary searching between the last
+    two batch sizes.
+
+    On GPUs, the budget is a fraction of the total memory
+    of the device, and the peak memory allocated by PyTorch
+    is measured. On CPUs, it's a fraction of the memory
+    available when starting (on top of the memory already
+    in use), and the peak resident set size of the process
+    is measured. This is only possible on Linux, so on other
+    platforms the batch size is only limited by errors when
+    running out of memory, and `max_batch_size`.
+
+    :param max_batch_size: Largest (per-GPU) batch size to try.
+                           Defaults to the size of the dataset.
+    """
+    assert 0.0 < memory_fraction <= 1.0, "Param 'memory_fraction' must be in (0, 1]."
+    device = torch.device(config.device)
+    autocast_dtype = get_autocast_dtype(config.autocast_dtype)
+    decouple_fn = _get_decouple_fn(mode, decouple_fn)
+    prepare_batch = get_batch_preparer(decouple_fn, device)
+    num_devices = 1 if config.distributed else max(1, config.n_gpu)
+    max_batch_size = min(max_batch_size or len(dataset), len(dataset) // num_devices)
+
+    memory_budget = None
+    if device.type == "cuda":
+        memory_budget = memory_fraction * torch.cuda.get_device_properties(device).total_memory
+    else:
+        available_memory = get_available_memory()
+        if available_memory is not None and reset_peak_rss():
+            memory_budget = get_peak_rss() + memory_fraction * available_memory
+        else:
+            logging.warning("Peak memory usage can't be measured on this platform, so it isn't limited to the budget.")
+
+    def fits(batch_size_per_gpu: int) -> bool:
+        """
+        Check if a step with a batch of this
+        (per-GPU) size fits in the memory budget.
+        """
+        batch_size = num_devices * batch_size_per_gpu
+        batch = next(iter(DataLoader(dataset, batch_size=batch_size, collate_fn=collate_fn)))
+        if device.type == "cuda":
+            torch.cuda.empty_cache()
+            torch.cuda.reset_peak_memory_stats(device)
+        elif memory_budget is not None:
+            reset_peak_rss()
+        try:
+            _run_probe_step(model, prepare_batch(batch), mode, device, loss_criterion, autocast_dtype)
+            if device.type == "cuda":
+                torch.cuda.synchronize(device)
+        except RuntimeError as e:  # Also raised by `torch.cuda.OutOfMemoryError`
+            if "out of memory" not in str(e).lower():
+                raise
+            logging.info(f"Batch size {batch_size_per_gpu} ran out of memory.")
+            return False
+        finally:
+            batch = None
+            peak_memory = torch.cuda.max_memory_allocated(device) if device.type == "cuda" else get_peak_rss()
+            model.zero_grad(set_to_none=True)
+            if device.type == "cuda":
+                torch.cuda.empty_cache()
+        return memory_budget is None or peak_memory <= memory_budget
+
+    was_training = model.training
+    try:
+        if not fits(1):
+            raise RuntimeError("Not even a batch of size 1 fits in the memory budget.")
+
+        # Double the batch size until it doesn't fit
+        low, high = 1, None
+        while low < max_batch_size:
+            batch_size = min(2 * low, max_batch_size)
+            if not fits(batch_size):
+                high = batch_size
+                break
+            low = batch_size
+
+        # Binary search between the largest batch size that fits and the smallest one that doesn't
+        if high is not None:
+            while high - low > 1:
+                batch_size = (low + high) // 2
+                low, high = (batch_size, high) if fits(batch_size) else (low, batch_size)
+    finally:
+        model.train(was_training)
+    return low
+
+
+def tune_dataloader(
+    model: nn.Module,
+    dataset: Dataset,
+    config: _Config,
+    batch_size: int,
+    mode: Optional[str] = "train",
+    loss_criterion: Optional[_Loss] = None,
+    decouple_fn: Optional[_DecoupleFn] = None,
+    collate_fn: Optional[Callable] = None,
+    worker_candidates: Optional[List[int]] = None,
+    prefetch_depth_candidates: Optional[List[int]] = None,
+    num_batches: Optional[int] = 10,
+) -> Tuple[int, int, float]:
+    """
+    Find the number of dataloader workers that maximizes the
+    throughput of the given `mode` (see `measure_throughput()`)
+    for the given (total) `batch_size` without prefetching, and
+    then the batch prefetch depth (see `utils.BatchPrefetcher`)
+    that maximizes it with those many workers.
+    Tuning them one after the other (instead of trying all
+    combinations) keeps the number of probes small.
+
+    :param worker_candidates: Numbers of workers to try. Defaults to
+                              0 and all powers of 2 up to the number
+                              of CPUs.
+    :param prefetch_depth_candidates: Prefetch depths to try
+                                      Default = [0, 1, 2, 4]
+    :returns the number of workers, prefetch depth,
+             and throughput (samples/sec) with them
+    """
+    if worker_candidates is None:
+        num_cpus = os.cpu_count() or 1
+        worker_candidates = [0] + [2 ** i for i in range(num_cpus.bit_length()) if 2 ** i <= num_cpus]
+    if prefetch_depth_candidates is None:
+        prefetch_depth_candidates = [0, 1, 2, 4]
+
+    def get_throughput(num_workers: int, prefetch_depth: int) -> float:
+        dataloader = DataLoader(
+            dataset, batch_size=batch_size, shuffle=mode == "train", num_workers=num_workers, collate_fn=collate_fn
+        )
+        throughput = measure_throughput(
+            model, dataloader, config, mode, loss_criterion, decouple_fn, prefetch_depth, num_batches
+        )
+        logging.info(f"{num_workers} workers, prefetch depth {prefetch_depth}: {throughput:.1f} samples/sec.")
+        return throughput
+
+    throughputs = {num_workers: get_throughput(num_workers, 0) for num_workers in worker_candidates}
+    num_workers = max(throughputs, key=throughputs.get)
+    throughputs = {
+        prefetch_depth: throughputs[num_workers] if prefetch_depth == 0 else get_throughput(num_workers, prefetch_depth)
+        for prefetch_depth in prefetch_depth_candidates
+    }
+    prefetch_depth = max(throughputs, key=throughputs.get)
+    return num_workers, prefetch_depth, throughputs[prefetch_depth]
+
+
+def measure_throughput(
+    model: nn.Module,
+    dataloader: DataLoader,
+    config: _Config,
+    mode: Optional[str] = "train",
+    loss_criterion: Optional[_Loss] = None,
+    decouple_fn: Optional[_DecoupleFn] = None,
+    prefetch_depth: Optional[int] = 0,
+    num_batches: Optional[int] = 10,
+    num_warmup_batches: Optional[int] = 2,
+) -> float:
+    """
+    Measure the throughput (samples/sec) of running steps
+    of the given `mode` (see `_run_probe_step()`) on the
+    batches of a dataloader, including loading them, after
+    a few warmup batches (e.g. for starting the workers).
+    The dataloader must have more than `num_warmup_batches`.
+    """
+    device = torch.device(config.device)
+    autocast_dtype = get_autocast_dtype(config.autocast_dtype)
+    prepare_batch = get_batch_preparer(_get_decouple_fn(mode, decouple_fn), device, pin_memory=prefetch_depth > 0)
+    batches = BatchPrefetcher(
+        islice(dataloader, num_warmup_batches + num_batches), prepare_batch, prefetch_depth, device
+    )
+
+    was_training = model.training
+    num_examples, start_time = 0, None
+    try:
+        with batches:
+            for batch_idx, (batch, device_batch) in enumerate(batches):
+                if batch_idx == num_warmup_batches:
+                    _synchronize(device)
+                    start_time = time.perf_counter()
+                _run_probe_step(model, device_batch, mode, device, loss_criterion, autocast_dtype)
+                if batch_idx >= num_warmup_batches:
+                    num_examples += get_batch_size(batch)
+        _synchronize(device)
+    finally:
+        model.zero_grad(set_to_none=True)
+        model.train(was_training)
+
+    if start_time is None:
+        raise ValueError(f"Dataloader must have more than {num_warmup_batches} batches for measuring throughput.")
+    return num_examples / (time.perf_counter() - start_time)
+
+
+def _run_probe_step(
+    model: nn.Module,
+    device_batch: _Batch,
+    mode: str,
+    device: _Device,
+    loss_criterion: Optional[_Loss] = None,
+    autocast_dtype: Optional[torch.dtype] = None,
+) -> None:
+    """
+    Run a single step of the given `mode` on a (decoupled)
+    batch on the device, without updating the model:
+      - "train": Forward and backward pass (the gradients
+                 are accumulated, and must be reset by the caller)
+      - "eval" / "test": Forward pass only
+    """
+    if mode == "train" and loss_criterion is None:
+        raise ValueError("Param 'loss_criterion' must be provided for tuning the 'train' mode.")
+    model.train(mode == "train")
+    inputs = device_batch if mode == "test" else device_batch[0]
+    with torch.set_grad_enabled(mode == "train"):
+        with get_autocast_context(device, autocast_dtype):
+            outputs = get_model_outputs_only(model(inputs))
+            if mode == "train":
+                loss = loss_criterion(outputs, device_batch[1])
+        if mode == "train":
+            loss.backward()
+
+
+def _get_decouple_fn(mode: str, decouple_fn: Optional[_DecoupleFn] = None) -> _DecoupleFn:
+    """
+    Get the decoupling function of a mode,
+    falling back to the default one.
+    """
+    if mode not in SUPPORTED_MODES:
+        raise ValueError(f"Param 'mode' ('{mode}') must be one of {SUPPORTED_MODES}.")
+    if decouple_fn is not None:
+        return decouple_fn
+    return decouple_batch_test if mode == "test" else decouple_batch_train
+
+
+def _synchronize(device: torch.device) -> None:
+    """
+    Wait for all work on a GPU to finish (for timing).
+    """
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
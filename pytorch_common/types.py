@@ -1,5 +1,6 @@
-from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
+import numpy as np
 import torch
 import torch.nn as nn
 from matplotlib.figure import Figure
@@ -12,9 +13,12 @@ __all__ = [
     "Tuple",
     "Dict",
     "Iterable",
+    "Iterator",
+    "NamedTuple",
     "Callable",
     "Optional",
     "Union",
+    "Set",
     "Munch",
     "_StringDict",
     "_Config",
@@ -23,14 +27,18 @@ __all__ = [
     "_Loss",
     "Figure",
     "_TensorOrTensors",
+    "_TensorOrArray",
     "_ModelOrModels",
     "_EvalCriterionOrCriteria",
     "_TrainResult",
+    "_TrainResultWithMetrics",
     "_EvalResult",
     "_TestResult",
+    "_PredictionChunk",
     "_DecoupleFnTrain",
     "_DecoupleFnTest",
     "_DecoupleFn",
+    "_TrialFn",
 ]
 
 
@@ -40,13 +48,18 @@ _Device = Union[str, torch.device]
 _Batch = Iterable
 
 _TensorOrTensors = Union[torch.Tensor, Iterable[torch.Tensor]]
+_TensorOrArray = Union[torch.Tensor, np.ndarray]
 _ModelOrModels = Union[nn.Module, Iterable[nn.Module]]
 _EvalCriterionOrCriteria = Union[Dict[str, Callable], Dict[str, Iterable[Callable]]]
 
 _TrainResult = List[float]
-_EvalResult = Tuple[List[float], Dict[str, float], torch.Tensor, torch.Tensor]
+_TrainResultWithMetrics = Tuple[List[float], Dict[str, float]]
+_EvalResult = Tuple[List[float], Dict[str, float], Optional[torch.Tensor], Optional[torch.Tensor]]
 _TestResult = Iterable[torch.Tensor]
+_PredictionChunk = Tuple[torch.Tensor, torch.Tensor, Optional[torch.Tensor], Optional[torch.Tensor]]
 
 _DecoupleFnTrain = Callable[[_Batch], Tuple[_Batch]]
 _DecoupleFnTest = Callable[[_Batch], _Batch]
 _DecoupleFn = Callable[[_Batch], Union[_Batch, Tuple[_Batch]]]
+
+_TrialFn = Callable[[_Config, _StringDict], _StringDict]
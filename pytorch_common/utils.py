@@ -1,14 +1,23 @@
 from __future__ import annotations
 
+import contextlib
+import dataclasses
+import functools
 import hashlib
 import logging
 import os
 import pickle
+import queue
 import random
 import shutil
 import sys
+import threading
 import time
-from collections import OrderedDict
+import tracemalloc
+import types
+from collections import OrderedDict, deque
+from collections.abc import Mapping, MutableMapping
+from copy import copy, deepcopy
 
 import dill
 import numpy as np
@@ -20,6 +29,7 @@ from dask.callbacks import Callback
 from torch.optim.optimizer import Optimizer
 from tqdm import tqdm
 
+from .distributed import is_optimizer_sharded
 from .types import *
 
 
@@ -133,6 +143,36 @@ def set_seed(seed: Optional[int] = 0) -> None:
     torch.cuda.manual_seed_all(seed)  # Safe to call even if no GPU available
 
 
+def get_rng_state() -> _StringDict:
+    """
+    Get the states of all random number generators
+    (Python, NumPy, torch CPU and CUDA), e.g. to
+    store them in a checkpoint.
+    """
+    rng_state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        rng_state["cuda"] = torch.cuda.get_rng_state_all()
+    return rng_state
+
+
+def set_rng_state(rng_state: _StringDict) -> None:
+    """
+    Restore the states of all random number
+    generators obtained with `get_rng_state()`.
+    """
+    random.setstate(rng_state["python"])
+    np.random.set_state(rng_state["numpy"])
+    # RNG states must be CPU byte tensors, but may have been
+    # mapped to another device when loading a checkpoint
+    torch.set_rng_state(rng_state["torch"].cpu())
+    if "cuda" in rng_state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all([state.cpu() for state in rng_state["cuda"]])
+
+
 def print_dataframe(data: pd.DataFrame) -> None:
     """
     Print useful summary statistics of a dataframe.
@@ -358,7 +398,11 @@ def get_unique_config_name(primary_name: str, config_info_dict: Optional[_String
 
 
 def get_checkpoint_name(
-    checkpoint_type: str, model_name: str, epoch: int, config_info_dict: Optional[_StringDict] = None,
+    checkpoint_type: str,
+    model_name: str,
+    epoch: int,
+    config_info_dict: Optional[_StringDict] = None,
+    step: Optional[int] = None,
 ) -> str:
     """
     Returns the appropriate name of checkpoint file
@@ -366,12 +410,16 @@ def get_checkpoint_name(
     :param checkpoint_type: Type of checkpoint ("state" | "model")
     :param config_info_dict: An optional dict provided containing
                              information about current config.
+    :param step: Global optimizer step, if the checkpoint
+                 is saved in the middle of epoch `epoch`
     E.g.:
     `checkpoint-model-subcategory_classifier-3d02e8616cbeab37bc1bb972ecf02882-epoch_1.pt`
+    `checkpoint-model-subcategory_classifier-3d02e8616cbeab37bc1bb972ecf02882-epoch_2-step_1500.pt`
     """
     assert checkpoint_type in ["state", "model"]
     unique_name = get_unique_config_name(model_name, config_info_dict)
-    checkpoint_name = f"checkpoint-{checkpoint_type}-{unique_name}-epoch_{epoch}.pt"
+    step_str = f"-step_{step}" if step is not None else ""
+    checkpoint_name = f"checkpoint-{checkpoint_type}-{unique_name}-epoch_{epoch}{step_str}.pt"
     return checkpoint_name
 
 
@@ -387,6 +435,35 @@ def get_trainable_params(model: nn.Module) -> Dict[str, int]:
     return {"trainable": num_trainable_params, "total": num_params}
 
 
+def get_object_size(obj: Any) -> int:
+    """
+    Get the (approximate) total number of bytes held by an
+    object, incl. all objects it refers to (in containers or
+    its attributes), and the data of all tensors and arrays.
+    Every object is only counted once.
+    """
+    total_size, seen, objects = 0, set(), [obj]
+    while len(objects):
+        obj = objects.pop()
+        if id(obj) in seen or isinstance(obj, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(obj))
+        if torch.is_tensor(obj):
+            total_size += obj.element_size() * obj.nelement()
+        elif isinstance(obj, np.ndarray):
+            total_size += obj.nbytes
+        else:
+            total_size += sys.getsizeof(obj)
+            if isinstance(obj, Mapping):
+                objects.extend(obj.keys())
+                objects.extend(obj.values())
+            elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+                objects.extend(obj)
+            elif hasattr(obj, "__dict__"):
+                objects.append(vars(obj))
+    return total_size
+
+
 def get_model_outputs_only(outputs: _TensorOrTensors) -> _TensorOrTensors:
     """
     Use this function to get just the raw
@@ -432,7 +509,237 @@ def send_model_to_device(model: nn.Module, device: _Device, device_ids: Optional
     return model
 
 
-def send_batch_to_device(batch: _Batch, device: _Device, non_blocking: Optional[bool] = True) -> _Batch:
+def get_autocast_dtype(dtype_name: Optional[str] = None) -> Optional[torch.dtype]:
+    """
+    Get the torch dtype to be used for autocasting
+    from its name (e.g. "bfloat16"), or None if
+    autocasting is disabled.
+    """
+    SUPPORTED_AUTOCAST_DTYPES = ["bfloat16"]
+    if dtype_name is None:
+        return None
+    if dtype_name not in SUPPORTED_AUTOCAST_DTYPES:
+        raise ValueError(f"Param 'autocast_dtype' ('{dtype_name}') must be one of {SUPPORTED_AUTOCAST_DTYPES}.")
+    return getattr(torch, dtype_name)
+
+
+def get_autocast_context(
+    device: _Device, dtype: Optional[torch.dtype] = None
+) -> Union[torch.autocast, contextlib.nullcontext]:
+    """
+    Get the context manager for running ops in
+    mixed precision (autocasting to `dtype`) on
+    the given `device`.
+    If `dtype` is None, autocasting is disabled and
+    a no-op context manager is returned.
+
+    Note: Autocasting only affects the ops run inside the
+          context. Model parameters (and hence optimizer
+          state and checkpoints) remain in full precision.
+    """
+    if dtype is None:
+        return contextlib.nullcontext()
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+
+class BatchSpec(NamedTuple):
+    """
+    Layout of a (nested) batch, as returned by
+    `flatten_batch()`, which is required to
+    rebuild it from its leaves.
+      - `batch_type`: Type of the container
+      - `keys`: Keys of a mapping, or field names of
+                a dataclass (None for sequences)
+      - `children`: Specs of the elements of the container
+                    (None for a leaf)
+    """
+
+    batch_type: type
+    keys: Optional[Tuple]
+    children: Tuple[Optional[BatchSpec], ...]
+
+
+# Kinds of containers understood by `flatten_batch()`
+_LEAF, _SEQUENCE, _NAMEDTUPLE, _MAPPING, _DATACLASS = range(5)
+
+# Max size of a tensor (in bytes) to be coalesced with
+# other small tensors in `send_batch_to_device()`
+COALESCE_MAX_BYTES = 1 << 20
+
+
+@functools.lru_cache(maxsize=None)
+def _get_container_kind(batch_type: type) -> int:
+    """
+    Get the kind of container of the given type (cached per type).
+    Tensors, arrays, strings, etc. are all leaves.
+    """
+    if issubclass(batch_type, tuple) and hasattr(batch_type, "_fields"):
+        return _NAMEDTUPLE
+    if issubclass(batch_type, (list, tuple)):
+        return _SEQUENCE
+    if issubclass(batch_type, Mapping):
+        return _MAPPING
+    if dataclasses.is_dataclass(batch_type):
+        return _DATACLASS
+    return _LEAF
+
+
+@functools.lru_cache(maxsize=None)
+def _get_dataclass_fields(batch_type: type) -> Tuple[str, ...]:
+    """
+    Get the names of all fields of a dataclass
+    that are set through its constructor.
+    """
+    return tuple(field.name for field in dataclasses.fields(batch_type) if field.init)
+
+
+def flatten_batch(batch: _Batch) -> Tuple[List[Any], Optional[BatchSpec]]:
+    """
+    Flatten a (nested) batch into a list of its leaves
+    (e.g. tensors) in a depth-first order, along with
+    its layout (see `BatchSpec`), or None if the batch
+    itself is a leaf.
+
+    Lists, tuples, named tuples, mappings (e.g. dicts,
+    or the `BatchEncoding`s of `transformers` tokenizers),
+    and dataclasses are treated as containers, and
+    everything else as a leaf.
+    Inverse operation of `unflatten_batch()`.
+
+    E.g.:
+        >>> leaves, spec = flatten_batch({"input_ids": a, "labels": (b, c)})
+        >>> leaves
+        [a, b, c]
+        >>> unflatten_batch(leaves, spec)
+        {"input_ids": a, "labels": (b, c)}
+    """
+    leaves: List[Any] = []
+    return leaves, _flatten_batch(batch, leaves)
+
+
+def _flatten_batch(batch: _Batch, leaves: List[Any]) -> Optional[BatchSpec]:
+    """
+    Recursively append all leaves of the batch
+    to `leaves` and return its layout.
+    """
+    kind = _get_container_kind(type(batch))
+    if kind == _LEAF:
+        leaves.append(batch)
+        return None
+    if kind == _MAPPING:
+        keys = tuple(batch.keys())
+        values = batch.values()
+    elif kind == _DATACLASS:
+        keys = _get_dataclass_fields(type(batch))
+        values = (getattr(batch, key) for key in keys)
+    else:
+        keys, values = None, batch
+    return BatchSpec(type(batch), keys, tuple(_flatten_batch(value, leaves) for value in values))
+
+
+def unflatten_batch(leaves: Iterable[Any], spec: Optional[BatchSpec], batch: Optional[_Batch] = None) -> _Batch:
+    """
+    Rebuild a batch from its leaves and layout,
+    as returned by `flatten_batch()`.
+    The function for rebuilding a batch is
+    compiled once per layout and cached.
+
+    Dicts (and `OrderedDict`s) are rebuilt from their
+    keys and values. Other mappings (e.g. `defaultdict`s,
+    or `BatchEncoding`s) may hold more than that, so they
+    are rebuilt from a shallow copy of the original ones
+    in `batch` (the batch that was flattened), with their
+    values replaced, if it's provided.
+    """
+    return _get_unflatten_fn(spec)(iter(leaves), batch)
+
+
+@functools.lru_cache(maxsize=256)
+def _get_unflatten_fn(spec: Optional[BatchSpec]) -> Callable[[Iterator[Any], Optional[_Batch]], _Batch]:
+    """
+    Compile a function rebuilding a batch of
+    the given layout from an iterator over its
+    leaves (and the original batch, if any), so
+    that the type of each container is only
+    looked up once per layout.
+    """
+    if spec is None:
+        return lambda leaves, batch: next(leaves)
+
+    child_fns = [_get_unflatten_fn(child) for child in spec.children]
+    batch_type, keys = spec.batch_type, spec.keys
+    kind = _get_container_kind(batch_type)
+    copy_originals = _has_copied_mappings(spec)
+
+    def rebuild_children(leaves: Iterator[Any], batch: Optional[_Batch]) -> List[Any]:
+        if batch is None or not copy_originals:  # Originals of the children aren't needed
+            return [fn(leaves, None) for fn in child_fns]
+        if kind == _MAPPING:
+            originals = (batch[key] for key in keys)
+        elif kind == _DATACLASS:
+            originals = (getattr(batch, key) for key in keys)
+        else:
+            originals = batch
+        return [fn(leaves, original) for fn, original in zip(child_fns, originals)]
+
+    if kind == _NAMEDTUPLE:
+        return lambda leaves, batch: batch_type(*rebuild_children(leaves, batch))
+    if kind == _MAPPING and _is_copied_mapping(batch_type):
+
+        def rebuild_mapping(leaves: Iterator[Any], batch: Optional[_Batch]) -> _Batch:
+            values = rebuild_children(leaves, batch)
+            if batch is None:
+                return batch_type(zip(keys, values))
+            mapping = copy(batch)
+            for key, value in zip(keys, values):
+                mapping[key] = value
+            return mapping
+
+        return rebuild_mapping
+    if kind == _MAPPING:
+        return lambda leaves, batch: batch_type(zip(keys, rebuild_children(leaves, batch)))
+    if kind == _DATACLASS:
+        return lambda leaves, batch: batch_type(**dict(zip(keys, rebuild_children(leaves, batch))))
+    return lambda leaves, batch: batch_type(rebuild_children(leaves, batch))
+
+
+def _is_copied_mapping(batch_type: type) -> bool:
+    """
+    Check if mappings of this type are rebuilt from a
+    copy of the original one (see `unflatten_batch()`).
+    """
+    return batch_type not in [dict, OrderedDict] and issubclass(batch_type, MutableMapping)
+
+
+@functools.lru_cache(maxsize=256)
+def _has_copied_mappings(spec: Optional[BatchSpec]) -> bool:
+    """
+    Check if any container of a batch of the given layout is a
+    mapping rebuilt from a copy of the original one.
+    """
+    if spec is None:
+        return False
+    kind = _get_container_kind(spec.batch_type)
+    return (kind == _MAPPING and _is_copied_mapping(spec.batch_type)) or any(
+        _has_copied_mappings(child) for child in spec.children
+    )
+
+
+def get_batch_size(batch: _Batch) -> int:
+    """
+    Get the number of examples in a (nested) batch,
+    i.e. the length of the first dimension of its
+    first tensor / array (in a depth-first order).
+    """
+    for leaf in flatten_batch(batch)[0]:
+        if isinstance(leaf, (torch.Tensor, np.ndarray)) and leaf.ndim > 0:
+            return len(leaf)
+    raise ValueError("Batch must contain at least one tensor or array with a batch dimension.")
+
+
+def send_batch_to_device(
+    batch: _Batch, device: _Device, non_blocking: Optional[bool] = True, coalesce: Optional[bool] = False
+) -> _Batch:
     """
     Send batch to given device.
 
@@ -441,6 +748,11 @@ def send_batch_to_device(batch: _Batch, device: _Device, non_blocking: Optional[
                          with respect to the host. For other cases,
                          this argument has no effect.
                          For explanation, see: https://stackoverflow.com/a/55564072
+    :param coalesce: If True, all small tensors (of at most `COALESCE_MAX_BYTES`)
+                     of the same dtype are packed into one contiguous buffer,
+                     which is sent to the device in a single transfer, instead
+                     of one transfer per tensor. The returned tensors are then
+                     views into this buffer.
 
     Useful when the batch tuple is of variable lengths.
     Specifically,
@@ -448,8 +760,11 @@ def send_batch_to_device(batch: _Batch, device: _Device, non_blocking: Optional[
             batch = (product_embedding, y)
         - In one-hot encoded multiclass / multilabel setting (e.g. ABSANet):
             batch = ( (product_embedding, label_embedding), y )
-    This function will recursively send all tensors to the
-    device retaining the original structure of the batch.
+        - For transformer-based models:
+            batch = ( {"input_ids": input_ids, "attention_mask": attention_mask}, y )
+    This function will send all tensors to the device
+    retaining the original structure of the batch
+    (see `flatten_batch()` for the containers supported).
 
     E.g.:
         >>> a = torch.tensor([1,2,3], device="cpu")
@@ -468,18 +783,77 @@ def send_batch_to_device(batch: _Batch, device: _Device, non_blocking: Optional[
         if compare_devices(batch.device, device):  #  Avoid copy/transfer if already on given device
             return batch
         return batch.to(device=device, non_blocking=non_blocking)
-    elif isinstance(batch, (list, tuple)):
-        # Retain same data type as original
-        return type(batch)(send_batch_to_device(e, device, non_blocking) for e in batch)
-    else:  # Structure/type of batch unknown
+
+    leaves, spec = flatten_batch(batch)
+    if spec is None:  # Structure/type of batch unknown
         logging.warning(f"Type '{type(batch)}' not understood. Returning variable as-is.")
         return batch
+    return unflatten_batch(_send_leaves_to_device(leaves, device, non_blocking, coalesce), spec, batch)
+
+
+def _send_leaves_to_device(
+    leaves: List[Any], device: _Device, non_blocking: Optional[bool] = True, coalesce: Optional[bool] = False
+) -> List[Any]:
+    """
+    Send all tensors among the leaves of a batch (see `flatten_batch()`)
+    to the given device, optionally coalescing small tensors.
+    See `send_batch_to_device()` for more details.
+    """
+    device = torch.device(device)
+    leaves = list(leaves)
+    indices = [i for i, leaf in enumerate(leaves) if torch.is_tensor(leaf) and leaf.device != device]
+
+    # Group small tensors by dtype and source device to be sent together
+    groups: Dict[Tuple[torch.dtype, torch.device], List[int]] = {}
+    if coalesce:
+        for i in indices:
+            if leaves[i].numel() * leaves[i].element_size() <= COALESCE_MAX_BYTES:
+                groups.setdefault((leaves[i].dtype, leaves[i].device), []).append(i)
+        groups = {key: group for key, group in groups.items() if len(group) > 1}
+        coalesced_indices = {i for group in groups.values() for i in group}
+        indices = [i for i in indices if i not in coalesced_indices]
+
+    for i in indices:
+        leaves[i] = leaves[i].to(device=device, non_blocking=non_blocking)
+
+    for (dtype, source_device), group in groups.items():
+        tensors = [leaves[i] for i in group]
+        sizes = [tensor.numel() for tensor in tensors]
+        pin_memory = source_device.type == "cpu" and device.type == "cuda" and non_blocking
+        buffer = torch.empty(sum(sizes), dtype=dtype, pin_memory=pin_memory)
+        torch.cat([tensor.reshape(-1) for tensor in tensors], out=buffer)
+        buffer = buffer.to(device=device, non_blocking=non_blocking)
+        for i, tensor, chunk in zip(group, tensors, buffer.split(sizes)):
+            leaves[i] = chunk.view(tensor.shape)
+    return leaves
+
+
+def pin_batch_memory(batch: _Batch) -> _Batch:
+    """
+    Copy all CPU tensors in the batch into page-locked
+    (pinned) memory, retaining the original structure of
+    the batch, so that sending them to the GPU with
+    `non_blocking=True` is truly asynchronous.
+    Tensors already pinned or not on CPU are returned as-is.
+    """
+    leaves, spec = flatten_batch(batch)
+    leaves = [
+        leaf.pin_memory() if torch.is_tensor(leaf) and leaf.device.type == "cpu" and not leaf.is_pinned() else leaf
+        for leaf in leaves
+    ]
+    return unflatten_batch(leaves, spec, batch)
 
 
 def send_optimizer_to_device(optimizer: Optimizer, device: _Device) -> Optimizer:
     """
     Send an optimizer to specified device.
+    Each process only holds, and hence sends, the
+    state of its own share of the parameters if the
+    optimizer state is sharded (see `distributed.shard_optimizer_state()`).
     """
+    if is_optimizer_sharded(optimizer):
+        send_optimizer_to_device(optimizer.optim, device)
+        return optimizer
     for state in optimizer.state.values():
         for k, v in state.items():
             if torch.is_tensor(v):
@@ -491,62 +865,70 @@ def convert_tensor_to_numpy(batch: _Batch) -> _Batch:
     """
     Convert torch tensor(s) on any device to numpy array(s).
     Similar to `send_batch_to_device()`, can take a
-    `torch.Tensor` or a tuple/list of them as input.
+    `torch.Tensor` or any (nested) container of them
+    as input, retaining its structure.
     """
     if torch.is_tensor(batch):
         return send_batch_to_device(batch, "cpu").detach().numpy()
-    elif isinstance(batch, (list, tuple)):
-        # Retain same data type as original
-        return type(batch)(convert_tensor_to_numpy(e) for e in batch)
-    else:  # Structure/type of batch unknown
+
+    leaves, spec = flatten_batch(batch)
+    if spec is None:  # Structure/type of batch unknown
         logging.warning(f"Type '{type(batch)}' not understood. Returning variable as-is.")
         return batch
+    leaves = _send_leaves_to_device(leaves, "cpu")
+    return unflatten_batch([leaf.detach().numpy() if torch.is_tensor(leaf) else leaf for leaf in leaves], spec, batch)
 
 
 def convert_numpy_to_tensor(
-    batch: _Batch, device: Optional[_Device] = None, non_blocking: Optional[bool] = True
+    batch: _Batch,
+    device: Optional[_Device] = None,
+    non_blocking: Optional[bool] = True,
+    coalesce: Optional[bool] = False,
 ) -> _Batch:
     """
     Convert numpy array(s) to torch tensor(s) and
     optionally sends them to the desired device.
     Inverse operation of `convert_tensor_to_numpy()`,
-    and similar to it, can take a np.ndarray or a
-    tuple/list of them as input.
+    and similar to it, can take a np.ndarray or any
+    (nested) container of them as input.
+    See `send_batch_to_device()` for the other params.
     """
     if isinstance(batch, np.ndarray):
         batch = torch.as_tensor(batch)
         return batch if device is None else send_batch_to_device(batch, device, non_blocking)
-    elif isinstance(batch, (list, tuple)):
-        # Retain same data type as original
-        return type(batch)(convert_numpy_to_tensor(e, device, non_blocking) for e in batch)
-    else:  # Structure/type of batch unknown
+
+    leaves, spec = flatten_batch(batch)
+    if spec is None:  # Structure/type of batch unknown
         logging.warning(f"Type '{type(batch)}' not understood. Returning variable as-is.")
         return batch
+    leaves = [torch.as_tensor(leaf) if isinstance(leaf, np.ndarray) else leaf for leaf in leaves]
+    if device is not None:
+        leaves = _send_leaves_to_device(leaves, device, non_blocking, coalesce)
+    return unflatten_batch(leaves, spec, batch)
 
 
 def compare_tensors_or_arrays(batch_a: _Batch, batch_b: _Batch) -> bool:
     """
     Compare the contents of two batches.
     Each batch may be of type `np.ndarray` or
-    `torch.Tensor` or a list/tuple of them.
+    `torch.Tensor` or any (nested) container of
+    them (see `flatten_batch()`).
 
     Will return True if the types of the two
     batches are different but contents are the same.
     """
-    if torch.is_tensor(batch_a):
-        batch_a = convert_tensor_to_numpy(batch_a)
-    if torch.is_tensor(batch_b):
-        batch_b = convert_tensor_to_numpy(batch_b)
-
-    if isinstance(batch_a, np.ndarray) and isinstance(batch_b, np.ndarray):
-        return np.all(batch_a == batch_b)
-    elif isinstance(batch_a, (list, tuple)) and isinstance(batch_b, (list, tuple)):
-        return all(compare_tensors_or_arrays(a, b) for a, b in zip(batch_a, batch_b))
-    else:  # Structure/type of batch unknown
-        raise TypeError(
-            f"Types of each batch '({type(batch_a)}, {type(batch_b)})' must "
-            f"be `np.ndarray`, `torch.Tensor` or a list/tuple of them."
-        )
+    leaves_a, _ = flatten_batch(batch_a)
+    leaves_b, _ = flatten_batch(batch_b)
+    for leaf in leaves_a + leaves_b:
+        if not isinstance(leaf, (np.ndarray, torch.Tensor)):  # Structure/type of batch unknown
+            raise TypeError(
+                f"Types of each batch '({type(batch_a)}, {type(batch_b)})' must be `np.ndarray`, "
+                f"`torch.Tensor` or a container of them, but found '{type(leaf)}'."
+            )
+    if len(leaves_a) != len(leaves_b):
+        return False
+    leaves_a, leaves_b = convert_tensor_to_numpy(leaves_a), convert_tensor_to_numpy(leaves_b)
+    return all(np.all(a == b) for a, b in zip(leaves_a, leaves_b))
 
 
 def compare_model_parameters(parameters1: Iterable[torch.Tensor], parameters2: Iterable[torch.Tensor]) -> bool:
@@ -582,14 +964,15 @@ def is_batch_on_gpu(batch: _Batch) -> bool:
     Check if a `batch` is on a GPU.
 
     Similar to `send_batch_to_device()`, can take a
-    `torch.Tensor` or a tuple/list of them as input.
+    `torch.Tensor` or any (nested) container of them as input.
     """
     if torch.is_tensor(batch):
         return batch.is_cuda
-    elif isinstance(batch, (list, tuple)):
-        return all(is_batch_on_gpu(e) for e in batch)
-    else:  # Structure/type of batch unknown
-        raise TypeError(f"Type '{type(batch)}' not understood.")
+    leaves, _ = flatten_batch(batch)
+    for leaf in leaves:
+        if not torch.is_tensor(leaf):  # Structure/type of batch unknown
+            raise TypeError(f"Type '{type(leaf)}' not understood.")
+    return all(leaf.is_cuda for leaf in leaves)
 
 
 def is_model_on_gpu(model: nn.Module) -> bool:
@@ -648,6 +1031,17 @@ class ModelTracker:
     Use this for keeping track of the loss and
     any evaluation metrics (accuracy, f1, etc.)
     at each epoch.
+
+    If evaluation is (also) performed in the middle
+    of epochs, the loss and evaluation metrics are
+    additionally tracked separately for each global
+    (optimizer) step at which it was performed.
+
+    If the steps of an epoch are timed (see `StepTimer`),
+    the summary of their phase durations is tracked at
+    that epoch as well, and similarly the memory usage
+    of the phases of the epoch (see `MemoryTracker`)
+    and its throughput (see `ThroughputMeter`).
     """
 
     def __init__(self, config: _Config, is_train: Optional[bool] = True):
@@ -664,6 +1058,32 @@ class ModelTracker:
         self.loss_hist, self.eval_metrics_hist = OrderedDict(), OrderedDict()
         for eval_criterion in self.eval_criteria:
             self.eval_metrics_hist[eval_criterion] = OrderedDict()
+        self.step_times_hist, self.memory_usage_hist = OrderedDict(), OrderedDict()
+        self.throughput_hist = OrderedDict()
+        self._init_step_trackers()
+
+    def _init_step_trackers(self):
+        """
+        Initialize the loss/eval_criteria tracking
+        dictionaries keyed by global step.
+        """
+        self.step_loss_hist, self.step_eval_metrics_hist = OrderedDict(), OrderedDict()
+        for eval_criterion in self.eval_criteria:
+            self.step_eval_metrics_hist[eval_criterion] = OrderedDict()
+
+    def __setstate__(self, state: _StringDict) -> None:
+        """
+        Update `__setstate__` to be able to load
+        trackers pickled before step-wise tracking
+        (or step timing / memory tracking / throughput)
+        was introduced.
+        """
+        self.__dict__.update(state)
+        if "step_loss_hist" not in state:
+            self._init_step_trackers()
+        for hist_name in ["step_times_hist", "memory_usage_hist", "throughput_hist"]:
+            if hist_name not in state:
+                setattr(self, hist_name, OrderedDict())
 
     def add_losses(self, losses: List[float], epoch: Optional[int] = -1) -> None:
         """
@@ -786,21 +1206,53 @@ class ModelTracker:
                 for eval_criterion in self.eval_criteria
             ]
         )
+        if epoch_loss in self.throughput_hist:
+            throughput = self.throughput_hist[epoch_loss]
+            result_str += (
+                f"\nThroughput: {throughput['samples_per_sec']:.1f} samples/s, "
+                f"{throughput['steps_per_sec']:.2f} steps/s ({human_time_interval(throughput['time'])})"
+            )
+        if epoch_loss in self.step_times_hist:
+            result_str += f"\n{self._get_step_times_str(epoch_loss)}"
+        if epoch_loss in self.memory_usage_hist:
+            result_str += f"\n{self._get_memory_usage_str(epoch_loss)}"
         result_str += "\033[0m\n"
         logging.info(result_str)
         return result_str
 
-    def add_metrics(self, losses: List[float], eval_metrics: Dict[str, float], epoch: Optional[int] = -1) -> None:
+    def add_metrics(
+        self,
+        losses: List[float],
+        eval_metrics: Dict[str, float],
+        epoch: Optional[int] = -1,
+        step_times: Optional[_StringDict] = None,
+        memory_usage: Optional[_StringDict] = None,
+        throughput: Optional[Dict[str, float]] = None,
+    ) -> None:
         """
         Shorthand function to add losses
-        and eval metrics at the end of
-        a given epoch.
+        and eval metrics (and optionally
+        the summaries of the step times,
+        memory usage and throughput) at
+        the end of a given epoch.
         """
+        if step_times is not None:
+            self.add_step_times(step_times, epoch)
+        if memory_usage is not None:
+            self.add_memory_usage(memory_usage, epoch)
+        if throughput is not None:
+            self.add_throughput(throughput, epoch)
         self.add_losses(losses, epoch)
         self.add_eval_metrics(eval_metrics, epoch)
 
     def add_and_log_metrics(
-        self, losses: List[float], eval_metrics: Dict[str, float], epoch: Optional[int] = -1
+        self,
+        losses: List[float],
+        eval_metrics: Dict[str, float],
+        epoch: Optional[int] = -1,
+        step_times: Optional[_StringDict] = None,
+        memory_usage: Optional[_StringDict] = None,
+        throughput: Optional[Dict[str, float]] = None,
     ) -> str:
         """
         Shorthand function to add losses
@@ -808,19 +1260,254 @@ class ModelTracker:
         given epoch, and then print the
         results for that epoch.
         """
-        self.add_metrics(losses, eval_metrics, epoch)
+        self.add_metrics(losses, eval_metrics, epoch, step_times, memory_usage, throughput)
         return self.log_epoch_metrics(epoch)
 
-    def get_early_stopping_metric(self) -> float:
+    def add_step_times(self, step_times: _StringDict, epoch: Optional[int] = -1) -> None:
+        """
+        Store the summary of the durations of the
+        phases of the steps (see `StepTimer.summarize()`)
+        at a given epoch.
+        :param epoch: If not provided, will store at the
+                      next epoch (for which losses are yet
+                      to be stored).
+        """
+        epoch = self._get_next_epoch(epoch, "loss")
+        self.step_times_hist[epoch] = step_times
+
+    def get_step_times(self, epoch: Optional[int] = None) -> _StringDict:
+        """
+        Get the summaries of the step times.
+        :param epoch: If provided, returns the summary
+                      at that epoch, otherwise the
+                      whole dictionary keyed by epoch.
+                      If epoch=-1, returns the summary
+                      at last epoch.
+        """
+        epoch = self._get_correct_epoch(epoch, "loss")
+        if epoch is not None:
+            return self.step_times_hist[epoch]
+        return self.step_times_hist
+
+    def add_throughput(self, throughput: Dict[str, float], epoch: Optional[int] = -1) -> None:
+        """
+        Store the throughput of an epoch
+        (see `ThroughputMeter.summarize()`)
+        at a given epoch.
+        :param epoch: If not provided, will store at the
+                      next epoch (for which losses are yet
+                      to be stored).
+        """
+        epoch = self._get_next_epoch(epoch, "loss")
+        self.throughput_hist[epoch] = throughput
+
+    def get_throughput(
+        self, epoch: Optional[int] = None
+    ) -> Union[Dict[str, float], OrderedDict[int, Dict[str, float]]]:
+        """
+        Get the throughput history.
+        :param epoch: If provided, returns the throughput
+                      at that epoch, otherwise the
+                      whole dictionary keyed by epoch.
+                      If epoch=-1, returns the throughput
+                      at last epoch.
+        """
+        epoch = self._get_correct_epoch(epoch, "loss")
+        if epoch is not None:
+            return self.throughput_hist[epoch]
+        return self.throughput_hist
+
+    def add_memory_usage(self, memory_usage: _StringDict, epoch: Optional[int] = -1) -> None:
+        """
+        Store the summaries of the memory usage of the
+        phases of an epoch (see `MemoryTracker.summarize()`),
+        keyed by phase, at a given epoch.
+        :param epoch: If not provided, will store at the
+                      next epoch (for which losses are yet
+                      to be stored).
+        """
+        epoch = self._get_next_epoch(epoch, "loss")
+        self.memory_usage_hist[epoch] = memory_usage
+
+    def get_memory_usage(self, epoch: Optional[int] = None) -> _StringDict:
+        """
+        Get the summaries of the memory usage.
+        :param epoch: If provided, returns the summaries
+                      at that epoch, otherwise the
+                      whole dictionary keyed by epoch.
+                      If epoch=-1, returns the summaries
+                      at last epoch.
+        """
+        epoch = self._get_correct_epoch(epoch, "loss")
+        if epoch is not None:
+            return self.memory_usage_hist[epoch]
+        return self.memory_usage_hist
+
+    def _get_memory_usage_str(self, epoch: int) -> str:
+        """
+        Format the summaries of the memory usage at a given
+        epoch in MB for each phase, e.g.:
+        "Memory (MB): train: peak RSS 812.3 (+1.2), heap +0.4, held 0.1 | eval: ..."
+        """
+        to_mb = lambda num_bytes: num_bytes / 2 ** 20
+        phase_strs = []
+        for phase, summary in self.memory_usage_hist[epoch].items():
+            phase_str = f"{phase}: held {to_mb(summary['held_bytes']):.1f}"
+            if "peak_rss" in summary:
+                phase_str = (
+                    f"{phase}: peak RSS {to_mb(summary['peak_rss']):.1f} ({to_mb(summary['rss_growth']):+.1f}), "
+                    f"heap {to_mb(summary['heap_growth']):+.1f}, held {to_mb(summary['held_bytes']):.1f}"
+                )
+            if "peak_device" in summary:
+                phase_str += (
+                    f", device peak {to_mb(summary['peak_device']):.1f} ({to_mb(summary['device_growth']):+.1f})"
+                )
+            phase_strs.append(phase_str)
+        return f"Memory (MB): {' | '.join(phase_strs)}"
+
+    def _get_step_times_str(self, epoch: int) -> str:
+        """
+        Format the summary of the step times at a given
+        epoch as the median (and 90th percentile) duration
+        in milliseconds, and the fraction of the total time
+        of each phase, e.g.:
+        "Step times (ms): data: 1.20 (p90: 3.10, 12%), forward: ..."
+        """
+        phases_str = ", ".join(
+            [
+                f"{phase}: {1e3 * summary['p50']:.2f} (p90: {1e3 * summary['p90']:.2f}, "
+                f"{100 * summary['fraction']:.0f}%)"
+                for phase, summary in self.step_times_hist[epoch].items()
+            ]
+        )
+        return f"Step times (ms): {phases_str}"
+
+    def get_early_stopping_metric(self, step: Optional[int] = None) -> float:
         """
         For validation loggers, returns the
         `early_stopping_criterion` for the
         last epoch for which history is stored.
+        :param step: If provided, returns it for this
+                     global step instead (or for the last
+                     step if `step=-1`).
         """
         if self.is_train:
             raise ValueError("Early stopping must be applied on validation set.")
+        if step is not None:
+            return self.get_step_eval_metrics(self.early_stopping_criterion, step)
         return self.get_eval_metrics(self.early_stopping_criterion, -1)
 
+    def add_step_metrics(self, step: int, losses: List[float], eval_metrics: Dict[str, float]) -> None:
+        """
+        Store the losses and eval metrics
+        at a given global step.
+        """
+        if not isinstance(losses, list):
+            losses = [losses]
+        self.step_loss_hist[step] = losses
+        for eval_criterion in self.eval_criteria:
+            self.step_eval_metrics_hist[eval_criterion][step] = eval_metrics[eval_criterion]
+
+    def get_step_losses(self, step: Optional[int] = None) -> Union[List[float], OrderedDict[int, List[float]]]:
+        """
+        Get the loss history keyed by global step.
+        :param step: If provided, returns the list
+                     of losses at that step,
+                     otherwise the whole dictionary.
+                     If step=-1, returns list of
+                     losses at last step.
+        """
+        step = self._get_correct_step(step)
+        if step is not None:
+            return self.step_loss_hist[step]
+        return self.step_loss_hist
+
+    def get_step_eval_metrics(
+        self, eval_criterion: Optional[str] = None, step: Optional[int] = None
+    ) -> Union[float, OrderedDict[Union[str, int], Union[float, OrderedDict[int, float]]]]:
+        """
+        Get the evaluation metrics history keyed by global step.
+        - If both params are provided, the value at that step
+          is returned.
+        - If only `eval_criterion` is provided, a dictionary
+          of values at each step is returned.
+        - If only `step` is provided, a dictionary of values
+          for each criterion at that step is returned.
+        If `step=-1`, returns values at last step.
+        """
+        step = self._get_correct_step(step)
+        if eval_criterion is not None:
+            if step is not None:  # Both params provided
+                return self.step_eval_metrics_hist[eval_criterion][step]
+            return self.step_eval_metrics_hist[eval_criterion]
+        elif step is not None:
+            return OrderedDict(
+                {
+                    eval_criterion: self.step_eval_metrics_hist[eval_criterion][step]
+                    for eval_criterion in self.eval_criteria
+                }
+            )
+        return self.step_eval_metrics_hist
+
+    def log_step_metrics(self, step: Optional[int] = -1) -> str:
+        """
+        Log loss and evaluation metrics for a
+        given global step in the following format:
+        "VAL   Step: 500  Average loss: 0.5, ACCURACY: 0.8, PRECISION: 0.7"
+        """
+        step = self._get_correct_step(step)
+        dataset_type = "TRAIN" if self.is_train else "VAL  "
+        mean_loss_step = np.mean(self.get_step_losses(step))
+        result_str = f"\n\033[1m{dataset_type} Step: {step}\tAverage loss: {mean_loss_step:.4f}, "
+        result_str += ", ".join(
+            [
+                f"{eval_criterion}: {self.get_step_eval_metrics(eval_criterion, step):.4f}"
+                for eval_criterion in self.eval_criteria
+            ]
+        )
+        result_str += "\033[0m\n"
+        logging.info(result_str)
+        return result_str
+
+    def add_and_log_step_metrics(self, step: int, losses: List[float], eval_metrics: Dict[str, float]) -> str:
+        """
+        Shorthand function to add losses
+        and eval metrics at a given global
+        step, and then print the results
+        for that step.
+        """
+        self.add_step_metrics(step, losses, eval_metrics)
+        return self.log_step_metrics(step)
+
+    def set_best_step(self, best_step: int) -> None:
+        """
+        Add the `best_step` attribute to validation
+        logger if the best model so far was found
+        in the middle of an epoch.
+        """
+        if self.is_train:
+            raise ValueError("Best step can only be stored into validation logger.")
+        if best_step not in self.steps:
+            raise ValueError(f"Best step provided ({best_step}) must be one of {self.steps}.")
+        self.best_step = best_step
+
+    @property
+    def steps(self) -> List[int]:
+        """
+        Returns the list of global steps for which history is stored.
+        """
+        return list(self.step_loss_hist.keys())
+
+    def _get_correct_step(self, step: Optional[int]) -> Optional[int]:
+        """
+        If `step=-1`, returns the last step for
+        which history is currently stored, otherwise
+        the step itself.
+        """
+        if step == -1:
+            return max(self.steps) if len(self.steps) else 0
+        return step
+
     def get_eval_metrics_df(self, epoch: Optional[int] = None) -> pd.DataFrame:
         """
         Get a DataFrame object of all eval metrics
@@ -909,6 +1596,1006 @@ class ModelTracker:
         return epoch + 1
 
 
+class PredictionBuffer:
+    """
+    Preallocated contiguous buffer for storing the
+    batch-wise predictions over a whole dataset.
+
+    The buffer is allocated on CPU (with `num_examples` rows) from
+    the shape and dtype of the first batch added to it, and each
+    batch is then copied into its rows directly. This avoids storing
+    one tensor per batch (or per row) and stacking them at the end.
+
+    If `file_path` is provided, the buffer is backed by a memory-mapped
+    `.npy` file, so that predictions larger than the available
+    memory can be stored in a single on-disk array, which can later
+    be loaded with `np.load(file_path, mmap_mode="r")`.
+    """
+
+    def __init__(self, num_examples: int, file_path: Optional[str] = None):
+        """
+        :param num_examples: Max number of rows in the buffer
+        :param file_path: Path to the `.npy` file backing the buffer
+        """
+        self.num_examples = num_examples
+        self.file_path = file_path
+        self.buffer: Optional[torch.Tensor] = None
+        self.num_filled = 0
+
+    def add(self, batch: torch.Tensor) -> None:
+        """
+        Copy a batch into the next rows of the buffer.
+        """
+        batch = batch.detach()
+        if self.buffer is None:
+            self._allocate(batch.shape[1:], batch.dtype)
+
+        start, end = self.num_filled, self.num_filled + len(batch)
+        if end > self.num_examples:
+            raise ValueError(
+                f"Cannot store more than {self.num_examples} predictions in the buffer "
+                f"(got {end}). Make sure that the dataloader doesn't sample more "
+                f"examples than the size of its dataset."
+            )
+        self.buffer[start:end].copy_(batch)
+        self.num_filled = end
+
+    def get(self) -> torch.Tensor:
+        """
+        Return the filled part of the buffer
+        (flushing it to disk if memory-mapped).
+        """
+        if self.buffer is None:
+            return torch.empty(0)
+        if self.file_path is not None:
+            self._memmap.flush()
+        return self.buffer[: self.num_filled]
+
+    def _allocate(self, shape: torch.Size, dtype: torch.dtype) -> None:
+        """
+        Allocate the buffer (in memory or on disk)
+        for rows of the given `shape` and `dtype`.
+        """
+        full_shape = (self.num_examples, *shape)
+        if self.file_path is None:
+            self.buffer = torch.empty(full_shape, dtype=dtype)
+        else:
+            logging.info(f"Allocating memory-mapped prediction buffer '{self.file_path}'...")
+            np_dtype = torch.empty(0, dtype=dtype).numpy().dtype
+            self._memmap = np.lib.format.open_memmap(self.file_path, mode="w+", dtype=np_dtype, shape=full_shape)
+            self.buffer = torch.from_numpy(self._memmap)
+            logging.info("Done.")
+
+
+class ShardedPredictionWriter:
+    """
+    Writer for streaming predictions to rotating on-disk
+    shards from a background thread.
+
+    Chunks of predictions (e.g. those yielded by
+    `train_utils.iterate_predictions()`) are handed over to
+    a background thread through a bounded queue, and are written
+    to a new shard file every `rows_per_shard` rows. Writing hence
+    overlaps with computing the next predictions, while the memory
+    used remains bounded by the queue and shard sizes.
+
+    Each shard file is first written to a temporary file and then
+    renamed, so that only complete shards are ever visible.
+
+    E.g.:
+        >>> with ShardedPredictionWriter("predictions", file_format="csv") as writer:
+        >>>     for chunk in iterate_predictions(model, dataloader, "cpu"):
+        >>>         writer.write(*chunk)
+        >>> writer.shard_files
+        ["predictions/predictions-00000.csv", ...]
+    """
+
+    SUPPORTED_FORMATS = ["npy", "csv", "pickle"]
+
+    def __init__(
+        self,
+        output_dir: str,
+        file_format: Optional[str] = "npy",
+        rows_per_shard: Optional[int] = 1000000,
+        max_queue_size: Optional[int] = 8,
+        file_prefix: Optional[str] = "predictions",
+    ):
+        """
+        :param output_dir: Directory to write the shards into
+        :param file_format: Format of the shards.
+                            Choices = "npy" | "csv" | "pickle"
+                            For "npy", a separate file is written
+                            for each field in every shard, e.g.
+                            `predictions-00000-outputs.npy`.
+        :param rows_per_shard: Number of rows in each shard
+        :param max_queue_size: Max number of chunks waiting to be
+                               written before `write()` blocks
+        :param file_prefix: Prefix of the shard file names
+        """
+        if file_format not in self.SUPPORTED_FORMATS:
+            raise ValueError(f"Param 'file_format' ('{file_format}') must be one of {self.SUPPORTED_FORMATS}.")
+        assert rows_per_shard > 0 and max_queue_size > 0
+
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.rows_per_shard = rows_per_shard
+        self.file_prefix = file_prefix
+        self.shard_files: List[str] = []
+        make_dirs(output_dir)
+
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name="ShardedPredictionWriter", daemon=True)
+        self._thread.start()
+
+    def __enter__(self) -> ShardedPredictionWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def write(
+        self,
+        batch_indices: _TensorOrArray,
+        outputs: _TensorOrArray,
+        preds: Optional[_TensorOrArray] = None,
+        probs: Optional[_TensorOrArray] = None,
+    ) -> None:
+        """
+        Queue a chunk of predictions to be written.
+        Blocks if too many chunks are already waiting.
+        """
+        self._raise_if_failed()
+        assert not self._closed, "Cannot write to a closed writer."
+        chunk = OrderedDict()
+        for name, values in zip(["indices", "outputs", "preds", "probs"], [batch_indices, outputs, preds, probs]):
+            if values is not None:
+                chunk[name] = convert_tensor_to_numpy(values) if torch.is_tensor(values) else np.asarray(values)
+        self._queue.put(chunk)
+
+    def close(self) -> List[str]:
+        """
+        Write all remaining predictions, wait for
+        the background thread to finish, and return
+        the list of all shard files written.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_if_failed()
+        return self.shard_files
+
+    def _raise_if_failed(self) -> None:
+        """
+        Re-raise any exception raised in
+        the background thread.
+        """
+        if self._error is not None:
+            raise RuntimeError("Writing predictions failed in the background thread.") from self._error
+
+    def _run(self) -> None:
+        """
+        Main loop of the background thread: gather chunks
+        and write them out in shards of `rows_per_shard` rows.
+        """
+        chunks, num_rows = [], 0
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    break
+                chunks.append(chunk)
+                num_rows += len(chunk["indices"])
+
+                # Write out as many full shards as available
+                while num_rows >= self.rows_per_shard:
+                    arrays = self._concatenate(chunks)
+                    self._write_shard(OrderedDict((k, v[: self.rows_per_shard]) for k, v in arrays.items()))
+                    chunks = [OrderedDict((k, v[self.rows_per_shard :]) for k, v in arrays.items())]
+                    num_rows -= self.rows_per_shard
+
+            # Write out the last (partial) shard
+            if num_rows:
+                self._write_shard(self._concatenate(chunks))
+        except BaseException as e:
+            self._error = e
+            # Keep consuming so that producers don't block forever
+            while chunk is not None:
+                chunk = self._queue.get()
+
+    def _concatenate(self, chunks: List[OrderedDict[str, np.ndarray]]) -> OrderedDict[str, np.ndarray]:
+        """
+        Concatenate the arrays of all chunks field-wise.
+        """
+        return OrderedDict((k, np.concatenate([chunk[k] for chunk in chunks], axis=0)) for k in chunks[0])
+
+    def _write_shard(self, arrays: OrderedDict[str, np.ndarray]) -> None:
+        """
+        Write one shard atomically in the required format.
+        """
+        shard_name = f"{self.file_prefix}-{len(self.shard_files):05d}"
+
+        def write_atomically(file_name: str, write_fn: Callable[[str], None]) -> None:
+            file_path = get_file_path(self.output_dir, file_name)
+            temp_file_path = f"{file_path}.tmp"
+            write_fn(temp_file_path)
+            os.replace(temp_file_path, file_path)
+            self.shard_files.append(file_path)
+
+        def save_npy(array: np.ndarray) -> Callable[[str], None]:
+            def write_fn(file_path: str) -> None:
+                with open(file_path, "wb") as f_out:
+                    np.save(f_out, array)
+
+            return write_fn
+
+        if self.file_format == "npy":
+            for name, array in arrays.items():
+                write_atomically(f"{shard_name}-{name}.npy", save_npy(array))
+        elif self.file_format == "csv":
+            columns = OrderedDict()
+            for name, array in arrays.items():
+                array = array.reshape(len(array), -1)
+                if array.shape[1] == 1:
+                    columns[name] = array[:, 0]
+                else:
+                    for j in range(array.shape[1]):
+                        columns[f"{name}_{j}"] = array[:, j]
+            data = pd.DataFrame(columns)
+            write_atomically(f"{shard_name}.csv", lambda file_path: data.to_csv(file_path, index=False))
+        else:
+            write_atomically(f"{shard_name}.pkl", lambda file_path: save_pickle(dict(arrays), file_path))
+
+
+def snapshot_to_cpu(obj: Any) -> Any:
+    """
+    Take a snapshot of a (nested) object, e.g. a checkpoint
+    dict, which is independent of the original one:
+      - tensors are copied to CPU memory
+      - dicts, lists and tuples are snapshotted recursively
+        (retaining the metadata of state dicts)
+      - models are deep-copied to CPU
+      - all other objects are deep-copied
+    Useful to write out an object in the background
+    while the original one continues to be modified.
+    """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, nn.Module):
+        return send_model_to_device(deepcopy(obj), "cpu")
+    if isinstance(obj, dict):
+        snapshot = obj.__class__((k, snapshot_to_cpu(v)) for k, v in obj.items())
+        if hasattr(obj, "_metadata"):  # Metadata of state dicts
+            snapshot._metadata = deepcopy(obj._metadata)
+        return snapshot
+    if isinstance(obj, (list, tuple)) and not hasattr(obj, "_fields"):
+        return obj.__class__(snapshot_to_cpu(v) for v in obj)
+    return deepcopy(obj)
+
+
+def copy_model_with_state_dict(model: nn.Module, state_dict: OrderedDict[str, torch.Tensor]) -> nn.Module:
+    """
+    Deep copy a model, but with its parameters and buffers
+    set to the tensors in `state_dict` (which are used as
+    is, not copied) instead of copying its current ones.
+    Useful to build a model from a snapshot of its weights,
+    e.g. one taken with `snapshot_to_cpu()`, without
+    temporarily holding its current weights twice.
+    The copy is on the device of the tensors in `state_dict`.
+    """
+    memo = {}
+    for name, param in model.named_parameters():
+        if name in state_dict:
+            memo[id(param)] = nn.Parameter(state_dict[name], requires_grad=param.requires_grad)
+    for name, buffer in model.named_buffers():
+        if name in state_dict:
+            memo[id(buffer)] = state_dict[name]
+    return deepcopy(model, memo)
+
+
+class AsyncCheckpointWriter:
+    """
+    Writer for saving (and removing) checkpoints
+    from a background thread.
+
+    Saving a checkpoint only takes a snapshot of it in CPU memory
+    (see `snapshot_to_cpu()`) and returns immediately, while the
+    snapshot is written to disk in the background, so training
+    is not stalled by the disk write.
+    At most `max_inflight` snapshots are held in memory at a time,
+    and saving blocks until one of them is written otherwise.
+
+    Each checkpoint is first written to a temporary file and then
+    renamed, so that only complete checkpoints are ever visible.
+    All operations are performed in the order they are requested,
+    e.g. a checkpoint can be removed right after saving a new one.
+
+    E.g.:
+        >>> writer = AsyncCheckpointWriter(torch.save)
+        >>> writer.save("checkpoint-1.pt", lambda: {"model": model.state_dict()})
+        >>> writer.remove("checkpoint-0.pt")
+        >>> writer.close()  # Wait for all writes to finish
+    """
+
+    def __init__(self, save_fn: Callable[[Any, str], None], max_inflight: Optional[int] = 2):
+        """
+        :param save_fn: Function to save an object to a file path,
+                        e.g. `torch.save`
+        :param max_inflight: Max number of snapshots held in memory
+                             waiting to be written
+        """
+        assert max_inflight > 0
+        self.save_fn = save_fn
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._queue: queue.Queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="AsyncCheckpointWriter", daemon=True)
+        self._thread.start()
+
+    def save(self, file_path: str, get_obj: Callable[[], Any]) -> None:
+        """
+        Snapshot the object returned by `get_obj()` to
+        CPU memory and queue it to be saved to `file_path`.
+        The object is only created once a slot for holding
+        it is available, so that memory remains bounded.
+        """
+        self._raise_if_failed()
+        assert not self._closed, "Cannot save with a closed writer."
+        self._slots.acquire()  # Blocks if `max_inflight` snapshots are already waiting
+        try:
+            snapshot = snapshot_to_cpu(get_obj())
+        except BaseException:
+            self._slots.release()
+            raise
+        self._queue.put(("save", file_path, snapshot))
+
+    def remove(self, file_path: str) -> None:
+        """
+        Queue a file to be removed (if it exists)
+        after all previously queued operations.
+        """
+        self._raise_if_failed()
+        assert not self._closed, "Cannot remove with a closed writer."
+        self._queue.put(("remove", file_path, None))
+
+    def flush(self) -> None:
+        """
+        Wait for all queued operations to finish.
+        """
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        """
+        Wait for all queued operations to finish
+        and stop the background thread.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_if_failed()
+
+    def _raise_if_failed(self) -> None:
+        """
+        Re-raise any exception raised in
+        the background thread.
+        """
+        if self._error is not None:
+            raise RuntimeError("Writing checkpoint failed in the background thread.") from self._error
+
+    def _run(self) -> None:
+        """
+        Main loop of the background thread.
+        After a failure, remaining operations are
+        skipped (but still consumed) to not block.
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    break
+                operation, file_path, snapshot = item
+                if self._error is not None:
+                    continue
+                if operation == "save":
+                    temp_file_path = f"{file_path}.tmp"
+                    self.save_fn(snapshot, temp_file_path)
+                    os.replace(temp_file_path, file_path)
+                else:
+                    remove_object(file_path)
+            except BaseException as e:
+                self._error = e
+            finally:
+                if item is not None and item[0] == "save":
+                    self._slots.release()
+                self._queue.task_done()
+
+
+class BatchPrefetcher:
+    """
+    Iterator over batches that prepares upcoming batches
+    on a background thread.
+
+    Each batch from `iterable` (e.g. a `DataLoader`) is passed
+    through `prepare_fn` (e.g. decoupling it and sending it to
+    the device) on a background thread, up to `depth` batches
+    ahead of the consumer, so that loading and transferring
+    the next batches overlaps with the computation on the
+    current one. Tuples of `(batch, prepare_fn(batch))` are
+    yielded in the original order.
+
+    If `device` is a GPU, `prepare_fn` is run on a separate
+    CUDA stream, and the consumer's stream waits for it
+    only once the batch is actually used.
+    If `depth=0`, batches are prepared synchronously
+    on the calling thread instead.
+
+    Note that loading batches on the background thread draws
+    from the same global RNGs as the calling thread, so that
+    random data augmentations in the main process aren't
+    reproducible in exact detail. Use dataloader workers
+    (which have their own RNGs) if that's required.
+
+    E.g.:
+        >>> with BatchPrefetcher(dataloader, lambda b: send_batch_to_device(b, "cuda"), 2, "cuda") as batches:
+        >>>     for batch, cuda_batch in batches:
+        >>>         outputs = model(cuda_batch)
+    """
+
+    _END = object()
+
+    def __init__(
+        self,
+        iterable: Iterable,
+        prepare_fn: Callable[[Any], Any],
+        depth: Optional[int] = 2,
+        device: Optional[_Device] = None,
+    ):
+        """
+        :param iterable: Iterable over the (raw) batches
+        :param prepare_fn: Function to prepare a batch for use
+        :param depth: Max number of prepared batches waiting
+                      to be consumed. If 0, no prefetching
+                      is performed.
+        :param device: Device that `prepare_fn` sends the batch to
+        """
+        assert depth >= 0, "Param 'depth' must be non-negative."
+        self.iterable = iterable
+        self.prepare_fn = prepare_fn
+        self.depth = depth
+        self._stream = None
+        if device is not None and torch.device(device).type == "cuda" and torch.cuda.is_available():
+            self._stream = torch.cuda.Stream(device=device)
+        self._stop = threading.Event()
+        self._thread = None
+        if depth > 0:
+            self._queue: queue.Queue = queue.Queue(maxsize=depth)
+            self._thread = threading.Thread(target=self._run, name="BatchPrefetcher", daemon=True)
+            self._thread.start()
+
+    def __enter__(self) -> BatchPrefetcher:
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Tuple[Any, Any]]:
+        if self._thread is None:  # Prepare synchronously
+            for batch in self.iterable:
+                yield batch, self.prepare_fn(batch)
+            return
+
+        while True:
+            item = self._queue.get()
+            if item is self._END:
+                return
+            batch, prepared, event, error = item
+            if error is not None:
+                raise RuntimeError("Preparing batch failed in the background thread.") from error
+            if event is not None:
+                torch.cuda.current_stream(self._stream.device).wait_event(event)
+                self._record_stream(prepared, torch.cuda.current_stream(self._stream.device))
+            yield batch, prepared
+
+    def close(self) -> None:
+        """
+        Stop preparing batches and wait
+        for the background thread to finish.
+        Batches already prepared are discarded.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        while self._thread.is_alive():
+            try:  # Unblock the background thread if the queue is full
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._thread.join()
+        self._thread = None
+
+    def _record_stream(self, batch: _Batch, stream) -> None:
+        """
+        Mark all tensors in the batch as used by the given
+        stream, so that their memory isn't reused before the
+        stream is done with them.
+        """
+        leaves, _ = flatten_batch(batch)
+        for leaf in leaves:
+            if torch.is_tensor(leaf) and leaf.is_cuda:
+                leaf.record_stream(stream)
+
+    def _put(self, item: Any) -> bool:
+        """
+        Put an item in the queue unless stopped.
+        Returns whether the item was put.
+        """
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self) -> None:
+        """
+        Main loop of the background thread.
+        """
+        try:
+            for batch in self.iterable:
+                if self._stop.is_set():
+                    return
+                event = None
+                if self._stream is None:
+                    prepared = self.prepare_fn(batch)
+                else:
+                    with torch.cuda.stream(self._stream):
+                        prepared = self.prepare_fn(batch)
+                    event = torch.cuda.Event()
+                    event.record(self._stream)
+                if not self._put((batch, prepared, event, None)):
+                    return
+        except BaseException as e:
+            self._put((None, None, None, e))
+        self._put(self._END)
+
+
+class StepTimer:
+    """
+    Timer for breaking down the wall-clock time of each
+    training step into its phases, so as to tell whether
+    training is data-bound, transfer-bound or compute-bound.
+
+    Phases are timed back to back: `lap(phase)` attributes
+    the time since the previous lap (or `start()`) to
+    `phase`. All durations of an epoch are then summarized
+    by `summarize()`, after which the timer is reset.
+
+    Phases recorded by `train_utils.perform_one_epoch()`:
+      - data: Waiting for the next batch from the dataloader
+              (and for it to be prepared if prefetching)
+      - transfer: Decoupling the batch and sending it to the
+                  device (only if not prefetching, since it's
+                  overlapped with computation otherwise)
+      - forward: Forward pass of the model
+      - loss: Computing the loss
+      - backward: Backward pass
+      - clip: Gradient clipping
+      - optimizer: Optimizer (and per-step scheduler) step
+      - callbacks: Callbacks at the end of each optimizer step,
+                   e.g. evaluating and checkpointing in the
+                   middle of an epoch
+      - other: Everything else, e.g. updating eval
+               metrics, logging and other callbacks
+
+    If `device` is a GPU, it's synchronized at every lap so
+    that asynchronously launched kernels are attributed to
+    the phase that launched them. This adds some overhead,
+    which is why timing steps is opt-in.
+
+    E.g.:
+        >>> timer = StepTimer()
+        >>> timer.start()
+        >>> for batch in dataloader:
+        >>>     timer.lap("data")
+        >>>     outputs = model(batch)
+        >>>     timer.lap("forward")
+        >>> timer.summarize()
+    """
+
+    PHASES = ["data", "transfer", "forward", "loss", "backward", "clip", "optimizer", "callbacks", "other"]
+    PERCENTILES = [50, 90, 99]
+
+    def __init__(self, device: Optional[_Device] = None):
+        """
+        :param device: Device on which the steps are run
+        """
+        self.device = None
+        if device is not None and torch.device(device).type == "cuda":
+            self.device = torch.device(device)
+        self.durations: Dict[str, List[float]] = {phase: [] for phase in self.PHASES}
+        self._last_time: Optional[float] = None
+
+    def start(self) -> None:
+        """
+        Start timing from now on.
+        """
+        self._synchronize()
+        self._last_time = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """
+        Attribute the time since the previous
+        lap (or start) to the given `phase`.
+        """
+        self._synchronize()
+        current_time = time.perf_counter()
+        self.durations[phase].append(current_time - self._last_time)
+        self._last_time = current_time
+
+    def summarize(self) -> OrderedDict[str, Dict[str, float]]:
+        """
+        Summarize the durations (in seconds) of each phase timed at
+        least once since the last summary into their "mean", percentiles
+        (e.g. "p90"), "total", and "fraction" of the total time of all
+        phases, and reset the timer.
+        """
+        total_time = sum(sum(durations) for durations in self.durations.values())
+        summary = OrderedDict()
+        for phase, durations in self.durations.items():
+            if not len(durations):
+                continue
+            phase_summary = {"mean": float(np.mean(durations))}
+            for percentile, value in zip(self.PERCENTILES, np.percentile(durations, self.PERCENTILES)):
+                phase_summary[f"p{percentile}"] = float(value)
+            phase_summary["total"] = float(np.sum(durations))
+            phase_summary["fraction"] = phase_summary["total"] / total_time if total_time > 0 else 0.0
+            summary[phase] = phase_summary
+        self.durations = {phase: [] for phase in self.PHASES}
+        self._last_time = None
+        return summary
+
+    def _synchronize(self) -> None:
+        """
+        Wait for all kernels on the GPU (if any) to finish.
+        """
+        if self.device is not None:
+            torch.cuda.synchronize(self.device)
+
+
+def get_peak_rss() -> int:
+    """
+    Get the peak resident set size (in bytes) of the process
+    since it was last reset (see `reset_peak_rss()`) on
+    Linux, or since the process started otherwise.
+    """
+    proc_status = _read_proc_file("/proc/self/status", ["VmHWM"])
+    if "VmHWM" in proc_status:
+        return proc_status["VmHWM"]
+    import resource  # Not available on Windows
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else 1024 * max_rss  # Bytes on macOS, kB otherwise
+
+
+def reset_peak_rss() -> bool:
+    """
+    Reset the peak resident set size of the process to the
+    current one (only possible on Linux), and return
+    whether it was reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        return False
+    return True
+
+
+def get_available_memory() -> Optional[int]:
+    """
+    Get the memory (in bytes) available for starting new
+    applications without swapping, as estimated by the kernel
+    (only available on Linux, otherwise None is returned).
+    """
+    return _read_proc_file("/proc/meminfo", ["MemAvailable"]).get("MemAvailable")
+
+
+def _read_proc_file(file_path: str, keys: List[str]) -> Dict[str, int]:
+    """
+    Read the given memory sizes (in bytes) from a file
+    in `/proc` with lines like "VmRSS:  1024 kB", e.g.
+    `/proc/self/status` (only available on Linux).
+    """
+    values = {}
+    try:
+        with open(file_path) as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in keys:
+                    values[key] = 1024 * int(value.split()[0])  # Reported in kB
+    except OSError:
+        pass
+    return values
+
+
+class MemoryTracker:
+    """
+    Tracker of the memory usage of each phase
+    (e.g. a training / evaluation / testing epoch).
+
+    For each phase (from `start()` to `stop()`), tracks
+    (all in bytes):
+      - peak_rss: Peak resident set size of the process.
+                  On Linux, the peak is reset at the start of
+                  each phase if possible. Otherwise, it's the
+                  peak since the process started.
+      - rss_growth: Growth of the resident set size
+      - heap_growth: Growth of the memory allocated by Python
+                     (traced with `tracemalloc`, which is started
+                     if it isn't already tracing, and slows
+                     down Python allocations somewhat)
+      - held_bytes: Bytes held in the results of the phase as
+                    reported to `stop()`, e.g. the stored outputs
+                    and targets (see `get_object_size()`)
+      - peak_device, device_growth: Peak and growth of the memory
+                                    allocated on the GPU (if used)
+
+    If `sample_every_n_batches` is set, the RSS, Python heap and
+    device memory are also sampled every so many batches of each
+    phase (see `sample()`), which helps finding memory leaks.
+
+    All phases stopped since the last summary are summarized
+    by `summarize()`, after which the tracker is reset.
+    Call `close()` at the end to stop tracing Python allocations.
+    """
+
+    def __init__(self, device: Optional[_Device] = None, sample_every_n_batches: Optional[int] = None):
+        """
+        :param device: Device on which the phases are run
+        :param sample_every_n_batches: Number of batches after which
+                                       to sample the memory usage.
+                                       If None, no samples are taken.
+        """
+        assert sample_every_n_batches is None or sample_every_n_batches >= 1
+        self.device = None
+        if device is not None and torch.device(device).type == "cuda":
+            self.device = torch.device(device)
+        self.sample_every_n_batches = sample_every_n_batches
+        self.summary: OrderedDict[str, _StringDict] = OrderedDict()
+        self._phase: Optional[str] = None
+        self._start_usage: Optional[Dict[str, int]] = None
+        self._samples: List[Dict[str, int]] = []
+        self._started_tracing = False
+
+    def start(self, phase: str) -> None:
+        """
+        Start tracking the given `phase`.
+        """
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        reset_peak_rss()
+        if self.device is not None:
+            torch.cuda.reset_peak_memory_stats(self.device)
+        self._phase = phase
+        self._samples = []
+        self._start_usage = self._get_usage()
+
+    def sample(self, batch: int) -> None:
+        """
+        Sample the current memory usage after the given `batch`.
+        """
+        self._samples.append({"batch": batch, **self._get_usage()})
+
+    def stop(self, held_bytes: Optional[int] = 0) -> _StringDict:
+        """
+        Stop tracking the current phase, and
+        return the summary of its memory usage.
+        :param held_bytes: Bytes held in the results of the phase
+        """
+        usage = self._get_usage()
+        summary = {
+            "peak_rss": get_peak_rss(),
+            "rss_growth": usage["rss"] - self._start_usage["rss"],
+            "heap_growth": usage["heap"] - self._start_usage["heap"],
+            "held_bytes": held_bytes,
+        }
+        if self.device is not None:
+            summary["peak_device"] = torch.cuda.max_memory_allocated(self.device)
+            summary["device_growth"] = usage["device"] - self._start_usage["device"]
+        if self.sample_every_n_batches is not None:
+            summary["samples"] = self._samples
+        self.summary[self._phase] = summary
+        self._phase, self._start_usage, self._samples = None, None, []
+        return summary
+
+    def summarize(self) -> OrderedDict[str, _StringDict]:
+        """
+        Get the summaries of all phases stopped since
+        the last summary (keyed by phase), and reset them.
+        """
+        summary, self.summary = self.summary, OrderedDict()
+        return summary
+
+    def close(self) -> None:
+        """
+        Stop tracing Python allocations if
+        it was started by this tracker.
+        """
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _get_usage(self) -> Dict[str, int]:
+        """
+        Get the current RSS, Python heap
+        and device memory (if used).
+        """
+        rss = _read_proc_file("/proc/self/status", ["VmRSS"]).get("VmRSS", 0)
+        usage = {"rss": rss, "heap": tracemalloc.get_traced_memory()[0]}
+        if self.device is not None:
+            usage["device"] = torch.cuda.memory_allocated(self.device)
+        return usage
+
+
+class ThroughputMeter:
+    """
+    Meter of the throughput (samples and steps per second)
+    of an epoch, and of the estimated time remaining (ETA)
+    for the epoch and for the whole run.
+
+    The rates used for the progress logs and ETAs are smoothed
+    with an exponential moving average over the batches, so
+    that they follow changes in speed without being too noisy.
+    The summary of an epoch (see `summarize()`) is computed
+    over all of its batches instead.
+
+    If the meter is reused across epochs (with `start()` at
+    the start of each), the ETA of the run is estimated from
+    the average duration of the previous epochs, which includes
+    everything in between (e.g. evaluation), once available.
+    Anything run in the middle of an epoch that isn't part of
+    processing the batches (e.g. evaluation every few steps)
+    may be excluded from the throughput of the epoch with
+    `pause()` and `resume()`.
+
+    E.g.:
+        >>> meter = ThroughputMeter()
+        >>> meter.start(len(dataloader))
+        >>> for batch in dataloader:
+        >>>     train_step(batch)
+        >>>     meter.update(len(batch))
+        >>>     print(meter.samples_per_sec, meter.get_epoch_eta())
+        >>> meter.summarize()
+    """
+
+    def __init__(self, smoothing: Optional[float] = 0.1):
+        """
+        :param smoothing: Weight of the latest batch in the moving averages
+        """
+        assert 0.0 < smoothing <= 1.0, "Param 'smoothing' must be in (0, 1]."
+        self.smoothing = smoothing
+        self.remaining_epochs = 0  # Epochs after the current one (for the ETA of the run)
+        self._epoch_durations: List[float] = []
+        self._start_time: Optional[float] = None
+
+    def start(self, num_batches: int) -> None:
+        """
+        Start metering an epoch of `num_batches` batches.
+        """
+        current_time = time.perf_counter()
+        if self._start_time is not None:  # Duration of the previous epoch
+            self._epoch_durations.append(current_time - self._start_time)
+        self._start_time = self._last_time = current_time
+        self.num_batches, self.num_batches_complete = num_batches, 0
+        self.num_examples, self.num_steps = 0, 0
+        self._avg_duration = self._avg_examples = self._avg_steps = None
+        self._paused_time: Optional[float] = None
+        self._paused_duration = 0.0
+
+    def update(self, num_examples: int, num_steps: Optional[int] = 1) -> None:
+        """
+        Update the meter after a batch of `num_examples`
+        examples, in which `num_steps` (optimizer) steps
+        were taken.
+        """
+        current_time = time.perf_counter()
+        duration, self._last_time = current_time - self._last_time, current_time
+        self.num_batches_complete += 1
+        self.num_examples += num_examples
+        self.num_steps += num_steps
+        if self._avg_duration is None:
+            self._avg_duration, self._avg_examples, self._avg_steps = duration, num_examples, num_steps
+        else:
+            smooth = lambda avg, value: avg + self.smoothing * (value - avg)
+            self._avg_duration = smooth(self._avg_duration, duration)
+            self._avg_examples = smooth(self._avg_examples, num_examples)
+            self._avg_steps = smooth(self._avg_steps, num_steps)
+
+    def pause(self) -> None:
+        """
+        Pause metering, e.g. before evaluating in
+        the middle of an epoch (see `resume()`).
+        """
+        self._paused_time = time.perf_counter()
+
+    def resume(self) -> None:
+        """
+        Resume metering after `pause()`, such that the
+        time in between isn't counted towards the
+        next batch, nor the duration of the epoch.
+        """
+        paused_duration = time.perf_counter() - self._paused_time
+        self._last_time += paused_duration
+        self._paused_duration += paused_duration
+        self._paused_time = None
+
+    @property
+    def samples_per_sec(self) -> float:
+        """
+        Smoothed number of samples per second.
+        """
+        return self._avg_examples / self._avg_duration if self._avg_duration else 0.0
+
+    @property
+    def steps_per_sec(self) -> float:
+        """
+        Smoothed number of steps per second.
+        """
+        return self._avg_steps / self._avg_duration if self._avg_duration else 0.0
+
+    def get_epoch_eta(self) -> float:
+        """
+        Get the estimated number of seconds
+        remaining for the current epoch.
+        """
+        if self._avg_duration is None:
+            return float("nan")
+        return (self.num_batches - self.num_batches_complete) * self._avg_duration
+
+    def get_run_eta(self) -> float:
+        """
+        Get the estimated number of seconds remaining for the
+        current epoch and the `remaining_epochs` after it.
+        """
+        if len(self._epoch_durations):
+            epoch_duration = np.mean(self._epoch_durations)
+        else:  # Only the current epoch to estimate from
+            epoch_duration = self.num_batches * (self._avg_duration if self._avg_duration is not None else np.nan)
+        return self.get_epoch_eta() + self.remaining_epochs * epoch_duration
+
+    def get_progress_str(self) -> str:
+        """
+        Format the throughput and the ETAs for progress logs, e.g.:
+        "120.5 samples/s, 3.8 steps/s, ETA: 1m 02s 000ms (epoch), 10m 21s 000ms (run)"
+        """
+        get_eta_str = lambda eta: human_time_interval(round(eta)) if np.isfinite(eta) else "N/A"
+        eta_str = f"ETA: {get_eta_str(self.get_epoch_eta())} (epoch)"
+        if self.remaining_epochs > 0:
+            eta_str += f", {get_eta_str(self.get_run_eta())} (run)"
+        return f"{self.samples_per_sec:.1f} samples/s, {self.steps_per_sec:.2f} steps/s, {eta_str}"
+
+    def summarize(self) -> Dict[str, float]:
+        """
+        Get the average "samples_per_sec" and
+        "steps_per_sec" over the current epoch,
+        and its duration ("time") so far (excluding
+        the time paused).
+        """
+        elapsed_time = self._last_time - self._start_time - self._paused_duration
+        return {
+            "samples_per_sec": self.num_examples / elapsed_time if elapsed_time > 0 else 0.0,
+            "steps_per_sec": self.num_steps / elapsed_time if elapsed_time > 0 else 0.0,
+            "time": elapsed_time,
+        }
+
+
 class SequencePooler(nn.Module):
     """
     Pool the sequence output for transformer-based models.
@@ -69,6 +69,7 @@ class TestConfig(unittest.TestCase):
         self._test_config_error({"model_type": "classification", "classification_type": "dummy"})
         for classification_type in ["binary", "multiclass", "multilabel"]:
             self._test_config_error({"model_type": "regression", "classification_type": classification_type})
+        self._test_config_error({"profiler": {"active": 1, "dummy_param": True}})
 
         # Test that FocalLoss only compatible with binary classification
         self._load_config(
@@ -89,7 +90,13 @@ class TestConfig(unittest.TestCase):
         """
         # Test incompatible settings
         self._test_config_error({"device": "cpu", "device_ids": [0, 1]})
-        self.assertEqual(self._load_config({"device": "cpu"}).n_gpu, 0)
+        self._test_config_error(
+            {"device": "cpu", "distributed": True, "distributed_backend": "dummy_backend"}, error=ValueError
+        )
+        self._test_config_error({"device": "cpu", "shard_optimizer_state": True})
+        config = self._load_config({"device": "cpu"})
+        self.assertEqual(config.n_gpu, 0)
+        self.assertEqual((config.rank, config.world_size), (0, 1))
 
     def test_check_and_set_devices_on_gpu(self):
         """
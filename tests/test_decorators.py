@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from pytorch_common import TIMING_REGISTRY, TimingRegistry, timing, timing_with_param, utils
+
+
+class TestDecorators(unittest.TestCase):
+    def setUp(self):
+        """
+        Discard timings recorded by other tests.
+        """
+        TIMING_REGISTRY.reset()
+
+    def test_timing(self):
+        """
+        Test that timed functions return their results,
+        and record their durations in the registry.
+        """
+
+        @timing
+        def add(a, b):
+            return a + b
+
+        @timing_with_param("b")
+        def subtract(a, b):
+            return a - b
+
+        @timing(log=False, sample_rate=0.5)
+        def multiply(a, b):
+            return a * b
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(subtract(3, b=2), 1)
+        for _ in range(1000):
+            self.assertEqual(multiply(2, 3), 6)
+
+        snapshot = TIMING_REGISTRY.snapshot()
+        get_name = lambda func: f"{__name__}.{func.__qualname__}"
+        self.assertEqual(snapshot[get_name(add)]["count"], 1)
+        self.assertEqual(snapshot[get_name(subtract)]["count"], 1)
+        self.assertTrue(300 < snapshot[get_name(multiply)]["count"] < 700)  # Only about half are sampled
+
+        with self.assertRaises(AssertionError):
+            timing(sample_rate=0.0)
+
+    def test_timing_registry(self):
+        """
+        Test the summary statistics of the
+        recorded durations, and dumping them.
+        """
+        registry = TimingRegistry()
+        for duration_ns in range(1, 1001):
+            registry.record("dummy", 1000 * duration_ns)
+
+        snapshot = registry.snapshot("dummy")["dummy"]
+        self.assertEqual(snapshot["count"], 1000)
+        self.assertAlmostEqual(snapshot["mean"], 500.5e-6)
+        self.assertAlmostEqual(snapshot["total"], 0.5005)
+        self.assertAlmostEqual(snapshot["min"], 1e-6)
+        self.assertAlmostEqual(snapshot["max"], 1e-3)
+        for percentile in TimingRegistry.PERCENTILES:  # Accurate to within a bucket
+            self.assertAlmostEqual(snapshot[f"p{percentile}"] / (percentile * 1e-5), 1.0, delta=0.1)
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file_path = os.path.join(temp_dir, "timings.yaml")
+            self.assertEqual(registry.dump(file_path), registry.snapshot())
+            self.assertEqual(utils.load_yaml(file_path), registry.snapshot())
+
+        registry.reset()
+        self.assertEqual(registry.snapshot(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,274 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.optim import SGD, Adam
+from torch.utils.data import DataLoader
+
+from pytorch_common import distributed, train_utils, utils
+from pytorch_common.additional_configs import BaseDatasetConfig, BaseModelConfig
+from pytorch_common.config import load_pytorch_common_config
+from pytorch_common.datasets import create_dataset
+from pytorch_common.metrics import get_loss_eval_criteria
+from pytorch_common.models import create_model
+from pytorch_common.types import Callable, Dict, Optional
+
+WORLD_SIZE = 2
+BATCH_SIZE_PER_PROCESS = 2
+ARTIFACT_DIR = "dummy_distributed_artifact_dir"
+
+
+class TestDistributed(unittest.TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Delete data directory created during config initialization.
+        """
+        utils.remove_dir(ARTIFACT_DIR, force=True)
+
+    def test_not_distributed(self):
+        """
+        Test that all distributed utilities
+        fall back to a single process.
+        """
+        self.assertFalse(distributed.is_distributed())
+        self.assertEqual(distributed.get_rank(), 0)
+        self.assertEqual(distributed.get_world_size(), 1)
+        self.assertTrue(distributed.is_main_process())
+
+        dataloader = DataLoader(list(range(10)), batch_size=2)
+        self.assertIs(distributed.get_distributed_dataloader(dataloader), dataloader)
+
+    def test_distributed_eval_sampler(self):
+        """
+        Test that the evaluation sampler splits
+        a dataset into disjoint shards without
+        padding them.
+        """
+        dataset = list(range(15))
+        all_indices = []
+        for rank in range(WORLD_SIZE):
+            sampler = distributed.DistributedEvalSampler(dataset, num_replicas=WORLD_SIZE, rank=rank)
+            indices = list(sampler)
+            self.assertEqual(len(indices), len(sampler))
+            all_indices.extend(indices)
+        self.assertEqual(sorted(all_indices), dataset)
+
+    def test_evaluate_epoch(self):
+        """
+        Test distributed evaluation with the
+        eval metrics reduced across processes.
+        """
+        self._spawn(_evaluate_epoch_distributed)
+
+    def test_train_model(self):
+        """
+        Test distributed training across multiple
+        CPU processes with the gloo backend, and
+        loading the whole model saved by it outside
+        of the process group.
+        """
+        self._spawn(_train_model_distributed)
+
+        config = _load_config()
+        checkpoint_file = utils.get_checkpoint_name("model", config.model_name, 1)
+        model = train_utils.load_model(None, config, checkpoint_file, checkpoint_type="model")["model"]
+        self.assertNotIsInstance(model, nn.parallel.DistributedDataParallel)
+        self.assertEqual(model.model_type, "classification")
+
+    def test_shard_optimizer_state(self):
+        """
+        Test distributed training with the optimizer
+        state sharded across processes.
+        """
+        self._spawn(_shard_optimizer_state_distributed)
+
+    def _spawn(self, fn: Callable[[int, int, str], None]) -> None:
+        """
+        Run `fn(rank, world_size, init_method)` in
+        `WORLD_SIZE` local processes, which must
+        initialize the process group with `init_method`.
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            init_method = f"file://{os.path.join(temp_dir, 'init_file')}"
+            mp.spawn(fn, args=(WORLD_SIZE, init_method), nprocs=WORLD_SIZE, join=True)
+
+
+def _load_config(dictionary: Optional[Dict] = None) -> Dict:
+    """
+    Load the default pytorch_common config
+    after overriding it with `dictionary`.
+    """
+    default_config_dict = {
+        "artifact_dir": ARTIFACT_DIR,
+        "device": "cpu",
+        "batch_size_per_gpu": BATCH_SIZE_PER_PROCESS,
+        "epochs": 1,
+    }
+    return load_pytorch_common_config({**default_config_dict, **(dictionary or {})})
+
+
+def _train_model_distributed(rank: int, world_size: int, init_method: str) -> None:
+    """
+    Train a model in one of the processes of distributed
+    training, and check that it's equivalent to training
+    the model in a single process with the global batch size.
+    Errors raised here fail the test (see `mp.spawn()`).
+    """
+    dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    try:
+        config = _load_config({"distributed": True})
+        assert (config.rank, config.world_size) == (rank, world_size)
+        assert config.train_batch_size == BATCH_SIZE_PER_PROCESS  # Per-process batch size
+
+        dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 16, "dim": 4, "num_classes": 2}))
+        train_loader = DataLoader(dataset, shuffle=False, batch_size=config.train_batch_size)
+        val_loader = DataLoader(dataset, shuffle=False, batch_size=config.eval_batch_size)
+        model = create_model("single_layer_classifier", BaseModelConfig({"in_dim": 4, "num_classes": 2}))
+        model_init = model.copy()
+
+        optimizer = SGD(model.parameters(), lr=1e-1)
+        loss_criterion_train, loss_criterion_test, eval_criteria = get_loss_eval_criteria(config, reduction="mean")
+        train_logger, val_logger = utils.get_model_performance_trackers(config)
+        return_dict = train_utils.train_model(
+            model,
+            config,
+            train_loader,
+            val_loader,
+            optimizer,
+            loss_criterion_train,
+            loss_criterion_test,
+            eval_criteria,
+            train_logger,
+            val_logger,
+        )
+        model = return_dict["model"]
+        assert isinstance(model, distributed.DistributedDataParallel)
+        assert model.model_type == "classification"  # Attributes of the model are accessible
+
+        # Each process only trains on its own share of the training set,
+        # and the losses of the batches of all processes are gathered
+        num_batches_per_process = len(dataset) // (world_size * BATCH_SIZE_PER_PROCESS)
+        assert len(distributed.get_distributed_dataloader(train_loader)) == num_batches_per_process
+        assert len(return_dict["train_logger"].get_losses(epoch=-1)) == world_size * num_batches_per_process
+
+        # Only the main process saves checkpoints
+        assert (return_dict["best_checkpoint_file"] != "") == (rank == 0)
+
+        # Model must be the same in all processes
+        params = torch.cat([param.detach().reshape(-1) for param in model.parameters()])
+        all_params = [torch.zeros_like(params) for _ in range(world_size)]
+        dist.all_gather(all_params, params)
+        for other_params in all_params[1:]:
+            assert torch.equal(all_params[0], other_params)
+
+        # Model must be the same as if trained with the global batch size in one process
+        if rank == 0:
+            train_utils.train_epoch(
+                model=model_init,
+                dataloader=DataLoader(dataset, shuffle=False, batch_size=world_size * BATCH_SIZE_PER_PROCESS),
+                device="cpu",
+                loss_criterion=loss_criterion_train,
+                epoch=1,
+                optimizer=SGD(model_init.parameters(), lr=1e-1),
+            )
+            for param, param_init in zip(model.module.parameters(), model_init.parameters()):
+                np.testing.assert_allclose(
+                    utils.convert_tensor_to_numpy(param), utils.convert_tensor_to_numpy(param_init), atol=1e-6
+                )
+    finally:
+        dist.destroy_process_group()
+
+
+def _shard_optimizer_state_distributed(rank: int, world_size: int, init_method: str) -> None:
+    """
+    Train a model in one of the processes with the optimizer state
+    sharded across them, and check that the checkpoint holds the entire
+    optimizer state, which is resharded when the checkpoint is loaded.
+    """
+    dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    try:
+        config = _load_config({"distributed": True, "shard_optimizer_state": True})
+        dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 16, "dim": 4, "num_classes": 2}))
+        train_loader = DataLoader(dataset, shuffle=False, batch_size=config.train_batch_size)
+        val_loader = DataLoader(dataset, shuffle=False, batch_size=config.eval_batch_size)
+        model_config = BaseModelConfig({"in_dim": 4, "num_classes": 2})
+        model = create_model("single_layer_classifier", model_config)
+        num_params = len(list(model.parameters()))
+
+        loss_criterion_train, loss_criterion_test, eval_criteria = get_loss_eval_criteria(config, reduction="mean")
+        train_logger, val_logger = utils.get_model_performance_trackers(config)
+        return_dict = train_utils.train_model(
+            model,
+            config,
+            train_loader,
+            val_loader,
+            Adam(model.parameters(), lr=1e-2),
+            loss_criterion_train,
+            loss_criterion_test,
+            eval_criteria,
+            train_logger,
+            val_logger,
+        )
+
+        # Each process only holds the state of its share of the parameters
+        optimizer = return_dict["optimizer"]
+        assert distributed.is_optimizer_sharded(optimizer)
+        assert sum(distributed.all_gather_objects(len(optimizer.optim.state))) == num_params
+
+        # Checkpoint (saved by the main process) holds the entire optimizer state
+        best_checkpoint_file = distributed.all_gather_objects(return_dict["best_checkpoint_file"])[0]
+        checkpoint_path = utils.get_file_path(config.checkpoint_dir, best_checkpoint_file)
+        assert len(torch.load(checkpoint_path)["optimizer"]["state"]) == num_params
+
+        # Optimizer state is resharded when loaded
+        model = create_model("single_layer_classifier", model_config)
+        optimizer = distributed.shard_optimizer_state(Adam(model.parameters(), lr=1e-2))
+        optimizer = train_utils.load_model(model, config, best_checkpoint_file, optimizer)["optimizer"]
+        assert sum(distributed.all_gather_objects(len(optimizer.optim.state))) == num_params
+    finally:
+        dist.destroy_process_group()
+
+
+def _evaluate_epoch_distributed(rank: int, world_size: int, init_method: str) -> None:
+    """
+    Evaluate a model in one of the processes on its share
+    of the dataset, and check that the losses and eval metrics
+    are the same as when evaluating on the entire dataset.
+    """
+    dist.init_process_group("gloo", init_method=init_method, rank=rank, world_size=world_size)
+    try:
+        config = _load_config({"distributed": True, "eval_criteria": ["accuracy", "f1", "auc"]})
+        dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 15, "dim": 4, "num_classes": 2}))
+        dataloader = DataLoader(dataset, shuffle=False, batch_size=BATCH_SIZE_PER_PROCESS)
+        model = create_model("single_layer_classifier", BaseModelConfig({"in_dim": 4, "num_classes": 2}))
+        _, loss_criterion_test, eval_criteria = get_loss_eval_criteria(config, reduction="mean")
+
+        results = []
+        for dataloader_ in [dataloader, distributed.get_distributed_dataloader(dataloader, evaluation=True)]:
+            results.append(
+                train_utils.evaluate_epoch(
+                    model, dataloader_, "cpu", loss_criterion_test, eval_criteria, return_outputs=True
+                )
+            )
+        (_, eval_metrics, outputs, _), (losses_sharded, eval_metrics_sharded, outputs_sharded, _) = results
+
+        # Losses of all batches of all processes are returned
+        shard_sizes = [len(range(i, len(dataset), world_size)) for i in range(world_size)]
+        assert len(losses_sharded) == sum(int(np.ceil(size / BATCH_SIZE_PER_PROCESS)) for size in shard_sizes)
+
+        # Every example is evaluated exactly once, and the metrics are the same
+        assert len(outputs_sharded) == len(outputs)
+        for eval_criterion, eval_metric in eval_metrics.items():
+            np.testing.assert_allclose(eval_metrics_sharded[eval_criterion], eval_metric)
+    finally:
+        dist.destroy_process_group()
+
+
+if __name__ == "__main__":
+    unittest.main()
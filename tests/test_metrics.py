@@ -100,6 +100,76 @@ class TestMetrics(unittest.TestCase):
         # Compute all evaluation criteria
         self._test_metrics(predictions, targets, metrics.CLASSIFICATION_EVAL_CRITERIA, true_values)
 
+    def test_metric_accumulators(self):
+        """
+        Test that all streaming metric accumulators
+        match the metrics computed on all outputs
+        and targets at once.
+        """
+        num_examples, num_classes, batch_size = 50, 3, 8
+        rng = np.random.RandomState(0)
+
+        # Define regression and binary / multiclass classification data
+        regression_data = (rng.randn(num_examples, 2), rng.randn(num_examples, 2))
+        binary_data = (rng.randn(num_examples, 2), rng.randint(2, size=num_examples))
+        multiclass_data = (rng.randn(num_examples, num_classes), rng.randint(num_classes, size=num_examples))
+
+        eval_criteria_kwargs = {"f1": {"average": "macro"}, "precision": {"average": "weighted"}}
+        for dictionary, (predictions, targets) in [
+            ({"model_type": "regression", "eval_criteria": metrics.REGRESSION_EVAL_CRITERIA}, regression_data),
+            ({"eval_criteria": metrics.CLASSIFICATION_EVAL_CRITERIA}, binary_data),
+            (
+                {
+                    "classification_type": "multiclass",
+                    "eval_criteria": ["accuracy", "precision", "recall", "f1"],
+                    "eval_criteria_kwargs": {**eval_criteria_kwargs, "recall": {"average": "micro"}},
+                },
+                multiclass_data,
+            ),
+        ]:
+            _, _, eval_criteria = self._get_loss_eval_criteria(dictionary)
+            predictions, targets = torch.as_tensor(predictions).float(), torch.as_tensor(targets).float()
+
+            # Update accumulators batch-wise, alternating between two of them to test merging
+            accumulators = [metrics.get_metric_accumulators(eval_criteria) for _ in range(2)]
+            for i, start in enumerate(range(0, num_examples, batch_size)):
+                for accumulator in accumulators[i % 2].values():
+                    accumulator.update(predictions[start : start + batch_size], targets[start : start + batch_size])
+            for eval_criterion, accumulator in accumulators[0].items():
+                accumulator.merge(accumulators[1][eval_criterion])
+
+            # Test that streaming metrics match those computed at once
+            true_values = metrics.compute_eval_metrics(predictions, targets, eval_criteria)
+            streaming_values = metrics.compute_eval_metrics(None, None, eval_criteria, accumulators[0])
+            for metric, value in streaming_values.items():
+                np.testing.assert_allclose(value, true_values[metric], atol=1e-6)
+
+        # Test that binned AUC approximates the exact one, for both probabilities and logits
+        logits, targets = torch.as_tensor(binary_data[0]).float(), torch.as_tensor(binary_data[1])
+        for predictions, apply_sigmoid in [(torch.softmax(logits, dim=-1), False), (logits, True)]:
+            _, _, eval_criteria = self._get_loss_eval_criteria(
+                {
+                    "eval_criteria": ["auc"],
+                    "eval_criteria_kwargs": {"auc": {"num_bins": 100, "apply_sigmoid": apply_sigmoid}},
+                }
+            )
+            accumulator = metrics.get_metric_accumulators(eval_criteria)["auc"]
+            accumulator.update(predictions, targets)
+            np.testing.assert_allclose(accumulator.compute(), eval_criteria["auc"](predictions, targets), atol=1e-2)
+
+        # Targets must be valid class labels
+        predictions, targets = torch.as_tensor(multiclass_data[0]).float(), torch.as_tensor(multiclass_data[1])
+        with self.assertRaises(ValueError):
+            metrics.ConfusionMatrixAccumulator("accuracy").update(predictions[:, :2], targets)
+
+        # Binary average is only supported for binary targets, same as sklearn
+        accumulator = metrics.ConfusionMatrixAccumulator("f1", average="binary")
+        accumulator.update(predictions, targets)
+        with self.assertRaises(ValueError):
+            accumulator.compute()
+        with self.assertRaises(ValueError):
+            metrics.get_class_eval_metric(predictions, targets, "f1", average="binary")
+
     def _get_loss_eval_criteria(self, dictionary: Dict) -> Tuple[_Loss, _Loss, _EvalCriterionOrCriteria]:
         """
         Load the default config, override it
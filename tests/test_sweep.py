@@ -0,0 +1,257 @@
+import glob
+import os
+import unittest
+
+import numpy as np
+from torch.optim import SGD
+from torch.utils.data import DataLoader
+
+from pytorch_common import sweep, utils
+from pytorch_common.additional_configs import BaseDatasetConfig, BaseModelConfig
+from pytorch_common.callbacks import Callback
+from pytorch_common.config import load_pytorch_common_config
+from pytorch_common.datasets import create_dataset
+from pytorch_common.metrics import get_loss_eval_criteria
+from pytorch_common.models import create_model
+from pytorch_common.train_utils import load_model, train_model
+from pytorch_common.types import List, Optional, _Config, _StringDict
+
+ARTIFACT_DIR = "dummy_sweep_artifact_dir"
+CONFIG_DICT = {"artifact_dir": ARTIFACT_DIR, "device": "cpu", "batch_size_per_gpu": 4, "epochs": 2}
+
+
+class TestSweep(unittest.TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Delete data directory created during config initialization.
+        """
+        utils.remove_dir(ARTIFACT_DIR, force=True)
+
+    def test_get_search_space_trials(self):
+        """
+        Test grid and random search spaces.
+        """
+        search_space = {"lr": [1e-2, 1e-1], "momentum": [0.0, 0.5, 0.9]}
+        trials = sweep.get_search_space_trials(search_space)
+        self.assertEqual(len(trials), 6)
+        self.assertEqual(trials[0], {"lr": 1e-2, "momentum": 0.0})
+
+        search_space = {"lr": lambda rng: 10 ** rng.uniform(-4, -2), "momentum": [0.0, 0.9]}
+        trials = sweep.get_search_space_trials(search_space, mode="random", num_trials=5, seed=1)
+        self.assertEqual(len(trials), 5)
+        self.assertEqual(trials, sweep.get_search_space_trials(search_space, mode="random", num_trials=5, seed=1))
+        for trial in trials:
+            self.assertTrue(1e-4 <= trial["lr"] <= 1e-2 and trial["momentum"] in [0.0, 0.9])
+            self.assertIsInstance(trial["lr"], float)
+
+        # Test invalid settings
+        self._test_error(sweep.get_search_space_trials, search_space)  # Functions aren't allowed for grid search
+        self._test_error(sweep.get_search_space_trials, search_space, mode="random")  # Number of trials missing
+        self._test_error(sweep.get_search_space_trials, search_space, mode="dummy_mode")
+
+    def test_run_sweep(self):
+        """
+        Test running a sweep, and skipping
+        finished trials when rerunning it.
+        """
+        search_space = {"lr": [1e-2, 1e-1], "momentum": [0.0, 0.9]}
+        results_file = os.path.join(ARTIFACT_DIR, "sweep_results.csv")
+        results = sweep.run_sweep(_train_trial, search_space, CONFIG_DICT, results_file=results_file)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(set(results["config_name"])), 4)
+        for column in ["lr", "momentum", "best_epoch", "val_loss", "val_accuracy", "time"]:
+            self.assertIn(column, results.columns)
+        self.assertTrue(os.path.isfile(results_file))
+
+        # Finished trials are skipped, based on the results file
+        results_rerun = sweep.run_sweep(_fail_trial, search_space, CONFIG_DICT, results_file=results_file)
+        self.assertEqual(len(results_rerun), 4)
+
+        # ... or the checkpoints of the trials otherwise (without loading the models)
+        os.remove(results_file)
+        info_files = glob.glob(os.path.join(ARTIFACT_DIR, "checkpoints", "checkpoint-model-*-info.pt"))
+        self.assertGreaterEqual(len(info_files), 4)
+        results_rerun = sweep.run_sweep(_fail_trial, search_space, CONFIG_DICT, results_file=results_file)
+        results, results_rerun = [
+            df.sort_values("config_name").reset_index(drop=True) for df in [results, results_rerun]
+        ]
+        np.testing.assert_array_equal(results["best_epoch"], results_rerun["best_epoch"])
+        np.testing.assert_allclose(results["val_accuracy"], results_rerun["val_accuracy"])
+
+        # Failed trials are left out of the results
+        results = sweep.run_sweep(_fail_trial, {"lr": [1e-3]}, CONFIG_DICT, results_file=results_file)
+        self.assertEqual(len(results), 4)
+
+    def test_interrupted_trial(self):
+        """
+        Test that an interrupted trial stops the sweep,
+        and isn't considered finished when rerunning it.
+        """
+        config_dict = {**CONFIG_DICT, "model_name": "interrupted_classifier"}
+        results_file = os.path.join(ARTIFACT_DIR, "sweep_results_interrupted.csv")
+        with self.assertRaises(KeyboardInterrupt):
+            sweep.run_sweep(_interrupt_trial, {"lr": [1e-2]}, config_dict, results_file=results_file)
+        self.assertFalse(os.path.isfile(results_file))
+
+        config = load_pytorch_common_config({**config_dict, "lr": 1e-2})
+        self.assertIsNone(sweep.get_checkpointed_trial_result(config, {"lr": 1e-2}))
+
+    def test_run_sweep_in_parallel(self):
+        """
+        Test running the trials of a sweep in parallel.
+        """
+        config_dict = {**CONFIG_DICT, "disable_checkpointing": True}
+        results_file = os.path.join(ARTIFACT_DIR, "sweep_results_parallel.csv")
+        results = sweep.run_sweep(
+            _train_trial,
+            {"lr": [1e-2, 1e-1, 1.0]},
+            config_dict,
+            max_workers=2,
+            num_threads_per_trial=1,
+            results_file=results_file,
+        )
+        self.assertEqual(len(results), 3)
+        self.assertEqual(sorted(results["lr"]), [1e-2, 1e-1, 1.0])
+
+    def test_successive_halving_scheduler(self):
+        """
+        Test that only the top trials of each
+        rung are promoted to the next one.
+        """
+        scheduler = sweep.SuccessiveHalvingScheduler(9, max_epochs=9, min_epochs=1, reduction_factor=3)
+        self.assertEqual(scheduler.rung_epochs, [1, 3, 9])
+        self.assertEqual(sweep.SuccessiveHalvingScheduler(4, max_epochs=10).rung_epochs, [1, 3, 9, 10])
+
+        # Each trial is worse than the previous one
+        jobs = []
+        job = scheduler.get_job()
+        while job is not None:
+            jobs.append(job)
+            scheduler.report(*job, metric=-job[0])
+            job = scheduler.get_job()
+        self.assertEqual([trial for trial, rung in jobs if rung == 0], list(range(9)))
+        self.assertEqual([trial for trial, rung in jobs if rung == 1], [0, 1, 2])
+        self.assertEqual([trial for trial, rung in jobs if rung == 2], [0])
+
+        # Stopped trials are never promoted
+        scheduler = sweep.SuccessiveHalvingScheduler(3, max_epochs=3, mode="minimize")
+        for trial in range(3):
+            self.assertEqual(scheduler.get_job(), (trial, 0))
+            scheduler.report(trial, 0, metric=trial, stopped=trial == 0)
+        self.assertIsNone(scheduler.get_job())
+
+        self._test_error(sweep.SuccessiveHalvingScheduler, 3, max_epochs=3, mode="dummy_mode")
+
+    def test_run_successive_halving(self):
+        """
+        Test a sweep with successive halving, in which
+        promoted trials are resumed from their checkpoints.
+        """
+        search_space = {"lr": [1e-3, 1e-2, 1e-1, 1.0]}
+        results_file = os.path.join(ARTIFACT_DIR, "sweep_results_successive_halving.csv")
+        results = sweep.run_successive_halving(
+            _train_trial,
+            search_space,
+            {**CONFIG_DICT, "model_name": "successive_halving_classifier"},
+            mode="grid",
+            max_epochs=2,
+            reduction_factor=2,
+            results_file=results_file,
+        )
+        self.assertEqual(len(results), 4)
+        # Only the top trials (at the time) are promoted
+        self.assertTrue(1 <= np.sum(results["stop_epoch"] == 2) < len(results))
+        self.assertTrue(np.all(results["stop_epoch"] == results["rung"] + 1))
+
+        self._test_error(
+            sweep.run_successive_halving, _train_trial, search_space, {**CONFIG_DICT, "disable_checkpointing": True}
+        )
+
+    def test_get_best_early_stopping_metric(self):
+        """
+        Test that trials are compared on the best
+        early stopping metric of all evaluations.
+        """
+        config = load_pytorch_common_config(CONFIG_DICT)
+        _, val_logger = utils.get_model_performance_trackers(config)
+        for epoch, accuracy in enumerate([0.6, 0.8, np.nan, 0.7], 1):
+            val_logger.add_metrics([1.0], {"accuracy": accuracy}, epoch)
+        val_logger.add_step_metrics(5, [1.0], {"accuracy": 0.9})
+        self.assertEqual(sweep.get_best_early_stopping_metric(val_logger), 0.9)
+        self.assertEqual(sweep.get_best_early_stopping_metric(val_logger, mode="minimize"), 0.6)
+
+    def _test_error(self, func, *args, error=ValueError, **kwargs):
+        with self.assertRaises(error):
+            func(*args, **kwargs)
+
+
+def _train_trial(
+    config: _Config,
+    config_info_dict: _StringDict,
+    start_epoch: int = 0,
+    checkpoint_file: Optional[str] = None,
+    callbacks: Optional[List[Callback]] = None,
+) -> _StringDict:
+    """
+    Train a dummy model with the given config, resuming
+    from `checkpoint_file` if provided (for successive halving).
+    Defined at the module level for it to be
+    picklable for running trials in parallel.
+    """
+    dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 16, "dim": 4, "num_classes": 2}))
+    train_loader = DataLoader(dataset, shuffle=False, batch_size=config.train_batch_size)
+    val_loader = DataLoader(dataset, shuffle=False, batch_size=config.eval_batch_size)
+    model = create_model("single_layer_classifier", BaseModelConfig({"in_dim": 4, "num_classes": 2}))
+    optimizer = SGD(model.parameters(), lr=config.lr, momentum=config.get("momentum", 0.0))
+    loss_criterion_train, loss_criterion_eval, eval_criteria = get_loss_eval_criteria(config, reduction="mean")
+    train_logger, val_logger = utils.get_model_performance_trackers(config)
+    if checkpoint_file is not None:
+        checkpoint = load_model(model, config, checkpoint_file, optimizer)
+        train_logger, val_logger = checkpoint["train_logger"], checkpoint["val_logger"]
+    return train_model(
+        model,
+        config,
+        train_loader,
+        val_loader,
+        optimizer,
+        loss_criterion_train,
+        loss_criterion_eval,
+        eval_criteria,
+        train_logger,
+        val_logger,
+        start_epoch=start_epoch,
+        config_info_dict=config_info_dict,
+        callbacks=callbacks,
+    )
+
+
+def _fail_trial(config: _Config, config_info_dict: _StringDict) -> _StringDict:
+    """
+    Fail a trial, which must never be
+    called for finished trials.
+    """
+    raise RuntimeError("Finished trials must not be run again.")
+
+
+def _interrupt_trial(config: _Config, config_info_dict: _StringDict) -> _StringDict:
+    """
+    Train a dummy model, emulating a keyboard
+    interrupt in the middle of the second epoch.
+    """
+    return _train_trial(config, config_info_dict, callbacks=[_InterruptInSecondEpochCallback()])
+
+
+class _InterruptInSecondEpochCallback(Callback):
+    """
+    Callback emulating a keyboard interrupt after
+    the first optimizer step of the second epoch.
+    """
+
+    def on_step_end(self, state, **kwargs):
+        if state.epoch == 2:
+            raise KeyboardInterrupt
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,5 @@
 import itertools
+import os
 import unittest
 
 import numpy as np
@@ -11,6 +12,7 @@ from torch.utils.data import DataLoader
 
 from pytorch_common import train_utils, utils
 from pytorch_common.additional_configs import BaseDatasetConfig, BaseModelConfig
+from pytorch_common.callbacks import Callback, CallbackHandler, ProfilerCallback
 from pytorch_common.config import Config, load_pytorch_common_config, set_pytorch_config
 from pytorch_common.datasets import create_dataset
 from pytorch_common.metrics import EVAL_CRITERIA, get_loss_eval_criteria
@@ -55,6 +57,17 @@ class TestTrainUtils(unittest.TestCase):
             early_stopping = train_utils.EarlyStopping(eval_criterion)
         self._test_error(train_utils.EarlyStopping, "dummy_criterion")
 
+        # Its state must be saved in checkpoints and restored for resuming training
+        early_stopping = train_utils.EarlyStopping("accuracy", patience=2)
+        for metric in [0.5, 0.4]:
+            self.assertFalse(early_stopping.stop(metric))
+        model = self._get_model(model_name="single_layer_classifier", in_dim=4, num_classes=2)
+        checkpoint_file = train_utils.save_model(model, self.config, 1, early_stopping=early_stopping)
+        early_stopping_resumed = train_utils.EarlyStopping("accuracy", patience=2)
+        train_utils.load_model(model, self.config, checkpoint_file, early_stopping=early_stopping_resumed)
+        self.assertEqual(early_stopping_resumed.state_dict(), early_stopping.state_dict())
+        self.assertTrue(early_stopping_resumed.stop(0.4))  # Patience counter carried over
+
     def test_all_models(self, **kwargs):
         """
         Test all models for all compatible
@@ -65,6 +78,7 @@ class TestTrainUtils(unittest.TestCase):
         """
         all_kwargs = self._get_all_combination_kwargs()
 
+        self.addCleanup(self._load_config)  # Reload default config after changing the model type
         for model_type in all_kwargs.keys():
             self._load_config(self.default_config_dict)  # Reload default config
             self.config.model_type = model_type
@@ -77,6 +91,350 @@ class TestTrainUtils(unittest.TestCase):
                 self._test_train_model(loss_criterion, eval_criterion, **kwargs)
                 self._test_get_all_predictions(loss_criterion, eval_criterion, **kwargs)
 
+    def test_gradient_accumulation(self):
+        """
+        Test that accumulating gradients over multiple
+        batches is equivalent to training with one
+        batch of the combined size.
+        """
+        dataset = create_dataset(
+            "multi_class_dataset", BaseDatasetConfig({"size": 8, "dim": 4, "num_classes": 2})
+        )
+        model_kwargs = {"model_name": "single_layer_classifier", "in_dim": 4, "num_classes": 2}
+        loss_criterion = nn.CrossEntropyLoss()
+
+        model = self._get_model(**model_kwargs)
+        model_accumulated = model.copy()
+        for model_, batch_size, gradient_accumulation_steps in [(model, 4, 1), (model_accumulated, 2, 2)]:
+            loss_hist = train_utils.train_epoch(
+                model=model_,
+                dataloader=DataLoader(dataset, shuffle=False, batch_size=batch_size),
+                device=self.config.device,
+                loss_criterion=loss_criterion,
+                epoch=1,
+                optimizer=self._get_optimizer(model_),
+                gradient_accumulation_steps=gradient_accumulation_steps,
+            )
+            self.assertEqual(len(loss_hist), len(dataset) // batch_size)
+            self.assertTrue(all(isinstance(loss, float) for loss in loss_hist))
+
+        for param, param_accumulated in zip(model.parameters(), model_accumulated.parameters()):
+            np.testing.assert_allclose(
+                utils.convert_tensor_to_numpy(param), utils.convert_tensor_to_numpy(param_accumulated), atol=1e-6
+            )
+
+    def test_mixed_precision(self):
+        """
+        Test that training and evaluation in mixed precision
+        (bfloat16 autocast) keep the model parameters, outputs
+        and checkpoints in full precision.
+        """
+        dataset = create_dataset(
+            "multi_class_dataset", BaseDatasetConfig({"size": 8, "dim": 4, "num_classes": 2})
+        )
+        dataloader = DataLoader(dataset, shuffle=False, batch_size=4)
+        model = self._get_model(model_name="single_layer_classifier", in_dim=4, num_classes=2)
+        optimizer = self._get_optimizer(model)
+        autocast_dtype = utils.get_autocast_dtype("bfloat16")
+        kwargs = {
+            "device": self.config.device,
+            "loss_criterion": nn.CrossEntropyLoss(),
+            "autocast_dtype": autocast_dtype,
+        }
+
+        train_utils.train_epoch(model=model, dataloader=dataloader, epoch=1, optimizer=optimizer, **kwargs)
+        self.assertTrue(all(param.dtype == torch.float32 for param in model.parameters()))
+
+        _, _, outputs, _ = train_utils.evaluate_epoch(
+            model=model, dataloader=dataloader, eval_criteria={}, return_outputs=True, **kwargs
+        )
+        self.assertEqual(outputs.dtype, torch.float32)
+
+        model_state_dict_orig = model.state_dict()
+        checkpoint_file = train_utils.save_model(model, self.config, 1, optimizer=optimizer)
+        return_dict = train_utils.load_model(model.copy(), self.config, checkpoint_file, optimizer)
+        self.assertTrue(utils.compare_model_state_dicts(model_state_dict_orig, return_dict["model"].state_dict()))
+
+        self._test_error(utils.get_autocast_dtype, "float64", error=ValueError)
+
+    def test_batch_prefetching(self):
+        """
+        Test that prefetching batches in the
+        background doesn't change the results.
+        """
+        dataset = create_dataset(
+            "multi_class_dataset", BaseDatasetConfig({"size": 8, "dim": 4, "num_classes": 2})
+        )
+        dataloader = DataLoader(dataset, shuffle=False, batch_size=2)
+        model = self._get_model(model_name="single_layer_classifier", in_dim=4, num_classes=2)
+        model_prefetched = model.copy()
+        kwargs = {"dataloader": dataloader, "device": self.config.device}
+
+        loss_hists, all_outputs = [], []
+        for model_, prefetch_depth in [(model, 0), (model_prefetched, 2)]:
+            loss_hists.append(
+                train_utils.train_epoch(
+                    model=model_,
+                    loss_criterion=nn.CrossEntropyLoss(),
+                    epoch=1,
+                    optimizer=self._get_optimizer(model_),
+                    prefetch_depth=prefetch_depth,
+                    **kwargs,
+                )
+            )
+            outputs, _, _ = train_utils.get_all_predictions(model_, prefetch_depth=prefetch_depth, **kwargs)
+            all_outputs.append(outputs)
+
+        np.testing.assert_allclose(*loss_hists, atol=1e-6)
+        self.assertTrue(utils.compare_tensors_or_arrays(*all_outputs))
+
+    def test_callbacks(self):
+        """
+        Test that callbacks receive the events
+        of the training routine and may stop it.
+        """
+        return_dict = self._get_dummy_training_objects(size=5)
+        callback = _StopAfterOneEpochCallback()
+        self.assertFalse(CallbackHandler([callback]).has_listeners("on_checkpoint"))
+        return_dict = self._train_model(return_dict, epochs=3, callbacks=[callback])
+        self.assertEqual(return_dict["stop_epoch"], 1)
+        self.assertEqual(callback.events["on_epoch_start"], 1)
+        self.assertEqual(callback.events["on_step_end"], 1)
+        self.assertEqual(callback.events["on_train_end"], 1)
+        self.assertEqual(callback.events["on_batch_end"], callback.events["on_batch_start"])
+
+    def test_async_checkpointing_on_error(self):
+        """
+        Test that the checkpoints queued to be written in the
+        background are written even if training fails.
+        """
+        self._override_config({"async_checkpointing": True})
+        return_dict = self._get_dummy_training_objects(size=5)
+        with self.assertRaises(RuntimeError):
+            self._train_model(return_dict, epochs=2, callbacks=[_FailAfterOneEpochCallback()])
+
+        # Best checkpoint of the first epoch must have been written
+        checkpoint_file = utils.get_checkpoint_name("state", self.config.model_name, 1)
+        checkpoint = train_utils.load_model(return_dict["model"].copy(), self.config, checkpoint_file)
+        self.assertEqual(checkpoint["epoch"], 1)
+
+    def test_throughput(self):
+        """
+        Test reporting the examples complete (incl. the last partial
+        batch) and the throughput in the progress logs, and storing
+        the throughput of each epoch.
+        """
+        dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 10, "dim": 4, "num_classes": 2}))
+        model = self._get_model(model_name="single_layer_classifier", in_dim=4, num_classes=2)
+        with self.assertLogs(level="INFO") as logs:
+            train_utils.train_epoch(
+                model=model,
+                dataloader=DataLoader(dataset, batch_size=4),
+                device=self.config.device,
+                loss_criterion=nn.CrossEntropyLoss(),
+                epoch=1,
+                optimizer=self._get_optimizer(model),
+            )
+        self.assertTrue(any("[10/10 (100%)]" in log and "samples/s" in log for log in logs.output))
+
+        # Batches of variable sizes are counted from the model outputs
+        with self.assertLogs(level="INFO") as logs:
+            train_utils.train_epoch(
+                model=model,
+                dataloader=DataLoader(dataset, batch_sampler=[[0], [1, 2, 3], [4, 5, 6, 7, 8, 9]]),
+                device=self.config.device,
+                loss_criterion=nn.CrossEntropyLoss(),
+                epoch=1,
+                optimizer=self._get_optimizer(model),
+            )
+        self.assertTrue(any("[4/10 (67%)]" in log for log in logs.output))
+        self.assertTrue(any("[10/10 (100%)]" in log for log in logs.output))
+
+        self._override_config({"epochs": 2})
+        return_dict = self._train_model(self._get_dummy_training_objects())
+        train_logger = return_dict["train_logger"]
+        self.assertEqual(list(train_logger.get_throughput()), train_logger.epochs)
+        for throughput in train_logger.get_throughput().values():
+            self.assertGreater(throughput["samples_per_sec"], 0.0)
+            self.assertAlmostEqual(
+                throughput["samples_per_sec"] / throughput["steps_per_sec"], self.config.train_batch_size
+            )
+        self.assertIn("Throughput: ", train_logger.log_epoch_metrics())
+
+    def test_time_train_steps(self):
+        """
+        Test timing the phases of each training step
+        (incl. evaluating every few steps), and storing
+        their summary per epoch.
+        """
+        self._override_config({"epochs": 2, "time_train_steps": True, "eval_every_n_steps": 2})
+        return_dict = self._train_model(self._get_dummy_training_objects(size=8))
+        train_logger = return_dict["train_logger"]
+        self.assertEqual(list(train_logger.get_step_times()), train_logger.epochs)
+        step_times = train_logger.get_step_times(epoch=-1)
+        self.assertEqual(list(step_times), utils.StepTimer.PHASES)
+        self.assertAlmostEqual(sum(summary["fraction"] for summary in step_times.values()), 1.0)
+        for summary in step_times.values():
+            self.assertTrue(0.0 <= summary["p50"] <= summary["p90"] <= summary["p99"])
+        self.assertIn("Step times (ms): data", train_logger.log_epoch_metrics())
+
+        # Transfer isn't timed separately if batches are prefetched
+        dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 8, "dim": 4, "num_classes": 2}))
+        step_timer = utils.StepTimer()
+        train_utils.train_epoch(
+            model=return_dict["model"],
+            dataloader=DataLoader(dataset, batch_size=2),
+            device=self.config.device,
+            loss_criterion=nn.CrossEntropyLoss(),
+            epoch=1,
+            optimizer=self._get_optimizer(return_dict["model"]),
+            prefetch_depth=2,
+            step_timer=step_timer,
+        )
+        self.assertNotIn("transfer", step_timer.summarize())
+        self.assertEqual(step_timer.summarize(), {})  # Timer is reset after summarizing
+
+    def test_track_memory(self):
+        """
+        Test tracking the memory usage of each
+        phase, and storing its summary per epoch.
+        """
+        self._override_config({"epochs": 2, "track_memory": True, "memory_sample_every_n_batches": 1})
+        return_dict = self._train_model(self._get_dummy_training_objects())
+        train_logger, val_logger = return_dict["train_logger"], return_dict["val_logger"]
+        self.assertEqual(list(train_logger.get_memory_usage()), train_logger.epochs)
+        self.assertEqual(list(train_logger.get_memory_usage(epoch=-1)), ["train", "eval", "logger"])
+        self.assertEqual(list(val_logger.get_memory_usage(epoch=-1)), ["eval", "logger"])
+        for memory_usage in [train_logger.get_memory_usage(epoch=-1)["train"], val_logger.get_memory_usage(2)["eval"]]:
+            self.assertGreater(memory_usage["peak_rss"], 0)
+            self.assertGreater(memory_usage["held_bytes"], 0)
+            self.assertEqual([sample["batch"] for sample in memory_usage["samples"]], [1, 2])  # 2 batches
+        self.assertGreater(train_logger.get_memory_usage(epoch=-1)["logger"]["held_bytes"], 0)
+        self.assertIn("Memory (MB): train: peak RSS", train_logger.log_epoch_metrics())
+
+    def test_profiler(self):
+        """
+        Test profiling a window of training steps,
+        and exporting its trace and key averages.
+        """
+        self._override_config({"profiler": {"wait": 0, "warmup": 1, "active": 1}})
+        self._train_model(self._get_dummy_training_objects())
+
+        # Window ends with the second (recorded) of the two steps
+        file_name = f"{self.config.model_name}_profile_step_2"
+        for extension in ["json", "txt"]:
+            self.assertTrue(os.path.isfile(utils.get_file_path(self.config.log_dir, f"{file_name}.{extension}")))
+
+        with self.assertRaises(ValueError):
+            ProfilerCallback(self.config.log_dir, dummy_param=True)
+
+    def test_profiler_on_error(self):
+        """
+        Test that the profiler is stopped if training fails.
+        """
+        return_dict = self._get_dummy_training_objects()
+        profiler_callback = ProfilerCallback(self.config.log_dir)
+        with self.assertRaises(RuntimeError):
+            self._train_model(return_dict, callbacks=[profiler_callback, _FailAfterOneEpochCallback()])
+        self.assertIsNone(profiler_callback.profiler)
+
+    def test_step_cadence(self):
+        """
+        Test evaluating and checkpointing
+        in the middle of epochs.
+        """
+        self._override_config({"epochs": 2, "eval_every_n_steps": 1, "checkpoint_every_n_steps": 1})
+        for use_early_stopping, async_checkpointing in [(False, False), (True, True)]:
+            self.config.use_early_stopping = use_early_stopping
+            self.config.async_checkpointing = async_checkpointing
+            return_dict = self._train_model(
+                self._get_dummy_training_objects(), early_stopping=train_utils.EarlyStopping("accuracy", patience=100)
+            )
+            self.assertEqual(return_dict["val_logger"].steps, [1, 2, 3, 4])  # 2 steps per epoch
+
+            # The best model must be tracked across all evaluations, even without early stopping
+            if not use_early_stopping:
+                val_logger = return_dict["val_logger"]
+                best_metric = max(
+                    *val_logger.get_eval_metrics("accuracy").values(),
+                    *val_logger.get_step_eval_metrics("accuracy").values(),
+                )
+                best_step = return_dict["best_step"]
+                if best_step is not None:
+                    self.assertEqual(val_logger.get_step_eval_metrics("accuracy", best_step), best_metric)
+                else:
+                    self.assertEqual(val_logger.get_eval_metrics("accuracy", return_dict["best_epoch"]), best_metric)
+
+            # Only the latest mid-epoch checkpoint must be kept
+            get_checkpoint_path = lambda epoch, step: utils.get_file_path(
+                self.config.checkpoint_dir, utils.get_checkpoint_name("state", self.config.model_name, epoch, step=step)
+            )
+            self.assertTrue(os.path.isfile(get_checkpoint_path(2, 4)))
+            if return_dict["best_step"] != 3:
+                self.assertFalse(os.path.isfile(get_checkpoint_path(2, 3)))
+
+            # Load mid-epoch checkpoint
+            checkpoint_file = utils.get_checkpoint_name("state", self.config.model_name, 2, step=4)
+            checkpoint = train_utils.load_model(return_dict["model"].copy(), self.config, checkpoint_file)
+            self.assertEqual((checkpoint["epoch"], checkpoint["step"]), (2, 4))
+
+    def test_resume_training(self):
+        """
+        Test that training interrupted in the middle of an
+        epoch and resumed from the saved checkpoint yields
+        the same model as uninterrupted training.
+        """
+        return_dict = self._get_dummy_training_objects()
+        model_init = return_dict["model"].copy()
+
+        def train(model, callbacks=None, resume_state=None):
+            train_logger, val_logger = utils.get_model_performance_trackers(self.config)
+            training_objects = {
+                **return_dict,
+                "model": model,
+                "optimizer": optimizer,
+                "train_logger": train_logger,
+                "val_logger": val_logger,
+            }
+            return self._train_model(training_objects, epochs=1, callbacks=callbacks, resume_state=resume_state)
+
+        # Train uninterrupted
+        utils.set_seed(0)
+        model = model_init.copy()
+        optimizer = self._get_optimizer(model)
+        train(model)
+
+        # Train with interruption after the first of two optimizer steps
+        utils.set_seed(0)
+        model_interrupted = model_init.copy()
+        optimizer = self._get_optimizer(model_interrupted)
+        resume_checkpoint_file = train(model_interrupted, callbacks=[_InterruptCallback()])["resume_checkpoint_file"]
+        self.assertNotEqual(resume_checkpoint_file, "")
+
+        # Resume from checkpoint with different RNG states
+        utils.set_seed(1)
+        model_resumed = model_init.copy()
+        optimizer = self._get_optimizer(model_resumed)
+        checkpoint = train_utils.load_model(model_resumed, self.config, resume_checkpoint_file, optimizer)
+        self.assertEqual(checkpoint["training_state"]["batches_done"], 1)
+        train(model_resumed, resume_state=checkpoint["training_state"])
+
+        self.assertTrue(utils.compare_model_state_dicts(model.state_dict(), model_resumed.state_dict()))
+
+    def test_keep_best_model_in_memory(self):
+        """
+        Test that the best model kept in memory
+        matches the best model checkpoint.
+        """
+        self._override_config({"epochs": 3, "keep_best_model_in_memory": True})
+        return_dict = self._train_model(self._get_dummy_training_objects())
+        checkpoint = train_utils.load_model(
+            return_dict["model"].copy(), self.config, return_dict["best_checkpoint_file"]
+        )
+        best_model_checkpoint = utils.send_model_to_device(checkpoint["model"], "cpu")
+        best_model = utils.send_model_to_device(return_dict["best_model"], "cpu")
+        self.assertTrue(utils.compare_model_state_dicts(best_model_checkpoint.state_dict(), best_model.state_dict()))
+
     def _get_all_combination_kwargs(self):
         """
         Generate a list of kwargs for all compatible
@@ -170,21 +528,11 @@ class TestTrainUtils(unittest.TestCase):
         # Get all training objects
         return_dict = self._get_training_objects(loss_criterion, eval_criterion, **kwargs)
 
-        # Train model
-        train_utils.train_model(
-            return_dict["model"],
-            self.config,
-            return_dict["train_loader"],
-            return_dict["val_loader"],
-            return_dict["optimizer"],
-            return_dict["loss_criterion_train"],
-            return_dict["loss_criterion_test"],
-            return_dict["eval_criteria"],
-            return_dict["train_logger"],
-            return_dict["val_logger"],
-            self.config.epochs,
-            return_dict["scheduler"],
-        )
+        # Train model with both exact and online train metrics
+        for train_metrics_mode in ["exact", "online"]:
+            self.config.train_metrics_mode = train_metrics_mode
+            self._train_model(return_dict, epochs=self.config.epochs, scheduler=return_dict["scheduler"])
+        self.config.train_metrics_mode = "exact"
 
     def _test_get_all_predictions(self, loss_criterion: str, eval_criterion: str, **kwargs) -> None:
         """
@@ -207,6 +555,45 @@ class TestTrainUtils(unittest.TestCase):
             for results in [preds_val, probs_val]:
                 self.assertEqual(len(results), len(return_dict["val_loader"].dataset))
 
+        # Ensure that predictions in memory-mapped files are the same
+        mmap_dir = utils.get_file_path(self.config.artifact_dir, "predictions")
+        predictions_mmap = train_utils.get_all_predictions(
+            return_dict["model"], return_dict["val_loader"], self.config.device, mmap_dir=mmap_dir
+        )
+        self.assertTrue(utils.compare_tensors_or_arrays(outputs_val, predictions_mmap[0]))
+        self.assertTrue(
+            utils.compare_tensors_or_arrays(outputs_val, np.load(utils.get_file_path(mmap_dir, "outputs.npy")))
+        )
+        if return_dict["model"].model_type == "classification":
+            for results, results_mmap in zip([preds_val, probs_val], predictions_mmap[1:]):
+                self.assertTrue(utils.compare_tensors_or_arrays(results, results_mmap))
+
+        # Ensure that streamed predictions are the same
+        chunks = list(
+            train_utils.iterate_predictions(return_dict["model"], return_dict["val_loader"], self.config.device)
+        )
+        self.assertTrue(
+            utils.compare_tensors_or_arrays(
+                torch.cat([chunk[0] for chunk in chunks]), torch.arange(len(return_dict["val_loader"].dataset))
+            )
+        )
+        self.assertTrue(utils.compare_tensors_or_arrays(outputs_val, torch.cat([chunk[1] for chunk in chunks])))
+        if return_dict["model"].model_type == "classification":
+            for i, results in enumerate([preds_val, probs_val], 2):
+                self.assertTrue(utils.compare_tensors_or_arrays(results, torch.cat([chunk[i] for chunk in chunks])))
+
+        # Ensure that sharded predictions are written in all formats
+        for file_format in utils.ShardedPredictionWriter.SUPPORTED_FORMATS:
+            shard_files = train_utils.write_all_predictions(
+                return_dict["model"],
+                return_dict["val_loader"],
+                self.config.device,
+                utils.get_file_path(self.config.artifact_dir, f"predictions_{file_format}"),
+                file_format=file_format,
+                rows_per_shard=2,
+            )
+            self.assertTrue(len(shard_files) and all(os.path.isfile(file_path) for file_path in shard_files))
+
     def _test_error(self, func: Callable[[Any], None], args, error=AssertionError) -> None:
         """
         Generic code to assert that `error`
@@ -249,6 +636,46 @@ class TestTrainUtils(unittest.TestCase):
             return cls.default_config_dict
         return {**cls.default_config_dict, **dictionary}
 
+    def _override_config(self, dictionary: Dict) -> None:
+        """
+        Override the default config with `dictionary`
+        for the current test only, such that the default
+        one is reloaded even if the test fails.
+        """
+        self._load_config(dictionary)
+        self.addCleanup(self._load_config)
+
+    def _get_dummy_training_objects(self, size: Optional[int] = 10) -> _StringDict:
+        """
+        Get all objects required for training a single layer
+        classifier on a dummy binary classification dataset
+        of the given `size` (see `_get_training_objects()`).
+        """
+        kwargs = {
+            "dataset_kwargs": {"dataset_name": "multi_class_dataset", "size": size, "dim": 4, "num_classes": 2},
+            "model_kwargs": {"model_name": "single_layer_classifier", "in_dim": 4, "num_classes": 2},
+        }
+        return self._get_training_objects("cross-entropy", "accuracy", **kwargs)
+
+    def _train_model(self, return_dict: _StringDict, **kwargs) -> _StringDict:
+        """
+        Train a model with the objects returned by `_get_training_objects()`,
+        and the current config. `kwargs` are passed on to `train_model()`.
+        """
+        return train_utils.train_model(
+            return_dict["model"],
+            self.config,
+            return_dict["train_loader"],
+            return_dict["val_loader"],
+            return_dict["optimizer"],
+            return_dict["loss_criterion_train"],
+            return_dict["loss_criterion_test"],
+            return_dict["eval_criteria"],
+            return_dict["train_logger"],
+            return_dict["val_logger"],
+            **kwargs,
+        )
+
     def _get_training_objects(self, loss_criterion: str, eval_criterion: str, **kwargs) -> _StringDict:
         """
         Get all objects required for training, like
@@ -350,5 +777,56 @@ class TestTrainUtils(unittest.TestCase):
         return train_logger, val_logger
 
 
+class _StopAfterOneEpochCallback(Callback):
+    """
+    Callback counting the events it
+    receives, which stops training
+    after the first epoch.
+    """
+
+    def __init__(self):
+        events = ["on_epoch_start", "on_batch_start", "on_batch_end", "on_step_end", "on_train_end"]
+        self.events = {event: 0 for event in events}
+
+    def on_epoch_start(self, state, **kwargs):
+        self.events["on_epoch_start"] += 1
+
+    def on_batch_start(self, state, **kwargs):
+        self.events["on_batch_start"] += 1
+
+    def on_batch_end(self, state, **kwargs):
+        self.events["on_batch_end"] += 1
+
+    def on_step_end(self, state, **kwargs):
+        self.events["on_step_end"] += 1
+        assert state.global_step == self.events["on_step_end"]
+
+    def on_epoch_end(self, state, **kwargs):
+        state.stop_training = True
+
+    def on_train_end(self, state, **kwargs):
+        self.events["on_train_end"] += 1
+
+
+class _FailAfterOneEpochCallback(Callback):
+    """
+    Callback emulating an error
+    after the first epoch.
+    """
+
+    def on_epoch_end(self, state, **kwargs):
+        raise RuntimeError("Dummy error")
+
+
+class _InterruptCallback(Callback):
+    """
+    Callback emulating a keyboard interrupt
+    after the first optimizer step.
+    """
+
+    def on_step_end(self, state, **kwargs):
+        raise KeyboardInterrupt
+
+
 if __name__ == "__main__":
     unittest.main()
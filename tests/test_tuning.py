@@ -0,0 +1,123 @@
+import unittest
+
+from torch.utils.data import DataLoader
+
+from pytorch_common import tuning, utils
+from pytorch_common.additional_configs import BaseDatasetConfig, BaseModelConfig
+from pytorch_common.config import load_pytorch_common_config
+from pytorch_common.datasets import create_dataset
+from pytorch_common.metrics import get_loss_eval_criteria
+from pytorch_common.models import create_model
+
+ARTIFACT_DIR = "dummy_tuning_artifact_dir"
+
+
+class TestTuning(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """
+        Load pytorch_common config, and
+        create a dummy dataset and model.
+        """
+        cls.config = load_pytorch_common_config(
+            {"artifact_dir": ARTIFACT_DIR, "device": "cpu", "batch_size_per_gpu": 4, "disable_checkpointing": True}
+        )
+        cls.dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 32, "dim": 4, "num_classes": 2}))
+        cls.model = create_model("single_layer_classifier", BaseModelConfig({"in_dim": 4, "num_classes": 2}))
+        cls.loss_criterion = get_loss_eval_criteria(cls.config, reduction="mean")[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        """
+        Delete data directory created during config initialization.
+        """
+        utils.remove_dir(ARTIFACT_DIR, force=True)
+
+    def test_find_max_batch_size(self):
+        """
+        Test finding the largest batch size, which
+        is limited by `max_batch_size` if the memory
+        budget is large enough.
+        """
+        for mode in tuning.SUPPORTED_MODES:
+            batch_size = tuning.find_max_batch_size(
+                self.model, self.dataset, self.config, mode, loss_criterion=self.loss_criterion, max_batch_size=12
+            )
+            self.assertEqual(batch_size, 12)
+
+        # Model must not be updated
+        self.assertTrue(self.model.training)
+        for param in self.model.parameters():
+            self.assertIsNone(param.grad)
+
+        # Loss criterion is required for training
+        with self.assertRaises(ValueError):
+            tuning.find_max_batch_size(self.model, self.dataset, self.config, "train")
+
+    @unittest.skipIf(
+        utils.get_available_memory() is None or not utils.reset_peak_rss(),
+        "Peak memory usage can only be measured on Linux.",
+    )
+    def test_find_max_batch_size_with_memory_budget(self):
+        """
+        Test that the batch size is limited by the memory
+        budget on CPU, with a budget of only 16 MiB on
+        top of the memory in use, and a dataset of 64 MiB.
+        """
+        dim = 2 ** 16  # 256 KiB per example
+        dataset = create_dataset("multi_class_dataset", BaseDatasetConfig({"size": 256, "dim": dim, "num_classes": 2}))
+        model = create_model("single_layer_classifier", BaseModelConfig({"in_dim": dim, "num_classes": 2}))
+        memory_fraction = min(1.0, 2 ** 24 / utils.get_available_memory())
+        batch_size = tuning.find_max_batch_size(model, dataset, self.config, "eval", memory_fraction=memory_fraction)
+        self.assertGreaterEqual(batch_size, 1)
+        self.assertLess(batch_size, len(dataset))
+
+    def test_measure_throughput(self):
+        """
+        Test measuring the throughput of each mode.
+        """
+        dataloader = DataLoader(self.dataset, batch_size=4)
+        for mode in tuning.SUPPORTED_MODES:
+            for prefetch_depth in [0, 2]:
+                throughput = tuning.measure_throughput(
+                    self.model, dataloader, self.config, mode, self.loss_criterion, prefetch_depth=prefetch_depth
+                )
+                self.assertGreater(throughput, 0.0)
+
+        # Dataloader must have more batches than the warmup ones
+        with self.assertRaises(ValueError):
+            tuning.measure_throughput(self.model, DataLoader(self.dataset, batch_size=16), self.config, "eval")
+
+    def test_tune_config(self):
+        """
+        Test tuning the batch sizes, number of workers and
+        prefetch depth, and writing them into the config.
+        """
+        config = load_pytorch_common_config(
+            {"artifact_dir": ARTIFACT_DIR, "device": "cpu", "batch_size_per_gpu": 4, "disable_checkpointing": True}
+        )
+        results = tuning.tune_config(
+            self.model,
+            self.dataset,
+            config,
+            self.loss_criterion,
+            modes=["train", "eval"],
+            max_batch_size=8,
+            worker_candidates=[0, 1],
+        )
+        self.assertEqual(set(results), {"train", "eval"})
+        self.assertIn(config.num_workers, [0, 1])
+        for mode in ["train", "eval"]:
+            self.assertEqual(config[f"{mode}_batch_size_per_gpu"], 8)
+            self.assertEqual(config[f"{mode}_batch_size"], 8)
+        self.assertEqual(config.test_batch_size_per_gpu, 4)  # Untuned modes are retained
+        self.assertIsNone(config.batch_size_per_gpu)
+        self.assertEqual(config.num_workers, results["train"]["num_workers"])
+        self.assertEqual(config.batch_prefetch_depth, results["train"]["prefetch_depth"])
+
+        with self.assertRaises(ValueError):
+            tuning.tune_config(self.model, self.dataset, config, modes=["dummy_mode"])
+
+
+if __name__ == "__main__":
+    unittest.main()
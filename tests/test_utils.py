@@ -1,5 +1,8 @@
 import os
+import time
 import unittest
+from collections import defaultdict, namedtuple
+from dataclasses import dataclass
 
 import numpy as np
 import torch
@@ -206,6 +209,185 @@ class TestUtils(unittest.TestCase):
             self.assertTrue(utils.compare_tensors_or_arrays(batch_torch, batch_torch_cuda))
             self.assertTrue(utils.is_batch_on_gpu(batch_torch_cuda))
 
+    def test_batch_encoding(self):
+        """
+        Test that `BatchEncoding`s of `transformers` tokenizers
+        retain their encodings when sent to a device.
+        """
+        try:
+            from transformers import BatchEncoding
+        except ImportError:
+            self.skipTest("`transformers` not installed.")
+
+        batch = BatchEncoding({"input_ids": torch.tensor([[1, 2]]), "attention_mask": torch.tensor([[1, 1]])})
+        batch._n_sequences = 1
+        batch_sent = utils.send_batch_to_device(batch, "cpu")
+        self.assertIsInstance(batch_sent, BatchEncoding)
+        self.assertEqual(batch_sent.n_sequences, 1)
+        self.assertIs(batch_sent._encodings, batch._encodings)
+        self.assertTrue(utils.compare_tensors_or_arrays(batch_sent.data, batch.data))
+
+    def test_flatten_batch(self):
+        """
+        Test flattening and rebuilding batches
+        with different (nested) containers, and
+        converting / sending them retaining
+        their structure.
+        """
+        a, b, c = [1.5, 2, 3], [4, -5, 6], [7, 0, 9]
+        Pair = namedtuple("Pair", ["first", "second"])
+        inputs = _DummyInputs(np.array(a), {"ids": np.array(b), "mask": Pair(np.array(c), np.array(a))})
+        batch_np = ({"inputs": inputs, "name": "dummy"}, np.array(b))
+
+        leaves, spec = utils.flatten_batch(batch_np)
+        self.assertEqual(len(leaves), 6)
+        batch_np_rebuilt = utils.unflatten_batch(leaves, spec)
+        self.assertIsInstance(batch_np_rebuilt[0]["inputs"], _DummyInputs)
+        self.assertIsInstance(batch_np_rebuilt[0]["inputs"].other["mask"], Pair)
+        self.assertEqual(batch_np_rebuilt[0]["name"], "dummy")
+        self.assertIsNone(utils.flatten_batch(np.array(a))[1])
+        self.assertEqual(utils.get_batch_size(batch_np), len(a))
+
+        batch_torch = utils.convert_numpy_to_tensor(batch_np)
+        self.assertTrue(torch.is_tensor(batch_torch[0]["inputs"].other["mask"].first))
+        batch_np_converted = utils.convert_tensor_to_numpy(batch_torch)
+        self.assertIsInstance(batch_np_converted[0]["inputs"].tokens, np.ndarray)
+        for leaf_a, leaf_b in zip(utils.flatten_batch(batch_np)[0], utils.flatten_batch(batch_np_converted)[0]):
+            if isinstance(leaf_a, np.ndarray):
+                np.testing.assert_array_equal(leaf_a, leaf_b)
+
+        # Test that mappings other than dicts are rebuilt from a copy of the original ones
+        batch_torch = {"ids": defaultdict(list, {"first": torch.tensor(a)}), "mask": torch.tensor(b)}
+        batch_np = utils.convert_tensor_to_numpy(batch_torch)
+        self.assertIsInstance(batch_np["ids"], defaultdict)
+        self.assertEqual(batch_np["ids"]["dummy"], [])  # Default factory is retained
+        self.assertIsInstance(batch_np["ids"]["first"], np.ndarray)
+        self.assertTrue(torch.is_tensor(batch_torch["ids"]["first"]))  # Original is unchanged
+
+        if torch.cuda.is_available():
+            # Test sending batch to GPU, optionally in a single transfer
+            batch_torch = ({"ids": torch.tensor(a), "mask": Pair(torch.tensor(b), torch.tensor(c))}, torch.tensor(c))
+            for coalesce in [False, True]:
+                batch_cuda = utils.send_batch_to_device(batch_torch, "cuda", coalesce=coalesce)
+                self.assertIsInstance(batch_cuda[0]["mask"], Pair)
+                self.assertTrue(utils.is_batch_on_gpu(batch_cuda))
+                self.assertTrue(utils.compare_tensors_or_arrays(batch_cuda, batch_torch))
+
+    def test_async_checkpoint_writer(self):
+        """
+        Test that checkpoints are snapshotted
+        and written in the background, and that
+        operations are performed in order.
+        """
+        primary_path = "dummy_dir"
+        utils.make_dirs(primary_path)
+        file_paths = [utils.get_file_path(primary_path, f"checkpoint_{i}.pt") for i in range(3)]
+
+        tensor = torch.zeros(3)
+        writer = utils.AsyncCheckpointWriter(torch.save, max_inflight=1)
+        for file_path in file_paths:
+            writer.save(file_path, lambda: {"tensor": tensor})
+            tensor += 1  # Must not affect the snapshot taken
+        writer.remove(file_paths[0])
+        writer.close()
+
+        self.assertFalse(os.path.isfile(file_paths[0]))
+        for i, file_path in enumerate(file_paths[1:], 1):
+            self.assertTrue(torch.equal(torch.load(file_path)["tensor"], torch.full((3,), float(i))))
+        self.assertEqual(sorted(os.listdir(primary_path)), ["checkpoint_1.pt", "checkpoint_2.pt"])
+
+        # Errors in the background thread must be raised
+        writer = utils.AsyncCheckpointWriter(torch.save)
+        writer.save(utils.get_file_path("non_existent_dir", "checkpoint.pt"), lambda: {"tensor": tensor})
+        with self.assertRaises(RuntimeError):
+            writer.close()
+
+        utils.remove_dir(primary_path, force=True)
+
+    def test_copy_model_with_state_dict(self):
+        """
+        Test that a model copied with a given state dict
+        uses its tensors, and leaves the original unchanged.
+        """
+        config = BaseModelConfig({"in_dim": 4, "num_classes": 2})
+        model = create_model("single_layer_classifier", config)
+        state_dict = utils.snapshot_to_cpu(model.state_dict())
+        for tensor in state_dict.values():
+            tensor.add_(1.0)
+
+        model_copy = utils.copy_model_with_state_dict(model, state_dict)
+        self.assertTrue(utils.compare_model_state_dicts(model_copy.state_dict(), state_dict))
+        self.assertFalse(utils.compare_model_state_dicts(model.state_dict(), state_dict))
+        for name, param in model_copy.named_parameters():
+            self.assertEqual(param.data_ptr(), state_dict[name].data_ptr())
+
+    def test_get_object_size(self):
+        """
+        Test that the bytes of all referenced objects,
+        incl. tensors and arrays, are counted once.
+        """
+        tensor, array = torch.zeros(1000), np.zeros(1000)
+        self.assertGreaterEqual(utils.get_object_size([tensor, array]), 4000 + 8000)
+        self.assertLess(utils.get_object_size([tensor, tensor, array, array]), 2 * (4000 + 8000))
+        self.assertGreaterEqual(utils.get_object_size(_DummyInputs(array, {"tensor": tensor})), 4000 + 8000)
+
+    def test_throughput_meter(self):
+        """
+        Test the smoothed rates, the ETAs,
+        and the summary of an epoch.
+        """
+        meter = utils.ThroughputMeter()
+        meter.remaining_epochs = 2
+        meter.start(num_batches=4)
+        self.assertTrue(np.isnan(meter.get_epoch_eta()))
+        for num_steps in [0, 1, 0]:
+            time.sleep(0.01)
+            meter.update(8, num_steps=num_steps)
+        self.assertGreater(meter.samples_per_sec, meter.steps_per_sec)
+        self.assertGreater(meter.get_run_eta(), meter.get_epoch_eta())
+        self.assertIn("ETA", meter.get_progress_str())
+
+        summary = meter.summarize()
+        self.assertAlmostEqual(summary["samples_per_sec"] * summary["time"], 24)
+        self.assertAlmostEqual(summary["steps_per_sec"] * summary["time"], 1)
+
+        # ETA of the run is estimated from the durations of the previous epochs
+        meter.start(num_batches=4)
+        meter.update(8)
+        self.assertGreaterEqual(meter.get_run_eta(), 2 * 0.03)
+
+        # Time paused isn't counted towards the next batch, nor the epoch
+        meter.start(num_batches=4)
+        meter.pause()
+        time.sleep(0.1)
+        meter.resume()
+        meter.update(8)
+        self.assertGreater(meter.samples_per_sec, 8 / 0.1)
+        self.assertLess(meter.summarize()["time"], 0.1)
+
+    def test_batch_prefetcher(self):
+        """
+        Test that batches are prepared in the
+        background in the original order, and that
+        the background thread can be stopped early.
+        """
+        batches = [torch.full((2,), float(i)) for i in range(10)]
+        prepare_fn = lambda batch: batch + 1
+        for depth in [0, 1, 3]:
+            with utils.BatchPrefetcher(batches, prepare_fn, depth) as prefetcher:
+                for batch, (raw_batch, prepared_batch) in zip(batches, prefetcher):
+                    self.assertTrue(torch.equal(raw_batch, batch))
+                    self.assertTrue(torch.equal(prepared_batch, batch + 1))
+
+            # Stopping early must not block
+            with utils.BatchPrefetcher(batches, prepare_fn, depth) as prefetcher:
+                next(iter(prefetcher))
+
+        # Errors in the background thread must be raised
+        with utils.BatchPrefetcher(batches, lambda batch: batch.dummy_attribute, 2) as prefetcher:
+            with self.assertRaises(RuntimeError):
+                list(prefetcher)
+
     def _get_batch(
         self,
         a: List[float],
@@ -224,5 +406,11 @@ class TestUtils(unittest.TestCase):
         return ((a_, b_), c_)
 
 
+@dataclass
+class _DummyInputs:
+    tokens: np.ndarray
+    other: Dict
+
+
 if __name__ == "__main__":
     unittest.main()